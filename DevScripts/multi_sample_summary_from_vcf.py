@@ -9,6 +9,7 @@ import sys
 import csv
 import xlwt
 import utils
+import panels
 import cyvcf2
 import argparse
 
@@ -23,18 +24,17 @@ def process_sample_coverage(sample, samples, config):
     for library in samples[sample]:
         print sample
         print library
-        report_panel_path = (
-            "/mnt/shared-data/ddb-configs/disease_panels/{}/{}".format(
-                samples[sample][library]['panel'],
-                samples[sample][library]['report']))
-        target_amplicons = utils.get_target_amplicons(report_panel_path)
+        report_panel_path = panels.get_panel_path(
+            samples[sample][library]['panel'],
+            samples[sample][library]['report'])
+        target_panel = panels.load_panel_file(report_panel_path)
         covf = "{}.sambamba_coverage.bed".format(samples[sample][library]['library_name'])
         with open(covf, 'rb') as coverage:
             reader = csv.reader(coverage, delimiter='\t')
             reader.next()
 
             for row in reader:
-                if row[3] in target_amplicons:
+                if row[3] in target_panel:
                     sample_coverage[row[3]] = {
                         "num_reads": int(row[4]),
                         "mean_coverage": float(row[5])
@@ -48,11 +48,10 @@ def process_sample_variants(sample, samples, config, thresholds):
     filtered_variant_data = defaultdict(list)
 
     for library in samples[sample]:
-        report_panel_path = (
-            "/mnt/shared-data/ddb-configs/disease_panels/{}/{}".format(
-                samples[sample][library]['panel'],
-                samples[sample][library]['report']))
-        target_amplicons = utils.get_target_amplicons(report_panel_path)
+        report_panel_path = panels.get_panel_path(
+            samples[sample][library]['panel'],
+            samples[sample][library]['report'])
+        target_panel = panels.load_panel_file(report_panel_path)
         sys.stdout.write("Parsing Caller VCF Files\n")
         vcf_parsing.parse_vcf("{}.mutect.normalized.vcf.gz".format(samples[sample][library]['library_name']),
                               "mutect", caller_records)
@@ -92,12 +91,7 @@ def process_sample_variants(sample, samples, config, thresholds):
                 amplicon_data = utils.get_amplicon_data(variant)
                 amplicons = amplicon_data['amplicon'].split(',')
 
-                assignable = 0
-                for amplicon in amplicons:
-                    if amplicon in target_amplicons:
-                        assignable += 1
-                        break
-                if assignable:
+                if target_panel.any_in(amplicons):
                     key = (unicode("chr{}".format(variant.CHROM)),
                            int(variant.start), int(variant.end),
                            unicode(variant.REF), unicode(variant.ALT[0]))
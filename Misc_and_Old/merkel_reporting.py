@@ -2,6 +2,7 @@
 
 import sys
 import utils
+import cohort
 import argparse
 import getpass
 
@@ -52,6 +53,10 @@ if __name__ == "__main__":
     gene_count_data = defaultdict(lambda: defaultdict(int))
     variants_list = list()
 
+    sys.stdout.write("Building project cohort\n")
+    project_cohort = cohort.Cohort(samples, config['genome_version'])
+    project_cohort.load_project(samples)
+
     sys.stdout.write("Processing samples\n")
     for sample in samples:
         sys.stdout.write("Processing variants for sample {}\n".format(sample))
@@ -100,7 +105,8 @@ if __name__ == "__main__":
                                                                         target_amplicons, callers, ordered_variants,
                                                                         config, thresholds, project_variant_data,
                                                                         variant_count_data, gene_count_data,
-                                                                        variants_list, args.address, auth_provider)
+                                                                        variants_list, args.address, auth_provider,
+                                                                        project_cohort)
             variants_list = filtered_var_data[-4]
             project_variant_data = filtered_var_data[-3]
             variant_count_data = filtered_var_data[-2]
@@ -115,8 +121,8 @@ if __name__ == "__main__":
         summary.write("Variant\tNum Tier1 Pass\tNum Tier1 Fail\tNum VUS Pass\tNum VUS Fail\tNum Tier4 Pass\t"
                       "Num Tier4 Fail\n")
         for variant_id in project_variant_data:
-            summary.write("{}\t{}\t{}\t{}\n".format(variant_id,
-                                                    project_variant_data[variant_id]['tier1_pass'],
+            label = utils.format_variant_id(project_variant_data[variant_id]['variant'])
+            summary.write("{}\t{}\t{}\t{}\n".format(label, project_variant_data[variant_id]['tier1_pass'],
                                                     project_variant_data[variant_id]['vus_pass'],
                                                     project_variant_data[variant_id]['tier4_pass']))
 
@@ -124,8 +130,9 @@ if __name__ == "__main__":
     with open("Category_Data.txt", 'w') as summary:
         summary.write("Variant\tNum Pos\tNum Neg\tDiff\n")
         for variant_id in project_variant_data:
+            label = utils.format_variant_id(project_variant_data[variant_id]['variant'])
             diff = abs(project_variant_data[variant_id]['positive'] - project_variant_data[variant_id]['negative'])
-            summary.write("{}\t{}\t{}\t{}\n".format(variant_id, project_variant_data[variant_id]['positive'],
+            summary.write("{}\t{}\t{}\t{}\n".format(label, project_variant_data[variant_id]['positive'],
                                                     project_variant_data[variant_id]['negative'], diff))
 
     sys.stdout.write("Writing Sample-level variant count data\n")
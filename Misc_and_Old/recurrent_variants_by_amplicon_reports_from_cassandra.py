@@ -10,6 +10,7 @@ from cassandra.cqlengine import connection
 from ddb import configuration
 
 import utils
+import variant_keys
 from variantstore import TargetVariant
 from collections import defaultdict
 
@@ -49,6 +50,8 @@ if __name__ == "__main__":
         outfile.write("Key\tGene\tAmplicon\tAmino Acid\tNum Instances\tNum Cosmic\tCosmic IDs\tSomatic AF\t"
                       "FreeBayes\tScalpel\tMuTect\tPindel\tVarDict\tPlatypus\n")
 
+    variant_ids = variant_keys.VariantKeys()
+
     sys.stdout.write("Running Cassandra queries\n")
     for amplicon in amplicons:
         sys.stdout.write("Running query for amplicon: {}\n".format(amplicon))
@@ -63,9 +66,9 @@ if __name__ == "__main__":
 
         for variant in ordered_variants:
             if variant.max_maf_all <= args.max_pop_freq:
-                key = "{}-{}-{}-{}-{}".format(variant.reference_genome, variant.chr, variant.pos, variant.ref,
-                                              variant.alt)
+                key = variant_ids.key(variant.chr, variant.pos, variant.ref, variant.alt)
 
+                filtered_variants[key]['reference_genome'] = variant.reference_genome
                 filtered_variants[key]['instances'] += 1
                 filtered_variants[key]['panel'] = variant.panel_name
                 filtered_variants[key]['amplicon'] = variant.amplicon_data['amplicon']
@@ -91,8 +94,10 @@ if __name__ == "__main__":
 
         with open(args.output, 'a') as outfile:
             for variant in filtered_variants.keys():
+                label = "{}-{}-{}-{}-{}".format(filtered_variants[variant]['reference_genome'],
+                                                *variant_ids.variant(variant))
                 outfile.write("{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}"
-                              "\n".format(variant,
+                              "\n".format(label,
                                           filtered_variants[variant]['gene'],
                                           filtered_variants[variant]['amplicon'],
                                           filtered_variants[variant]['amino_acid'],
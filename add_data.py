@@ -1,18 +1,20 @@
 #!/usr/bin/env python
 
+import os
 import argparse
 import getpass
 import re
 import sys
 import csv
+import time
 from collections import defaultdict
 from datetime import datetime
 
 import cyvcf2
 from cassandra.auth import PlainTextAuthProvider
-from cassandra.cqlengine import connection
 from cassandra import WriteFailure
 from cassandra import InvalidRequest
+from cassandra.cqlengine import connection
 from cyvcf2 import VCF
 from ddb import configuration
 from ddb import vcf_parsing
@@ -20,34 +22,61 @@ from ddb_ngsflow import pipeline
 from toil.job import Job
 
 import utils
-from variantstore import SampleVariant
-from variantstore import Variant
-from coveragestore import AmpliconCoverage
-from coveragestore import SampleCoverage
-
-
-def process_sample(job, addresses, keyspace, authenticator, parse_functions, sample, samples, config):
-    connection.setup(addresses, keyspace, auth_provider=authenticator)
+import panels
+import timing
+import pipelines
+import artifacts
+import storage
+import annotations
+import query_metrics
+from pipelinestore import Pipeline
+
+PARSE_FUNCTIONS = {'mutect': vcf_parsing.parse_mutect_vcf_record,
+                   'freebayes': vcf_parsing.parse_freebayes_vcf_record,
+                   'vardict': vcf_parsing.parse_vardict_vcf_record,
+                   'scalpel': vcf_parsing.parse_scalpel_vcf_record,
+                   'platypus': vcf_parsing.parse_platypus_vcf_record,
+                   'pindel': vcf_parsing.parse_pindel_vcf_record}
+
+
+def ingest_library_variants(store, parse_functions, sample, samples, config, timer=None, pipeline_id=None):
+    """Parse a library's caller and annotated VCFs and write its variants to
+    a storage backend, timing each stage in timer, and catalog the library
+    under pipeline_id. Returns the number of variants added and failed."""
+
+    if timer is None:
+        timer = timing.StageTimer("ingest")
+
+    with timer.stage("db_write"):
+        store.register_library(samples[sample], pipeline_id)
+
+    # Assigns amplicons by position to records the annotation left without one
+    panel_path = panels.get_panel_path(samples[sample]['panel'], samples[sample]['report'])
+    panel_index = panels.load_panel_file(panel_path) if os.path.exists(panel_path) else None
 
     caller_records = defaultdict(lambda: dict())
 
     sys.stdout.write("Parsing Caller VCF Files\n")
-    vcf_parsing.parse_vcf("{}.mutect.normalized.vcf".format(sample), "mutect", caller_records)
-    vcf_parsing.parse_vcf("{}.vardict.normalized.vcf".format(sample), "vardict", caller_records)
-    vcf_parsing.parse_vcf("{}.freebayes.normalized.vcf".format(sample), "freebayes", caller_records)
-    vcf_parsing.parse_vcf("{}.scalpel.normalized.vcf".format(sample), "scalpel", caller_records)
-    vcf_parsing.parse_vcf("{}.platypus.normalized.vcf".format(sample), "platypus", caller_records)
-    vcf_parsing.parse_vcf("{}.pindel.normalized.vcf".format(sample), "pindel", caller_records)
+    with timer.stage("caller_parse"):
+        vcf_parsing.parse_vcf("{}.mutect.normalized.vcf".format(sample), "mutect", caller_records)
+        vcf_parsing.parse_vcf("{}.vardict.normalized.vcf".format(sample), "vardict", caller_records)
+        vcf_parsing.parse_vcf("{}.freebayes.normalized.vcf".format(sample), "freebayes", caller_records)
+        vcf_parsing.parse_vcf("{}.scalpel.normalized.vcf".format(sample), "scalpel", caller_records)
+        vcf_parsing.parse_vcf("{}.platypus.normalized.vcf".format(sample), "platypus", caller_records)
+        vcf_parsing.parse_vcf("{}.pindel.normalized.vcf".format(sample), "pindel", caller_records)
 
     annotated_vcf = "{}.vcfanno.snpEff.GRCh37.75.vcf".format(sample)
 
-    sys.stdout.write("Parsing VCFAnno VCF\n")
-    vcf = VCF(annotated_vcf)
+    # cyvcf2 decodes records lazily, so this covers opening the file and its
+    # header; decoding each record's INFO falls under annotation_extract
+    with timer.stage("annotated_parse"):
+        sys.stdout.write("Parsing VCFAnno VCF\n")
+        vcf = VCF(annotated_vcf)
 
-    sys.stdout.write("Parsing VCFAnno VCF with CyVCF2\n")
-    reader = cyvcf2.VCFReader(annotated_vcf)
-    desc = reader["ANN"]["Description"]
-    annotation_keys = [x.strip("\"'") for x in re.split("\s*\|\s*", desc.split(":", 1)[1].strip('" '))]
+        sys.stdout.write("Parsing VCFAnno VCF with CyVCF2\n")
+        reader = cyvcf2.VCFReader(annotated_vcf)
+        desc = reader["ANN"]["Description"]
+        annotation_keys = [x.strip("\"'") for x in re.split("\s*\|\s*", desc.split(":", 1)[1].strip('" '))]
 
     # Filter out variants with minor allele frequencies above the threshold but
     # retain any that are above the threshold but in COSMIC or in ClinVar and not listed as benign.
@@ -55,12 +84,13 @@ def process_sample(job, addresses, keyspace, authenticator, parse_functions, sam
     added = 0
     failed = 0
     for variant in vcf:
+        extract_start = time.time()
         # Parsing VCF and creating data structures for Cassandra model
         callers = variant.INFO.get('CALLERS').split(',')
         effects = utils.get_effects(variant, annotation_keys)
         top_impact = utils.get_top_impact(effects)
-        population_freqs = utils.get_population_freqs(variant)
-        amplicon_data = utils.get_amplicon_data(variant)
+        population_freqs = utils.pack_population_freqs(utils.get_population_freqs(variant))
+        amplicon_data = utils.get_amplicon_data(variant, panel_index)
 
         key = (unicode("chr{}".format(variant.CHROM)), int(variant.start), int(variant.end), unicode(variant.REF),
                unicode(variant.ALT[0]))
@@ -82,10 +112,21 @@ def process_sample(job, addresses, keyspace, authenticator, parse_functions, sam
         if min_depth == 100000000:
             min_depth = -1
 
+        write_start = time.time()
+        timer.add("annotation_extract", write_start - extract_start)
+
+        # Annotations are shared by every sample carrying the variant
+        store.store_annotation(config['genome_version'], variant.CHROM, variant.start, variant.REF, variant.ALT[0],
+                               annotations.get_annotation_version(config),
+                               transcripts_data=utils.get_transcript_effects(effects),
+                               clinvar_data=utils.get_clinvar_info(variant, samples, sample),
+                               cosmic_data=utils.get_cosmic_info(variant),
+                               population_freqs_packed=population_freqs)
+
         # Create Cassandra Objects
         # Create the general variant ordered table
         try:
-            cassandra_variant = Variant.create(
+            cassandra_variant = store.create_variant(
                     reference_genome=config['genome_version'],
                     chr=variant.CHROM,
                     pos=variant.start,
@@ -117,9 +158,6 @@ def process_sample(job, addresses, keyspace, authenticator, parse_functions, sam
 
                     max_maf_all=variant.INFO.get('max_aaf_all') or -1,
                     max_maf_no_fin=variant.INFO.get('max_aaf_no_fin') or -1,
-                    transcripts_data=utils.get_transcript_effects(effects),
-                    clinvar_data=utils.get_clinvar_info(variant),
-                    cosmic_data=utils.get_cosmic_info(variant),
                     in_clinvar=vcf_parsing.var_is_in_clinvar(variant),
                     in_cosmic=vcf_parsing.var_is_in_cosmic(variant),
                     is_pathogenic=vcf_parsing.var_is_pathogenic(variant),
@@ -129,7 +167,6 @@ def process_sample(job, addresses, keyspace, authenticator, parse_functions, sam
                     rs_ids=vcf_parsing.parse_rs_ids(variant),
                     cosmic_ids=vcf_parsing.parse_cosmic_ids(variant),
                     callers=callers,
-                    population_freqs=population_freqs,
                     amplicon_data=amplicon_data,
                     max_som_aaf=max_som_aaf,
                     min_depth=min_depth,
@@ -157,7 +194,7 @@ def process_sample(job, addresses, keyspace, authenticator, parse_functions, sam
 
         # Create Cassandra Object
         try:
-            sample_variant = SampleVariant.create(
+            sample_variant = store.create_sample_variant(
                     sample=samples[sample]['sample_name'],
                     run_id=samples[sample]['run_id'],
                     library_name=samples[sample]['library_name'],
@@ -187,9 +224,6 @@ def process_sample(job, addresses, keyspace, authenticator, parse_functions, sam
                     impact_so=top_impact.so,
                     max_maf_all=variant.INFO.get('max_aaf_all') or -1,
                     max_maf_no_fin=variant.INFO.get('max_aaf_no_fin') or -1,
-                    transcripts_data=utils.get_transcript_effects(effects),
-                    clinvar_data=utils.get_clinvar_info(variant),
-                    cosmic_data=utils.get_cosmic_info(variant),
                     in_clinvar=vcf_parsing.var_is_in_clinvar(variant),
                     in_cosmic=vcf_parsing.var_is_in_cosmic(variant),
                     is_pathogenic=vcf_parsing.var_is_pathogenic(variant),
@@ -199,7 +233,6 @@ def process_sample(job, addresses, keyspace, authenticator, parse_functions, sam
                     rs_ids=vcf_parsing.parse_rs_ids(variant),
                     cosmic_ids=vcf_parsing.parse_cosmic_ids(variant),
                     callers=callers,
-                    population_freqs=population_freqs,
                     amplicon_data=amplicon_data,
                     max_som_aaf=max_som_aaf,
                     min_depth=min_depth,
@@ -225,6 +258,7 @@ def process_sample(job, addresses, keyspace, authenticator, parse_functions, sam
                 err.write("Sample: {}\t Library: {}\n".format(samples[sample]['sample_name'],
                                                               samples[sample]['library_name'], ))
         added += 1
+        timer.add("db_write", time.time() - write_start)
 
     with open("{}.sample_variant_add.log".format(samples[sample]['library_name']), "a") as err:
         err.write("Sample: {}\t Library: {}\n".format(samples[sample]['sample_name'],
@@ -232,12 +266,33 @@ def process_sample(job, addresses, keyspace, authenticator, parse_functions, sam
         err.write("Wrote {} variants to variantstore\n".format(added))
         err.write("Failed to add {} variants to variantstore\n".format(failed))
 
+    with timer.stage("db_write"):
+        store.flush()
+
+    return added, failed
+
+
+def process_sample(job, addresses, keyspace, authenticator, parse_functions, sample, samples, config,
+                   pipeline_id=None):
+    timer = timing.StageTimer("ingest", library_name=samples[sample]['library_name'], run_id=samples[sample]['run_id'])
+    store = storage.CassandraStorage(addresses, keyspace, authenticator)
+    metrics = query_metrics.QueryMetrics()
+    metrics.install()
+    try:
+        added, failed = ingest_library_variants(store, parse_functions, sample, samples, config, timer, pipeline_id)
+    finally:
+        metrics.uninstall()
+
     job.fileStore.logToMaster("Variant data for {} variants saved to Cassandra for sample {}."
                               "{} variants failed to add to database\n".format(added, sample, failed))
+    timer.write("{}.ingest_timings.json".format(samples[sample]['library_name']))
+    job.fileStore.logToMaster("Ingest timings: {}\n".format(timer.to_json()))
+    metrics.write("{}.ingest_queries.json".format(samples[sample]['library_name']))
+    job.fileStore.logToMaster("Slowest queries for sample {}:\n{}".format(sample, "".join(metrics.format_slowest())))
 
 
-def process_sample_coverage(job, addresses, keyspace, auth, sample, program, samples):
-    connection.setup(addresses, keyspace, auth_provider=auth)
+def ingest_library_coverage(store, sample, program, samples):
+    """Write a library's sambamba coverage BED to a storage backend"""
 
     with open("{}.sambamba_coverage.bed".format(samples[sample]['library_name']), 'rb') as coverage:
         reader = csv.reader(coverage, delimiter='\t')
@@ -259,35 +314,58 @@ def process_sample_coverage(job, addresses, keyspace, auth, sample, program, sam
                 threshold_data[threshold] = row[threshold_indices[index]]
                 index += 1
 
-            sample_data = SampleCoverage.create(sample=samples[sample]['sample_name'],
-                                                library_name=samples[sample]['library_name'],
-                                                run_id=samples[sample]['run_id'],
-                                                num_libraries_in_run=samples[sample]['num_libraries_in_run'],
-                                                sequencer_id=samples[sample]['sequencer'],
-                                                program_name=program,
-                                                extraction=samples[sample]['extraction'],
-                                                panel=samples[sample]['panel'],
-                                                target_pool=samples[sample]['target_pool'],
-                                                amplicon=row[3],
-                                                num_reads=row[4],
-                                                mean_coverage=row[5],
-                                                thresholds=thresholds,
-                                                perc_bp_cov_at_thresholds=threshold_data)
-
-            amplicon_data = AmpliconCoverage.create(amplicon=row[3],
-                                                    sample=samples[sample]['sample_name'],
-                                                    library_name=samples[sample]['library_name'],
-                                                    run_id=samples[sample]['run_id'],
-                                                    num_libraries_in_run=samples[sample]['num_libraries_in_run'],
-                                                    sequencer_id=samples[sample]['sequencer'],
-                                                    program_name=program,
-                                                    extraction=samples[sample]['extraction'],
-                                                    panel=samples[sample]['panel'],
-                                                    target_pool=samples[sample]['target_pool'],
-                                                    num_reads=row[4],
-                                                    mean_coverage=row[5],
-                                                    thresholds=thresholds,
-                                                    perc_bp_cov_at_thresholds=threshold_data)
+            sample_data = store.create_sample_coverage(sample=samples[sample]['sample_name'],
+                                                       library_name=samples[sample]['library_name'],
+                                                       run_id=samples[sample]['run_id'],
+                                                       num_libraries_in_run=samples[sample]['num_libraries_in_run'],
+                                                       sequencer_id=samples[sample]['sequencer'],
+                                                       program_name=program,
+                                                       extraction=samples[sample]['extraction'],
+                                                       panel=samples[sample]['panel'],
+                                                       target_pool=samples[sample]['target_pool'],
+                                                       amplicon=row[3],
+                                                       num_reads=row[4],
+                                                       mean_coverage=row[5],
+                                                       thresholds=thresholds,
+                                                       perc_bp_cov_at_thresholds=threshold_data)
+
+            amplicon_data = store.create_amplicon_coverage(amplicon=row[3],
+                                                           sample=samples[sample]['sample_name'],
+                                                           library_name=samples[sample]['library_name'],
+                                                           run_id=samples[sample]['run_id'],
+                                                           num_libraries_in_run=samples[sample]['num_libraries_in_run'],
+                                                           sequencer_id=samples[sample]['sequencer'],
+                                                           program_name=program,
+                                                           extraction=samples[sample]['extraction'],
+                                                           panel=samples[sample]['panel'],
+                                                           target_pool=samples[sample]['target_pool'],
+                                                           num_reads=row[4],
+                                                           mean_coverage=row[5],
+                                                           thresholds=thresholds,
+                                                           perc_bp_cov_at_thresholds=threshold_data)
+
+    store.flush()
+
+
+def get_libraries(samples):
+    return sorted(set([(samples[sample]['sample_name'], samples[sample]['run_id'], samples[sample]['library_name'])
+                       for sample in samples]))
+
+
+def process_sample_coverage(job, addresses, keyspace, auth, sample, program, samples):
+    ingest_library_coverage(storage.CassandraStorage(addresses, keyspace, auth), sample, program, samples)
+
+
+def update_run_artifacts(job, addresses, authenticator, matrix_path, reference_genome, run_ids, thresholds_file):
+    connection.setup(addresses, "variantstore", auth_provider=authenticator)
+    artifacts.update_run_artifacts(matrix_path, reference_genome, run_ids, thresholds_file)
+    job.fileStore.logToMaster("Updated recurrent artifacts for runs {}\n".format(", ".join(run_ids)))
+
+
+def refresh_vaf_distributions(job, addresses, authenticator, reference_genome, libraries):
+    store = storage.CassandraStorage(addresses, "variantstore", authenticator)
+    refreshed = store.refresh_vaf_distributions(reference_genome, libraries)
+    job.fileStore.logToMaster("Refreshed {} VAF distributions\n".format(refreshed))
 
 
 if __name__ == "__main__":
@@ -296,6 +374,20 @@ if __name__ == "__main__":
     parser.add_argument('-c', '--configuration', help="Configuration file for various settings")
     parser.add_argument('-a', '--address', help="IP Address for Cassandra connection", default='127.0.0.1')
     parser.add_argument('-u', '--username', help='Cassandra username for login', default=None)
+    parser.add_argument('-l', '--local_db', help="SQLite database file to load in to instead of Cassandra, "
+                                                 "without running a Toil workflow", default=None)
+    parser.add_argument('-m', '--occurrence_matrix', help="Occurrence matrix directory; when given the ingested runs "
+                                                          "are added to it and recurrent artifacts are updated",
+                        default=None)
+    parser.add_argument('-t', '--artifact_thresholds', help="JSON file of artifact thresholds by panel and run, "
+                                                            "also used by --local_db",
+                        default=None)
+    parser.add_argument('-p', '--pipeline_id', help="Id of the registered pipeline the runs were processed with, as "
+                                                    "printed by add_data_pipelinestore.py", default=None)
+    parser.add_argument('-r', '--run_type', help="Pipeline run type; without --pipeline_id the libraries are linked "
+                                                 "to the most recent pipeline registered for it", default=None)
+    parser.add_argument('--pipeline_status', help="Pipeline status to look up with --run_type",
+                        default='production')
     Job.Runner.addToilOptions(parser)
     args = parser.parse_args()
     args.logLevel = "INFO"
@@ -312,18 +404,40 @@ if __name__ == "__main__":
     else:
         auth_provider = None
 
-    parse_functions = {'mutect': vcf_parsing.parse_mutect_vcf_record,
-                       'freebayes': vcf_parsing.parse_freebayes_vcf_record,
-                       'vardict': vcf_parsing.parse_vardict_vcf_record,
-                       'scalpel': vcf_parsing.parse_scalpel_vcf_record,
-                       'platypus': vcf_parsing.parse_platypus_vcf_record,
-                       'pindel': vcf_parsing.parse_pindel_vcf_record}
+    pipeline_id = args.pipeline_id
+    if pipeline_id is None and args.run_type:
+        connection.setup([args.address], "pipelinestore", auth_provider=auth_provider)
+        try:
+            pipeline_id = pipelines.get_pipeline_id(pipelines.get_pipeline(args.run_type, args.pipeline_status))
+        except Pipeline.DoesNotExist:
+            sys.stderr.write("No {} pipeline is registered for run type {}\n".format(args.pipeline_status,
+                                                                                 args.run_type))
+            sys.exit(1)
+        sys.stdout.write("Linking libraries to pipeline {}\n".format(pipeline_id))
+
+    parse_functions = PARSE_FUNCTIONS
+
+    if args.local_db:
+        store = storage.SQLiteStorage(args.local_db)
+        for sample in samples:
+            timer = timing.StageTimer("ingest", library_name=samples[sample]['library_name'],
+                                      run_id=samples[sample]['run_id'])
+            added, failed = ingest_library_variants(store, parse_functions, sample, samples, config, timer,
+                                                    pipeline_id)
+            sys.stdout.write("Added {} variants for sample {}, {} failed\n".format(added, sample, failed))
+            timer.write("{}.ingest_timings.json".format(samples[sample]['library_name']))
+            ingest_library_coverage(store, sample, "sambamba", samples)
+        refreshed = store.refresh_vaf_distributions(config['genome_version'], get_libraries(samples))
+        sys.stdout.write("Refreshed {} VAF distributions\n".format(refreshed))
+        stored = store.update_artifacts(config['genome_version'], artifacts.read_thresholds(args.artifact_thresholds))
+        sys.stdout.write("Stored {} recurrent artifacts\n".format(stored))
+        sys.exit()
 
     root_job = Job.wrapJobFn(pipeline.spawn_batch_jobs, cores=1)
 
     for sample in samples:
         variant_job = Job.wrapJobFn(process_sample, [args.address], "variantstore", auth_provider, parse_functions,
-                                    sample, samples, config,
+                                    sample, samples, config, pipeline_id,
                                     cores=1)
 
         coverage_job = Job.wrapJobFn(process_sample_coverage, [args.address], "coveragestore", auth_provider,
@@ -333,5 +447,16 @@ if __name__ == "__main__":
         root_job.addChild(variant_job)
         root_job.addChild(coverage_job)
 
+    # Distributions cover every call of a variant, so are refreshed once all libraries are in
+    root_job.addFollowOnJobFn(refresh_vaf_distributions, [args.address], auth_provider, config['genome_version'],
+                              get_libraries(samples), cores=1)
+
+    if args.occurrence_matrix:
+        run_ids = sorted(set([samples[sample]['run_id'] for sample in samples]))
+        # Follow-on jobs may run in another working directory
+        root_job.addFollowOnJobFn(update_run_artifacts, [args.address], auth_provider,
+                                  os.path.abspath(args.occurrence_matrix), config['genome_version'], run_ids,
+                                  args.artifact_thresholds and os.path.abspath(args.artifact_thresholds), cores=1)
+
     # Start workflow execution
     Job.Runner.startToil(root_job, args)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+import sys
+import glob
+import getpass
+import argparse
+
+import logs
+from ddb import configuration
+from cassandra.auth import PlainTextAuthProvider
+from cassandra.cqlengine import connection
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--samples_file', help="Input configuration file for samples")
+    parser.add_argument('-c', '--configuration', help="Configuration file for various settings")
+    parser.add_argument('-i', '--analysis_id', help="Identifier for the analysis producing the logs",
+                        default='primary')
+    parser.add_argument('-l', '--logs', help="Glob patterns for pipeline logs, {library} is substituted",
+                        action='append', default=None)
+    parser.add_argument('-a', '--address', help="IP Address for Cassandra connection", default='127.0.0.1')
+    parser.add_argument('-u', '--username', help='Cassandra username for login', default=None)
+    args = parser.parse_args()
+
+    log_patterns = args.logs or ["{library}*.log"]
+
+    sys.stdout.write("Parsing configuration data\n")
+    config = configuration.configure_runtime(args.configuration)
+
+    sys.stdout.write("Parsing sample data\n")
+    samples = configuration.configure_samples(args.samples_file, config)
+
+    if args.username:
+        password = getpass.getpass()
+        auth_provider = PlainTextAuthProvider(username=args.username, password=password)
+        connection.setup([args.address], "logstore", auth_provider=auth_provider)
+    else:
+        connection.setup([args.address], "logstore")
+
+    for sample in samples:
+        filenames = list()
+        for pattern in log_patterns:
+            filenames.extend(glob.glob(pattern.format(library=samples[sample]['library_name'])))
+
+        if not filenames:
+            sys.stderr.write("WARNING: No logs found for library {}\n".format(samples[sample]['library_name']))
+            continue
+
+        sys.stdout.write("Storing {} logs for library {}\n".format(len(filenames),
+                                                                  samples[sample]['library_name']))
+        logs.store_library_logs(samples[sample], args.analysis_id, sorted(set(filenames)))
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+
+import sys
+import getpass
+import argparse
+
+import pipelines
+from datetime import datetime
+from ddb import configuration
+from cassandra.auth import PlainTextAuthProvider
+from cassandra.cqlengine import connection
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', '--configuration', help="Configuration file for various settings")
+    parser.add_argument('-r', '--run_type', help="Pipeline run type")
+    parser.add_argument('-s', '--status', help="Pipeline status (e.g. production, testing)", default='production')
+    parser.add_argument('-a', '--address', help="IP Address for Cassandra connection", default='127.0.0.1')
+    parser.add_argument('-u', '--username', help='Cassandra username for login', default=None)
+    args = parser.parse_args()
+
+    sys.stdout.write("Parsing configuration data\n")
+    config = configuration.configure_runtime(args.configuration)
+    files, tool_configs = pipelines.split_runtime_config(config)
+
+    if args.username:
+        password = getpass.getpass()
+        auth_provider = PlainTextAuthProvider(username=args.username, password=password)
+        connection.setup([args.address], "pipelinestore", auth_provider=auth_provider)
+    else:
+        connection.setup([args.address], "pipelinestore")
+
+    pipeline = pipelines.register_pipeline(args.run_type, args.status, datetime.now(), tool_configs, **files)
+    sys.stdout.write("Pipeline id: {}\n".format(pipelines.get_pipeline_id(pipeline)))
+    for tool in sorted(pipeline.config_hashes):
+        sys.stdout.write("{}\t{}\n".format(tool, pipeline.config_hashes[tool]))
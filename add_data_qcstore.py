@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+import sys
+import glob
+import getpass
+import argparse
+
+import qc
+from ddb import configuration
+from cassandra.auth import PlainTextAuthProvider
+from cassandra.cqlengine import connection
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--samples_file', help="Input configuration file for samples")
+    parser.add_argument('-c', '--configuration', help="Configuration file for various settings")
+    parser.add_argument('-i', '--analysis_id', help="Identifier for the analysis producing the QC data",
+                        default='primary')
+    parser.add_argument('-f', '--fastqc', help="Glob patterns for FastQC outputs, {library} is substituted",
+                        action='append', default=None)
+    parser.add_argument('-p', '--picard', help="Glob patterns for Picard metrics files, {library} is substituted",
+                        action='append', default=None)
+    parser.add_argument('-a', '--address', help="IP Address for Cassandra connection", default='127.0.0.1')
+    parser.add_argument('-u', '--username', help='Cassandra username for login', default=None)
+    args = parser.parse_args()
+
+    fastqc_patterns = args.fastqc or ["{library}*_fastqc.zip", "{library}*_fastqc/fastqc_data.txt"]
+    picard_patterns = args.picard or ["{library}*metrics*"]
+
+    sys.stdout.write("Parsing configuration data\n")
+    config = configuration.configure_runtime(args.configuration)
+
+    sys.stdout.write("Parsing sample data\n")
+    samples = configuration.configure_samples(args.samples_file, config)
+
+    if args.username:
+        password = getpass.getpass()
+        auth_provider = PlainTextAuthProvider(username=args.username, password=password)
+        connection.setup([args.address], "qcstore", auth_provider=auth_provider)
+    else:
+        connection.setup([args.address], "qcstore")
+
+    for sample in samples:
+        filenames = list()
+        for pattern in fastqc_patterns + picard_patterns:
+            filenames.extend(glob.glob(pattern.format(library=samples[sample]['library_name'])))
+
+        if not filenames:
+            sys.stderr.write("WARNING: No QC outputs found for library {}\n".format(samples[sample]['library_name']))
+            continue
+
+        sys.stdout.write("Storing {} QC files for library {}\n".format(len(filenames),
+                                                                      samples[sample]['library_name']))
+        qc.store_library_qc(samples[sample], args.analysis_id, sorted(set(filenames)))
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+
+# Registers the libraries in a samples configuration file in the sample
+# catalog. add_data.py does this during ingest; this script backfills the
+# catalog for runs ingested before it existed.
+
+import sys
+import getpass
+import argparse
+import catalog
+
+from ddb import configuration
+from cassandra.auth import PlainTextAuthProvider
+from cassandra.cqlengine import connection
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--samples_file', help="Input configuration file for samples")
+    parser.add_argument('-c', '--configuration', help="Configuration file for various settings")
+    parser.add_argument('-a', '--address', help="IP Address for Cassandra connection", default='127.0.0.1')
+    parser.add_argument('-u', '--username', help='Cassandra username for login', default=None)
+    parser.add_argument('-p', '--pipeline_id', help="Id of the registered pipeline the runs were processed with",
+                        default=None)
+    args = parser.parse_args()
+
+    sys.stdout.write("Parsing configuration data\n")
+    config = configuration.configure_runtime(args.configuration)
+
+    sys.stdout.write("Parsing sample data\n")
+    samples = configuration.configure_samples(args.samples_file, config)
+
+    if args.username:
+        password = getpass.getpass()
+        auth_provider = PlainTextAuthProvider(username=args.username, password=password)
+        connection.setup([args.address], "samplestore", auth_provider=auth_provider)
+    else:
+        connection.setup([args.address], "samplestore")
+
+    for sample in samples:
+        sys.stdout.write("Registering library {}\n".format(samples[sample]['library_name']))
+        catalog.register_library(samples[sample], args.pipeline_id)
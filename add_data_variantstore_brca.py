@@ -19,8 +19,9 @@ from ddb_ngsflow import pipeline
 from toil.job import Job
 
 import utils
+import annotations
+import routing
 from variantstore import SampleVariant
-from variantstore import Variant
 
 
 def process_sample(job, addresses, keyspace, authenticator, parse_functions,
@@ -57,7 +58,7 @@ def process_sample(job, addresses, keyspace, authenticator, parse_functions,
         callers = variant.INFO.get('CALLERS').split(',')
         effects = utils.get_effects(variant, annotation_keys)
         top_impact = utils.get_top_impact(effects)
-        population_freqs = utils.get_population_freqs(variant)
+        population_freqs = utils.pack_population_freqs(utils.get_population_freqs(variant))
         amplicon_data = utils.get_amplicon_data(variant)
 
         key = (unicode("chr{}".format(variant.CHROM)), int(variant.start), int(variant.end), unicode(variant.REF),
@@ -80,10 +81,18 @@ def process_sample(job, addresses, keyspace, authenticator, parse_functions,
         if min_depth == 100000000:
             min_depth = -1
 
+        # Annotations are shared by every sample carrying the variant
+        annotations.store_annotation(config['genome_version'], variant.CHROM, variant.start, variant.REF,
+                                     variant.ALT[0], annotations.get_annotation_version(config),
+                                     transcripts_data=utils.get_transcript_effects(effects),
+                                     clinvar_data=utils.get_clinvar_info(variant, samples, sample),
+                                     cosmic_data=utils.get_cosmic_info(variant),
+                                     population_freqs_packed=population_freqs)
+
         # Create Cassandra Objects
         # Create the general variant ordered table
         try:
-            cassandra_variant = Variant.create(
+            cassandra_variant = routing.create_variant(
                     reference_genome=config['genome_version'],
                     chr=variant.CHROM,
                     pos=variant.start,
@@ -115,9 +124,6 @@ def process_sample(job, addresses, keyspace, authenticator, parse_functions,
 
                     max_maf_all=variant.INFO.get('max_aaf_all') or -1,
                     max_maf_no_fin=variant.INFO.get('max_aaf_no_fin') or -1,
-                    transcripts_data=utils.get_transcript_effects(effects),
-                    clinvar_data=utils.get_clinvar_info(variant, samples, sample),
-                    cosmic_data=utils.get_cosmic_info(variant),
                     in_clinvar=vcf_parsing.var_is_in_clinvar(variant),
                     in_cosmic=vcf_parsing.var_is_in_cosmic(variant),
                     is_pathogenic=vcf_parsing.var_is_pathogenic(variant),
@@ -127,7 +133,6 @@ def process_sample(job, addresses, keyspace, authenticator, parse_functions,
                     rs_ids=vcf_parsing.parse_rs_ids(variant),
                     cosmic_ids=vcf_parsing.parse_cosmic_ids(variant),
                     callers=callers,
-                    population_freqs=population_freqs,
                     amplicon_data=amplicon_data,
                     max_som_aaf=max_som_aaf,
                     min_depth=min_depth,
@@ -184,9 +189,6 @@ def process_sample(job, addresses, keyspace, authenticator, parse_functions,
                     impact_so=top_impact.so,
                     max_maf_all=variant.INFO.get('max_aaf_all') or -1,
                     max_maf_no_fin=variant.INFO.get('max_aaf_no_fin') or -1,
-                    transcripts_data=utils.get_transcript_effects(effects),
-                    clinvar_data=utils.get_clinvar_info(variant, samples, sample),
-                    cosmic_data=utils.get_cosmic_info(variant),
                     in_clinvar=vcf_parsing.var_is_in_clinvar(variant),
                     in_cosmic=vcf_parsing.var_is_in_cosmic(variant),
                     is_pathogenic=vcf_parsing.var_is_pathogenic(variant),
@@ -196,7 +198,6 @@ def process_sample(job, addresses, keyspace, authenticator, parse_functions,
                     rs_ids=vcf_parsing.parse_rs_ids(variant),
                     cosmic_ids=vcf_parsing.parse_cosmic_ids(variant),
                     callers=callers,
-                    population_freqs=population_freqs,
                     amplicon_data=amplicon_data,
                     max_som_aaf=max_som_aaf,
                     min_depth=min_depth,
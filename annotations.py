@@ -0,0 +1,160 @@
+from datetime import datetime
+
+from variantstore import AnnotationRelease
+from variantstore import VariantAnnotation
+from cassandra.cqlengine import connection
+from cassandra.concurrent import execute_concurrent_with_args
+
+# Annotation columns kept in VariantAnnotation rather than copied in to every
+# Variant, SampleVariant and TargetVariant row
+ANNOTATION_COLUMNS = ('transcripts_data', 'population_freqs_packed', 'clinvar_data', 'cosmic_data')
+
+DEFAULT_ANNOTATION_VERSION = 'default'
+
+# Keys of the clinvar_data and cosmic_data maps, as utils.get_clinvar_info and
+# utils.get_cosmic_info write them
+CLINVAR_KEYS = ('significance', 'pathogenic', 'hgvs', 'revstatus', 'org', 'disease', 'accession', 'origin')
+COSMIC_KEYS = ('ids', 'num_samples', 'cds', 'aa', 'gene')
+
+# (reference_genome, chr, pos, ref, alt, annotation_version) -> annotation
+# dict, or None when no annotation is stored. A version of None means the
+# newest stored release.
+_annotation_cache = dict()
+
+# annotation_version -> date the release was registered in AnnotationRelease.
+# A variant's newest annotation is the one of its most recently registered
+# release; the default version, and versions written before the registry,
+# rank below every registered release.
+_release_dates = None
+
+
+def get_annotation_version(config):
+    return config.get('annotation_version') or DEFAULT_ANNOTATION_VERSION
+
+
+def get_release_dates(refresh=False):
+    global _release_dates
+    if _release_dates is None or refresh:
+        _release_dates = dict((release.annotation_version, release.date_registered)
+                              for release in AnnotationRelease.objects.timeout(None).limit(None))
+
+    return _release_dates
+
+
+def register_release(annotation_version):
+    """Record a new annotation release as the newest one. Registering a known
+    release again keeps its original date."""
+
+    if annotation_version == DEFAULT_ANNOTATION_VERSION or annotation_version in get_release_dates():
+        return
+
+    if annotation_version not in get_release_dates(refresh=True):
+        date_registered = datetime.now()
+        AnnotationRelease.create(annotation_version=annotation_version, date_registered=date_registered)
+        _release_dates[annotation_version] = date_registered
+
+
+def release_rank(annotation_version, release_dates):
+    if annotation_version == DEFAULT_ANNOTATION_VERSION:
+        return datetime.min
+
+    return release_dates.get(annotation_version, datetime.min)
+
+
+def newest_annotation(rows, release_dates):
+    """The row of the most recently registered release among a variant's
+    annotation rows, or None"""
+
+    newest = None
+    for row in rows:
+        if newest is None or release_rank(row['annotation_version'], release_dates) > \
+                release_rank(newest['annotation_version'], release_dates):
+            newest = row
+
+    return newest
+
+
+def get_empty_annotation():
+    """Annotation columns of a variant with no stored annotation, with the
+    'None' placeholders ingest writes for records without ClinVar or COSMIC
+    data"""
+
+    return {'transcripts_data': dict(),
+            'population_freqs_packed': None,
+            'clinvar_data': dict((key, 'None') for key in CLINVAR_KEYS),
+            'cosmic_data': dict((key, 'None') for key in COSMIC_KEYS)}
+
+
+def store_annotation(reference_genome, chr, pos, ref, alt, annotation_version, **annotation):
+    """Write the annotation of a distinct variant for an annotation release.
+    Each variant and release is written at most once per process, however
+    many samples carry the variant."""
+
+    key = (reference_genome, chr, pos, ref, alt, annotation_version)
+    if _annotation_cache.get(key) is not None:
+        return
+
+    register_release(annotation_version)
+    VariantAnnotation.create(reference_genome=reference_genome,
+                             chr=chr,
+                             pos=pos,
+                             ref=ref,
+                             alt=alt,
+                             annotation_version=annotation_version,
+                             date_annotated=datetime.now(),
+                             **annotation)
+
+    _annotation_cache[key] = annotation
+
+
+def get_annotations(keys, annotation_version=None, concurrency=100):
+    """Look up annotations for (reference_genome, chr, pos, ref, alt) keys,
+    querying only the keys not already cached. Returns a dict of key ->
+    annotation dict (None for variants with no stored annotation)."""
+
+    missing = sorted(set([key for key in keys if key + (annotation_version,) not in _annotation_cache]))
+    if missing:
+        session = connection.get_session()
+        cql = "SELECT annotation_version, {} FROM {} WHERE reference_genome = ? AND chr = ? AND pos = ? AND " \
+              "ref = ? AND alt = ?".format(", ".join(ANNOTATION_COLUMNS), VariantAnnotation.column_family_name())
+        parameters = [list(key) for key in missing]
+        if annotation_version is not None:
+            cql += " AND annotation_version = ?"
+            parameters = [key + [annotation_version] for key in parameters]
+
+        # Every release of a variant is read and the newest picked by the
+        # registry, as version strings do not sort by release
+        release_dates = get_release_dates()
+        results = execute_concurrent_with_args(session, session.prepare(cql), parameters, concurrency=concurrency,
+                                               raise_on_first_error=True)
+        for key, (success, rows) in zip(missing, results):
+            annotation = None
+            row = newest_annotation(rows, release_dates)
+            if row is not None:
+                annotation = dict((column, row[column]) for column in ANNOTATION_COLUMNS)
+            _annotation_cache[key + (annotation_version,)] = annotation
+
+    return dict((key, _annotation_cache[key + (annotation_version,)]) for key in keys)
+
+
+def join_annotations(variants, annotation_version=None):
+    """Fill the annotation columns of variant rows from VariantAnnotation and
+    return the rows as a list. Rows written before annotations were
+    normalized still carry their own data and are left as they are. Rows
+    without a stored annotation get get_empty_annotation()."""
+
+    variants = list(variants)
+    keys = [(variant.reference_genome, variant.chr, variant.pos, variant.ref, variant.alt)
+            for variant in variants if not variant.clinvar_data]
+    found = get_annotations(keys, annotation_version)
+
+    for variant in variants:
+        if variant.clinvar_data:
+            continue
+        annotation = found[(variant.reference_genome, variant.chr, variant.pos, variant.ref, variant.alt)]
+        if annotation is None:
+            annotation = get_empty_annotation()
+        for column in ANNOTATION_COLUMNS:
+            setattr(variant, column, annotation[column])
+
+    return variants
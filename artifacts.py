@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+
+# Maintains the RecurrentArtifact table: per panel, the variants carried by
+# too many of the panel's samples, or by too many of the samples of a single
+# run, to be real somatic calls. Counts come from the occurrence matrix, so
+# after a run is ingested only the matrix rows of that run are read from
+# Cassandra and only the panels the run touches are recomputed.
+
+import sys
+import json
+import getpass
+import argparse
+
+import numpy as np
+import scipy.sparse as sparse
+
+from datetime import datetime
+from collections import defaultdict
+
+import catalog
+import variant_keys
+import occurrence_matrix
+from variantstore import RecurrentArtifact
+from cassandra.cqlengine import connection
+from cassandra.auth import PlainTextAuthProvider
+
+# Overridden by the 'default', 'panels' and 'runs' sections of a thresholds
+# file, in that order. A variant is a panel artifact when carried by at least
+# min_samples samples making up at least min_fraction of the panel's samples,
+# and a run artifact when carried by at least min_run_samples samples making
+# up at least min_run_fraction of a run's samples on the panel.
+DEFAULT_THRESHOLDS = {'min_samples': 5,
+                      'min_fraction': 0.5,
+                      'min_run_samples': 3,
+                      'min_run_fraction': 0.75}
+
+_artifact_cache = dict()
+
+
+def read_thresholds(filename):
+    if not filename:
+        return dict()
+
+    with open(filename, "r") as thresholds_file:
+        return json.load(thresholds_file)
+
+
+def get_thresholds(settings, panel_name, run_id=None):
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    thresholds.update(settings.get('default', dict()))
+    thresholds.update(settings.get('panels', dict()).get(panel_name, dict()))
+    if run_id is not None:
+        thresholds.update(settings.get('runs', dict()).get(run_id, dict()))
+
+    return thresholds
+
+
+def count_carrier_samples(occurrences, libraries):
+    """Number of distinct samples among the given libraries carrying each
+    variant, in matrix column order, and the number of samples"""
+
+    samples = sorted(set([library[0] for library in libraries]))
+    sample_ids = dict((sample, index) for index, sample in enumerate(samples))
+    rows = [occurrences.library_index[library] for library in libraries]
+
+    # Sums the libraries of each sample, so a sample sequenced twice counts once
+    indicator = sparse.csr_matrix((np.ones(len(rows)), ([sample_ids[library[0]] for library in libraries], rows)),
+                                  shape=(len(samples), occurrences.matrix.shape[0]))
+    carried = indicator.dot((occurrences.matrix != 0).astype(np.float32))
+
+    return np.asarray((carried > 0).sum(axis=0)).ravel(), len(samples)
+
+
+def find_panel_artifacts(occurrences, panel_libraries, panel_name, settings):
+    """{variant key: artifact values} for the libraries of a panel"""
+
+    artifacts = dict()
+    if not panel_libraries:
+        return artifacts
+
+    thresholds = get_thresholds(settings, panel_name)
+    counts, num_samples = count_carrier_samples(occurrences, panel_libraries)
+    for col in np.nonzero(counts >= thresholds['min_samples'])[0]:
+        fraction = float(counts[col]) / num_samples
+        if fraction >= thresholds['min_fraction']:
+            artifacts[occurrences.variants[col]] = {'reason': "panel", 'num_samples': int(counts[col]),
+                                                    'fraction': fraction, 'runs': list()}
+
+    run_libraries = defaultdict(list)
+    for library in panel_libraries:
+        run_libraries[library[2]].append(library)
+
+    for run_id in sorted(run_libraries):
+        thresholds = get_thresholds(settings, panel_name, run_id)
+        counts, num_samples = count_carrier_samples(occurrences, run_libraries[run_id])
+        for col in np.nonzero(counts >= thresholds['min_run_samples'])[0]:
+            fraction = float(counts[col]) / num_samples
+            if fraction < thresholds['min_run_fraction']:
+                continue
+            variant = occurrences.variants[col]
+            if variant not in artifacts:
+                artifacts[variant] = {'reason': "run", 'num_samples': int(counts[col]), 'fraction': fraction,
+                                      'runs': list()}
+            artifacts[variant]['runs'].append(run_id)
+
+    return artifacts
+
+
+def write_panel_artifacts(reference_genome, panel_name, artifacts):
+    """Replace the panel's RecurrentArtifact partition with the given
+    artifacts, removing variants that no longer qualify"""
+
+    existing = RecurrentArtifact.objects.timeout(None).filter(
+        RecurrentArtifact.reference_genome == reference_genome,
+        RecurrentArtifact.panel_name == panel_name
+    ).limit(None)
+    stale = [(row.chr, row.pos, row.ref, row.alt) for row in existing
+             if (row.chr, row.pos, row.ref, row.alt) not in artifacts]
+
+    for (chr, pos, ref, alt), artifact in artifacts.items():
+        RecurrentArtifact.create(reference_genome=reference_genome, panel_name=panel_name, chr=chr, pos=pos, ref=ref,
+                                 alt=alt, date_updated=datetime.now(), **artifact)
+
+    for chr, pos, ref, alt in stale:
+        RecurrentArtifact.objects.filter(reference_genome=reference_genome, panel_name=panel_name, chr=chr, pos=pos,
+                                         ref=ref, alt=alt).delete()
+
+    return len(stale)
+
+
+def update_artifacts(reference_genome, occurrences, settings, panels=None):
+    """Recompute and store the artifacts of the given panels, or of every
+    panel in the occurrence matrix"""
+
+    library_panels = catalog.get_library_panels()
+    panel_libraries = defaultdict(list)
+    for library in occurrences.libraries:
+        if library in library_panels:
+            panel_libraries[library_panels[library]].append(library)
+
+    for panel_name in sorted(panels if panels is not None else panel_libraries):
+        artifacts = find_panel_artifacts(occurrences, panel_libraries[panel_name], panel_name, settings)
+        removed = write_panel_artifacts(reference_genome, panel_name, artifacts)
+        sys.stdout.write("{}: {} recurrent artifacts, {} removed\n".format(panel_name, len(artifacts), removed))
+
+
+def update_run_artifacts(matrix_path, reference_genome, run_ids=None, thresholds_file=None):
+    """Load new (or the given) runs in to the occurrence matrix and update
+    the artifacts of the panels they were sequenced on"""
+
+    if run_ids is None:
+        loaded = occurrence_matrix.OccurrenceMatrix.load(matrix_path).runs
+        run_ids = [run_id for run_id in catalog.get_run_ids() if run_id not in loaded]
+
+    occurrences = occurrence_matrix.update_matrix(matrix_path, reference_genome, run_ids)
+    panels = set([library.panel_name for run_id in run_ids for library in catalog.get_run_libraries(run_id)])
+    update_artifacts(reference_genome, occurrences, read_thresholds(thresholds_file), panels)
+
+
+def get_artifacts(reference_genome, panel_name):
+    """Set of the variant keys of a panel's artifacts, read once per
+    process"""
+
+    key = (reference_genome, panel_name)
+    if key not in _artifact_cache:
+        rows = RecurrentArtifact.objects.timeout(None).filter(
+            RecurrentArtifact.reference_genome == reference_genome,
+            RecurrentArtifact.panel_name == panel_name
+        ).limit(None)
+        _artifact_cache[key] = frozenset([variant_keys.variant_key(row.chr, row.pos, row.ref, row.alt)
+                                          for row in rows])
+
+    return _artifact_cache[key]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-m', '--matrix', help="Directory holding the occurrence matrix")
+    parser.add_argument('-g', '--genome', help="Reference genome version", default='GRCh37.75')
+    parser.add_argument('-t', '--thresholds', help="JSON file of artifact thresholds by panel and run",
+                        default=None)
+    parser.add_argument('-r', '--runs', help="Comma separated run ids to (re-)load, instead of all new runs",
+                        default=None)
+    parser.add_argument('-p', '--all_panels', help="Recompute every panel, e.g. after changing thresholds",
+                        action='store_true')
+    parser.add_argument('-a', '--address', help="IP Address for Cassandra connection", default='127.0.0.1')
+    parser.add_argument('-u', '--username', help='Cassandra username for login', default=None)
+    args = parser.parse_args()
+
+    if args.username:
+        password = getpass.getpass()
+        auth_provider = PlainTextAuthProvider(username=args.username, password=password)
+        connection.setup([args.address], "variantstore", auth_provider=auth_provider)
+    else:
+        connection.setup([args.address], "variantstore")
+
+    if args.all_panels:
+        occurrences = occurrence_matrix.update_matrix(args.matrix, args.genome,
+                                                      args.runs.split(',') if args.runs else None)
+        update_artifacts(args.genome, occurrences, read_thresholds(args.thresholds))
+    else:
+        update_run_artifacts(args.matrix, args.genome, args.runs.split(',') if args.runs else None, args.thresholds)
@@ -0,0 +1,65 @@
+import csv
+
+from collections import defaultdict
+from multiprocessing.pool import ThreadPool
+
+import routing
+from variantstore import BucketedVariant
+
+
+def read_variant_list(filename, columns=(0, 1, 2, 3)):
+    """Read (chr, pos, ref, alt) keys from a tab delimited variant list, taking
+    the four fields from the given column indices"""
+
+    keys = list()
+    with open(filename, "r") as variants_list:
+        reader = csv.reader(variants_list, dialect='excel-tab')
+        for row in reader:
+            keys.append((row[columns[0]], int(row[columns[1]]), row[columns[2]], row[columns[3]]))
+
+    return keys
+
+
+def group_by_partition(keys):
+    partitions = defaultdict(set)
+    for chr, pos, ref, alt in keys:
+        partitions[(chr, routing.get_bin(pos))].add((chr, pos, ref, alt))
+
+    return partitions
+
+
+def lookup_partition(reference_genome, chr, bin, keys):
+    positions = sorted(set([key[1] for key in keys]))
+    variants = BucketedVariant.objects.timeout(None).filter(
+        BucketedVariant.reference_genome == reference_genome,
+        BucketedVariant.chr == chr,
+        BucketedVariant.bin == bin,
+        BucketedVariant.pos.in_(positions)
+    ).limit(None)
+
+    matches = list()
+    for variant in variants:
+        if (variant.chr, variant.pos, variant.ref, variant.alt) in keys:
+            matches.append(variant)
+
+    return matches
+
+
+def lookup_variants(reference_genome, keys, threads=8):
+    """Yield all stored variants matching the keys. Keys are grouped by
+    BucketedVariant partition and each partition is read with a single query,
+    running up to `threads` queries concurrently. Matches are yielded as each
+    partition completes, so output order follows partition completion."""
+
+    partitions = group_by_partition(keys)
+
+    pool = ThreadPool(threads)
+    try:
+        for matches in pool.imap_unordered(lambda partition: lookup_partition(reference_genome, partition[0],
+                                                                              partition[1], partitions[partition]),
+                                           partitions.keys()):
+            for variant in matches:
+                yield variant
+    finally:
+        pool.close()
+        pool.join()
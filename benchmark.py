@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+
+# Measures ingest throughput, report query latency and peak memory on a
+# synthetic run. Inputs are generated by synthetic.py, loaded with
+# add_data.ingest_library_variants/ingest_library_coverage and reported with
+# report.classify_sample_variants/write_sample_report, against a local SQLite
+# store by default or a test Cassandra cluster with --address. The results
+# are written as JSON and can be compared with an earlier run's results to
+# catch regressions.
+
+import os
+import sys
+import json
+import time
+import getpass
+import argparse
+import resource
+import tempfile
+
+import numpy as np
+
+from collections import defaultdict
+
+import report
+import panels
+import timing
+import storage
+import add_data
+import synthetic
+from cassandra.auth import PlainTextAuthProvider
+
+# Metrics where larger is better; the rest are times and sizes
+HIGHER_IS_BETTER = ('variants_per_second', 'coverage_rows_per_second')
+
+
+class TimedStorage(object):
+    """Wraps a storage backend, recording the latency of each read"""
+
+    def __init__(self, store):
+        self.store = store
+        self.latencies = defaultdict(list)
+
+    def __getattr__(self, name):
+        attribute = getattr(self.store, name)
+        if not name.startswith("get_"):
+            return attribute
+
+        def timed(*args, **kwargs):
+            start = time.time()
+            result = attribute(*args, **kwargs)
+            self.latencies[name].append(time.time() - start)
+            return result
+
+        return timed
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def latency_summary(latencies):
+    if not latencies:
+        return {'count': 0}
+
+    return {'count': len(latencies),
+            'p50_ms': float(np.percentile(latencies, 50)) * 1000,
+            'p99_ms': float(np.percentile(latencies, 99)) * 1000,
+            'max_ms': max(latencies) * 1000}
+
+
+def run_ingest(store, libraries, config):
+    timer = timing.StageTimer("ingest")
+    added = 0
+    start = time.time()
+    for library_name in sorted(libraries):
+        library_added, failed = add_data.ingest_library_variants(store, add_data.PARSE_FUNCTIONS, library_name,
+                                                                 libraries, config, timer)
+        added += library_added
+    variant_seconds = time.time() - start
+
+    coverage_rows = 0
+    start = time.time()
+    for library_name in sorted(libraries):
+        add_data.ingest_library_coverage(store, library_name, "sambamba", libraries)
+        with open("{}.sambamba_coverage.bed".format(library_name), "r") as bed:
+            coverage_rows += len(bed.readlines()) - 1
+    coverage_seconds = time.time() - start
+
+    with timer.stage("distribution_refresh"):
+        store.refresh_vaf_distributions(config['genome_version'], add_data.get_libraries(libraries))
+
+    return {'variants': added,
+            'variant_seconds': variant_seconds,
+            'variants_per_second': added / variant_seconds,
+            'coverage_rows': coverage_rows,
+            'coverage_seconds': coverage_seconds,
+            'coverage_rows_per_second': coverage_rows / coverage_seconds,
+            'stages': timer.summary()['stages']}
+
+
+def run_report(store, samples, config, thresholds, callers, num_reports):
+    timed_store = TimedStorage(store)
+    timer = timing.StageTimer("report")
+
+    start = time.time()
+    amplicon_stats = report.get_amplicon_coverage_stats(timed_store, report.list_amplicons(samples))
+    stats_seconds = time.time() - start
+
+    sample_seconds = list()
+    for sample in sorted(samples)[:num_reports]:
+        start = time.time()
+        report_data, reportable_amplicons = report.classify_sample_variants(timed_store, config, sample, samples,
+                                                                            thresholds, lambda message: None, timer)
+        with timer.stage("workbook_write"):
+            report.write_sample_report(sample, samples, report_data, reportable_amplicons, thresholds, callers,
+                                       amplicon_stats)
+        sample_seconds.append(time.time() - start)
+
+    queries = dict((name, latency_summary(timed_store.latencies[name])) for name in timed_store.latencies)
+    queries['all'] = latency_summary([latency for name in timed_store.latencies
+                                      for latency in timed_store.latencies[name]])
+
+    return {'amplicon_stats_seconds': stats_seconds,
+            'reports': len(sample_seconds),
+            'sample_report': latency_summary(sample_seconds),
+            'queries': queries,
+            'stages': timer.summary()['stages']}
+
+
+def flatten_results(results, prefix=""):
+    flat = dict()
+    for key, value in results.items():
+        name = "{}.{}".format(prefix, key) if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten_results(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+
+    return flat
+
+
+def compare_results(results, baseline, tolerance):
+    """Metrics that are more than tolerance (a fraction) worse than in the
+    baseline results, as (name, baseline, current) tuples"""
+
+    current = flatten_results(results)
+    previous = flatten_results(baseline)
+
+    regressions = list()
+    for name in sorted(current):
+        if name.startswith("scale.") or name.endswith((".count", ".calls")):
+            continue
+        if name not in previous or not previous[name]:
+            continue
+        if name.split(".")[-1] in HIGHER_IS_BETTER:
+            worse = current[name] < previous[name] * (1 - tolerance)
+        else:
+            worse = current[name] > previous[name] * (1 + tolerance)
+        if worse:
+            regressions.append((name, previous[name], current[name]))
+
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--num_samples', help="Number of synthetic samples", type=int, default=32)
+    parser.add_argument('-v', '--num_variants', help="Variants per sample", type=int, default=500)
+    parser.add_argument('-m', '--num_amplicons', help="Amplicons in the synthetic panel", type=int, default=1000)
+    parser.add_argument('-f', '--recurrence', help="Fraction of each sample's variants drawn from a shared pool",
+                        type=float, default=0.3)
+    parser.add_argument('-k', '--num_reports', help="Number of samples to report on", type=int, default=8)
+    parser.add_argument('-s', '--seed', help="Random seed for the synthetic data", type=int, default=1)
+    parser.add_argument('-w', '--workdir', help="Directory for the synthetic files, store and reports, defaults to "
+                                                "a new temporary directory", default=None)
+    parser.add_argument('-o', '--output', help="File to write the JSON results to", default=None)
+    parser.add_argument('-b', '--baseline', help="JSON results of an earlier run to compare against", default=None)
+    parser.add_argument('-t', '--tolerance', help="Fraction a metric may worsen by before it is reported as a "
+                                                  "regression", type=float, default=0.2)
+    parser.add_argument('-a', '--address', help="IP Address of a test Cassandra cluster to benchmark instead of a "
+                                                "local SQLite store", default=None)
+    parser.add_argument('-u', '--username', help='Cassandra username for login', default=None)
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="ddb_benchmark_"))
+    if not os.path.isdir(workdir):
+        os.makedirs(workdir)
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    os.chdir(workdir)
+
+    config = {'genome_version': 'GRCh37.75'}
+    thresholds = {'min_saf': 0.01, 'max_maf': 0.005, 'depth': 200.0}
+    callers = ("mutect", "platypus", "vardict", "scalpel", "freebayes", "pindel")
+
+    sys.stderr.write("Generating {} samples with {} variants each in {}\n".format(args.num_samples,
+                                                                                 args.num_variants, workdir))
+    libraries = synthetic.generate_libraries(args.num_samples)
+    panels.PANEL_ROOT = os.path.join(workdir, "panels")
+    synthetic.generate_run_files(workdir, panels.PANEL_ROOT, libraries, args.num_variants, args.num_amplicons,
+                                 args.recurrence, args.seed)
+
+    if args.address:
+        auth_provider = None
+        if args.username:
+            password = getpass.getpass()
+            auth_provider = PlainTextAuthProvider(username=args.username, password=password)
+        store = storage.get_storage(addresses=[args.address], auth_provider=auth_provider)
+    else:
+        store = storage.get_storage(os.path.join(workdir, "benchmark.sqlite"))
+
+    results = {'scale': {'samples': args.num_samples, 'variants_per_sample': args.num_variants,
+                         'amplicons': args.num_amplicons, 'recurrence': args.recurrence},
+               'backend': "cassandra" if args.address else "sqlite"}
+
+    sys.stderr.write("Benchmarking ingest\n")
+    results['ingest'] = run_ingest(store, libraries, config)
+    results['ingest']['peak_rss_mb'] = peak_rss_mb()
+
+    sys.stderr.write("Benchmarking reports\n")
+    results['report'] = run_report(store, synthetic.merge_libraries(libraries), config, thresholds, callers,
+                                   args.num_reports)
+    results['report']['peak_rss_mb'] = peak_rss_mb()
+
+    summary = json.dumps(results, indent=2, sort_keys=True)
+    if output:
+        with open(output, "w") as results_file:
+            results_file.write(summary + "\n")
+    sys.stdout.write(summary + "\n")
+
+    if baseline:
+        with open(baseline, "r") as baseline_file:
+            regressions = compare_results(results, json.load(baseline_file), args.tolerance)
+        for name, previous, current in regressions:
+            sys.stderr.write("Regression in {}: {:.3f} -> {:.3f}\n".format(name, previous, current))
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,13 @@
+import zlib
+
+# Blob columns hold zlib compressed bytes. Level 6 is zlib's default trade-off
+# and text outputs (logs, QC reports) typically shrink 5-10x.
+COMPRESSION_LEVEL = 6
+
+
+def compress(data):
+    return zlib.compress(data, COMPRESSION_LEVEL)
+
+
+def decompress(blob):
+    return zlib.decompress(blob)
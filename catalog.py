@@ -0,0 +1,88 @@
+import re
+
+from datetime import datetime
+
+from samplestore import Sample
+from samplestore import SampleReport
+
+
+def normalize_report(report):
+    """Report template name as written to and sliced in SampleReport, so
+    report prefixes match whatever their case"""
+
+    return report.lower()
+
+
+def get_report_group(report):
+    """Partition key for SampleReport: the leading alphanumeric run of the
+    normalized report template name (Colorectal_v2.bed -> colorectal)"""
+
+    return re.split(r'[^a-z0-9]', normalize_report(report), 1)[0]
+
+
+def register_library(library, pipeline_id=None):
+    """Record a library's metadata, as parsed from a samples configuration file,
+    in the sample catalog"""
+
+    Sample.create(sample=library['sample_name'],
+                  library_name=library['library_name'],
+                  run_id=library['run_id'],
+                  extraction=library['extraction'],
+                  panel_name=library['panel'],
+                  report=library['report'],
+                  target_pool=library['target_pool'],
+                  sequencer=library['sequencer'],
+                  date_added=datetime.now(),
+                  pipeline_id=pipeline_id,
+                  config=dict((key, unicode(value)) for key, value in library.items()))
+
+    SampleReport.create(report_group=get_report_group(library['report']),
+                        report=normalize_report(library['report']),
+                        sample=library['sample_name'],
+                        library_name=library['library_name'],
+                        run_id=library['run_id'],
+                        panel_name=library['panel'],
+                        target_pool=library['target_pool'],
+                        sequencer=library['sequencer'])
+
+
+def get_sample_libraries(sample):
+    return Sample.objects.timeout(None).filter(Sample.sample == sample).limit(None)
+
+
+def get_run_libraries(run_id):
+    return Sample.objects.timeout(None).filter(Sample.run_id == run_id).limit(None)
+
+
+def get_report_libraries(report_prefix):
+    """Libraries whose report template starts with report_prefix, read as a
+    clustering slice of a single SampleReport partition. The prefix, of any
+    case, must include the whole report group (e.g. 'colorectal', not
+    'colo')."""
+
+    report_prefix = normalize_report(report_prefix)
+    libraries = SampleReport.objects.timeout(None).filter(
+        SampleReport.report_group == get_report_group(report_prefix),
+        SampleReport.report >= report_prefix,
+        SampleReport.report < report_prefix + u'\uffff'
+    ).limit(None)
+
+    return libraries
+
+
+def get_run_ids():
+    """All run ids registered in the catalog, sorted"""
+
+    libraries = Sample.objects.timeout(None).only(['run_id']).limit(None)
+
+    return sorted(set([library.run_id for library in libraries]))
+
+
+def get_library_panels():
+    """Panel of every library in the catalog, keyed by (sample,
+    library_name, run_id)"""
+
+    libraries = Sample.objects.timeout(None).only(['sample', 'library_name', 'run_id', 'panel_name']).limit(None)
+
+    return dict(((library.sample, library.library_name, library.run_id), library.panel_name)
+                for library in libraries)
@@ -0,0 +1,91 @@
+import routing
+import variant_keys
+from variantstore import SampleVariant
+
+# Project cohort counting. Each sample of a project gets an integer id and each
+# variant a bitmap of the samples carrying it, held as a Python long with bit
+# i set for sample i. The number of carriers is the bitmap's popcount, so a
+# cohort fraction costs the same however many samples carry the variant.
+
+
+def popcount(bitmap):
+    return bin(bitmap).count('1')
+
+
+class Cohort(object):
+    """Carrier bitmaps of variants, keyed by variant key, over the samples
+    of a project. A cohort filled with load_project() holds every
+    project variant. Otherwise each variant's carriers are looked up in
+    the variant table the first time it is asked for. Variant keys are
+    only checked for collisions, at the cost of keeping every variant's long
+    form, when check_keys is set."""
+
+    def __init__(self, samples, reference_genome=None, check_keys=False):
+        self.sample_ids = dict((sample, index) for index, sample in enumerate(sorted(samples)))
+        self.reference_genome = reference_genome
+        self.carriers = dict()
+        self.keys = variant_keys.VariantKeys() if check_keys else None
+        self.preloaded = False
+
+    def __len__(self):
+        return len(self.sample_ids)
+
+    def key(self, chr, pos, ref, alt):
+        if self.keys is None:
+            return variant_keys.variant_key(chr, pos, ref, alt)
+
+        return self.keys.key(chr, pos, ref, alt)
+
+    def add_carriers(self, sample, keys):
+        if sample not in self.sample_ids:
+            return
+
+        bit = 1 << self.sample_ids[sample]
+        carriers = self.carriers
+        for key in keys:
+            carriers[key] = carriers.get(key, 0) | bit
+
+    def load_project(self, samples):
+        """Build the bitmaps of every variant of the project with one read of
+        each library's SampleVariant partition"""
+
+        for sample in samples:
+            for library in samples[sample]:
+                variants = SampleVariant.objects.timeout(None).filter(
+                    SampleVariant.reference_genome == self.reference_genome,
+                    SampleVariant.sample == samples[sample][library]['sample_name'],
+                    SampleVariant.run_id == samples[sample][library]['run_id'],
+                    SampleVariant.library_name == samples[sample][library]['library_name']
+                ).only(['chr', 'pos', 'ref', 'alt']).limit(None)
+                self.add_carriers(sample, [self.key(variant.chr, variant.pos, variant.ref, variant.alt)
+                                           for variant in variants])
+        self.preloaded = True
+
+    def get_carriers(self, chr, pos, ref, alt, key=None):
+        """Carrier bitmap of a variant. Callers that already have the variant's
+        key can pass it to save hashing it again."""
+
+        if key is None:
+            key = self.key(chr, pos, ref, alt)
+        if key not in self.carriers and not self.preloaded:
+            matches = routing.get_variant_matches(self.reference_genome, chr, pos, ref, alt)
+            bitmap = 0
+            for match in matches:
+                if match.sample in self.sample_ids:
+                    bitmap |= 1 << self.sample_ids[match.sample]
+            self.carriers[key] = bitmap
+
+        return self.carriers.get(key, 0)
+
+    def carrier_count(self, chr, pos, ref, alt, key=None):
+        return popcount(self.get_carriers(chr, pos, ref, alt, key))
+
+    def fraction(self, chr, pos, ref, alt, key=None):
+        """Fraction of the project's samples carrying a variant"""
+
+        return float(self.carrier_count(chr, pos, ref, alt, key)) / len(self.sample_ids)
+
+    def carrier_samples(self, chr, pos, ref, alt, key=None):
+        bitmap = self.get_carriers(chr, pos, ref, alt, key)
+
+        return [sample for sample, index in self.sample_ids.items() if bitmap >> index & 1]
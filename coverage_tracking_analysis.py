@@ -16,6 +16,10 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('-l', '--list', help="File containing list of amplicon names to check")
     parser.add_argument('-r', '--report', help="Root name for reports", default='report')
+    parser.add_argument('-s', '--scan', help="Read coverage with a parallel scan of the whole table instead of "
+                                             "one query per amplicon", action='store_true')
+    parser.add_argument('-p', '--processes', help="Number of token ranges scanned concurrently with --scan",
+                        type=int, default=8)
     parser.add_argument('-a', '--address', help="IP Address for Cassandra connection", default='127.0.0.1')
     parser.add_argument('-u', '--username', help='Cassandra username for login', default=None)
     args = parser.parse_args()
@@ -24,9 +28,8 @@ if __name__ == "__main__":
     if args.username:
         password = getpass.getpass()
         auth_provider = PlainTextAuthProvider(username=args.username, password=password)
-        connection.setup([args.address], "coveragestore", auth_provider=auth_provider)
     else:
-        connection.setup([args.address], "coveragestore")
+        auth_provider = None
 
     amplicons_list = list()
     amplicon_coverage_stats = defaultdict(dict)
@@ -35,25 +38,36 @@ if __name__ == "__main__":
 
     sys.stdout.write("Parsing Amplicon List\n")
     target_amplicons = utils.get_target_amplicons(args.list)
+    seen_amplicons = set()
     for amplicon in target_amplicons:
-        if amplicon not in amplicons_list:
+        if amplicon not in seen_amplicons:
+            seen_amplicons.add(amplicon)
             amplicons_list.append(amplicon)
 
+    if args.scan:
+        sys.stdout.write("Scanning Coverage Data\n")
+        scanned_coverage = utils.scan_amplicon_coverage(amplicons_list, [args.address], auth_provider, args.processes)
+    else:
+        connection.setup([args.address], "coveragestore", auth_provider=auth_provider)
+
     sys.stdout.write("Processing Amplicon Data\n")
     for amplicon in target_amplicons:
         sys.stdout.write("Retrieving Coverage Data for {}\n".format(amplicon))
         coverage_values = list()
         coverage_values_by_month = defaultdict(list)
         coverage_values_by_run = defaultdict(list)
-        coverage_data = AmpliconCoverage.objects.timeout(None).filter(
-            AmpliconCoverage.amplicon == amplicon
-        )
-        ordered_samples = coverage_data.order_by('sample', 'run_id').limit(coverage_data.count() + 1000)
+        if args.scan:
+            ordered_samples = scanned_coverage.get(amplicon, list())
+        else:
+            coverage_data = AmpliconCoverage.objects.timeout(None).filter(
+                AmpliconCoverage.amplicon == amplicon
+            )
+            ordered_samples = coverage_data.order_by('sample', 'run_id').limit(coverage_data.count() + 1000)
         for result in ordered_samples:
-            coverage_values.append(result.mean_coverage)
-            yr_month_id = result.run_id[:4]
-            coverage_values_by_month[yr_month_id].append(result.mean_coverage)
-            coverage_values_by_run[result.run_id].append(result.mean_coverage)
+            coverage_values.append(result['mean_coverage'])
+            yr_month_id = result['run_id'][:4]
+            coverage_values_by_month[yr_month_id].append(result['mean_coverage'])
+            coverage_values_by_run[result['run_id']].append(result['mean_coverage'])
 
         amplicon_coverage_stats[amplicon]['median'] = np.median(coverage_values)
         amplicon_coverage_stats[amplicon]['std_dev'] = np.std(coverage_values)
@@ -15,6 +15,10 @@ from cassandra.auth import PlainTextAuthProvider
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('-l', '--list', help="File containing list of amplicon names to check")
+    parser.add_argument('-s', '--scan', help="Read coverage with a parallel scan of the whole table instead of "
+                                             "one query per amplicon", action='store_true')
+    parser.add_argument('-p', '--processes', help="Number of token ranges scanned concurrently with --scan",
+                        type=int, default=8)
     parser.add_argument('-a', '--address', help="IP Address for Cassandra connection", default='127.0.0.1')
     parser.add_argument('-u', '--username', help='Cassandra username for login', default=None)
     args = parser.parse_args()
@@ -23,9 +27,8 @@ if __name__ == "__main__":
     if args.username:
         password = getpass.getpass()
         auth_provider = PlainTextAuthProvider(username=args.username, password=password)
-        connection.setup([args.address], "coveragestore", auth_provider=auth_provider)
     else:
-        connection.setup([args.address], "coveragestore")
+        auth_provider = None
 
     amplicons_list = list()
     amplicon_coverage_stats = defaultdict(dict)
@@ -34,27 +37,39 @@ if __name__ == "__main__":
 
     sys.stdout.write("Parsing Amplicon List\n")
     target_amplicons = utils.get_target_amplicons(args.list)
+    seen_amplicons = set()
     for amplicon in target_amplicons:
-        if amplicon not in amplicons_list:
+        if amplicon not in seen_amplicons:
+            seen_amplicons.add(amplicon)
             amplicons_list.append(amplicon)
 
+    if args.scan:
+        sys.stdout.write("Scanning Coverage Data\n")
+        scanned_coverage = utils.scan_amplicon_coverage(amplicons_list, [args.address], auth_provider, args.processes)
+    else:
+        connection.setup([args.address], "coveragestore", auth_provider=auth_provider)
+
     sys.stdout.write("Processing Amplicon Data\n")
     for amplicon in target_amplicons:
         sys.stdout.write("Retrieving Coverage Data for {}\n".format(amplicon))
         coverage_values = list()
-        coverage_data = AmpliconCoverage.objects.timeout(None).filter(
-            AmpliconCoverage.amplicon == amplicon
-        )
+        if args.scan:
+            ordered_samples = scanned_coverage.get(amplicon, list())
+            sys.stderr.write("There are {} samples retrieved\n".format(len(ordered_samples)))
+        else:
+            coverage_data = AmpliconCoverage.objects.timeout(None).filter(
+                AmpliconCoverage.amplicon == amplicon
+            )
 
-        ordered_samples = coverage_data.order_by('sample', 'run_id').limit(coverage_data.count() + 1000)
-        sys.stderr.write("There are {} samples retrieved\n".format(coverage_data.count()))
+            ordered_samples = coverage_data.order_by('sample', 'run_id').limit(coverage_data.count() + 1000)
+            sys.stderr.write("There are {} samples retrieved\n".format(coverage_data.count()))
         sys.stdout.write("Sample\tLibrary\tRunID\tCov\n")
         num = 0
         for result in ordered_samples:
             num += 1
-            coverage_values.append(result.mean_coverage)
-            sys.stdout.write("{}\t{}\t{}\t{}\n".format(result.sample,
-                                                       result.library_name,
-                                                       result.run_id,
-                                                       result.mean_coverage))
+            coverage_values.append(result['mean_coverage'])
+            sys.stdout.write("{}\t{}\t{}\t{}\n".format(result['sample'],
+                                                       result['library_name'],
+                                                       result['run_id'],
+                                                       result['mean_coverage']))
         sys.stderr.write("Iterated {} times\n".format(num))
@@ -1,8 +1,9 @@
 #!/usr/bin/env python
 
 import sys
-import csv
 import utils
+import panels
+import annotations
 import argparse
 import getpass
 
@@ -17,16 +18,6 @@ from cassandra.cqlengine import connection
 from cassandra.auth import PlainTextAuthProvider
 
 
-def get_target_amplicons(filename):
-    amplicons_list = list()
-    with open(filename, "r") as bedfile:
-        reader = csv.reader(bedfile, dialect='excel-tab')
-        for row in reader:
-            amplicons_list.append(row[3])
-
-    return amplicons_list
-
-
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('-s', '--samples_file', help="Input configuration file for samples")
@@ -84,9 +75,9 @@ if __name__ == "__main__":
             filtered_non_target_amplicon = list()
             filtered_no_requested_caller = list()
 
-            report_panel_path = "/mnt/shared-data/ddb-configs/disease_panels/{}/{}" \
-                                "".format(samples[sample][library]['panel'], samples[sample][library]['report'])
-            target_amplicons = get_target_amplicons(report_panel_path)
+            report_panel_path = panels.get_panel_path(samples[sample][library]['panel'],
+                                                      samples[sample][library]['report'])
+            target_amplicons = panels.load_panel_file(report_panel_path)
 
             sys.stdout.write("Processing variants for library {}\n".format(library))
             sys.stdout.write("Processing amplicons for library from file {}\n".format(report_panel_path))
@@ -119,10 +110,11 @@ if __name__ == "__main__":
 
             ordered_variants = variants.order_by('library_name', 'chr', 'pos',
                                                  'ref', 'alt').limit(variants.count() + 1000)
+            ordered_variants = annotations.join_annotations(ordered_variants)
 
-            sys.stdout.write("Retrieved {} total variants\n".format(ordered_variants.count()))
+            sys.stdout.write("Retrieved {} total variants\n".format(len(ordered_variants)))
             with open("{}.{}.log".format(sample, args.report), 'a') as logfile:
-                logfile.write("Retrieved {} total variants\n".format(ordered_variants.count()))
+                logfile.write("Retrieved {} total variants\n".format(len(ordered_variants)))
 
             passing, off_target, low_freq, fbpindel_only, off_target_counts = \
                 utils.filter_variants(sample, library, args.report, target_amplicons, callers, ordered_variants)
@@ -9,6 +9,7 @@ from cassandra.cluster import Cluster
 from cassandra.cqlengine import connection
 from cassandra.auth import PlainTextAuthProvider
 from logstore import Log
+from logstore import LogChunk
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -32,3 +33,4 @@ if __name__ == "__main__":
     create_keyspace_simple("logstore", args.replication_factor)
 
     sync_table(Log)
+    sync_table(LogChunk)
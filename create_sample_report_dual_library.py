@@ -1,8 +1,9 @@
 #!/usr/bin/env python
 
 import sys
-import csv
 import utils
+import panels
+import annotations
 import argparse
 import getpass
 
@@ -16,17 +17,6 @@ from cassandra.cqlengine import connection
 from cassandra.auth import PlainTextAuthProvider
 
 
-def get_target_amplicons(filename):
-    amplicons_list = list()
-    with open(filename, "r") as bedfile:
-        reader = csv.reader(bedfile, dialect='excel-tab')
-        for row in reader:
-            sys.stdout.write("Appending amplicon {} to list\n".format(row[3]))
-            amplicons_list.append(row[3])
-
-    return amplicons_list
-
-
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('-s', '--samples_file', help="Input configuration file for samples")
@@ -80,9 +70,9 @@ if __name__ == "__main__":
             filtered_no_requested_caller = list()
             low_saf_variant = list()
 
-            report_panel_path = "/mnt/shared-data/ddb-configs/disease_panels/{}/{}" \
-                                "".format(samples[sample][library]['panel'], samples[sample][library]['report'])
-            target_amplicons = get_target_amplicons(report_panel_path)
+            report_panel_path = panels.get_panel_path(samples[sample][library]['panel'],
+                                                      samples[sample][library]['report'])
+            target_amplicons = panels.load_panel_file(report_panel_path)
 
             sys.stdout.write("Processing variants for library {}\n".format(library))
             sys.stdout.write("Processing amplicons for library from file {}\n".format(report_panel_path))
@@ -124,6 +114,7 @@ if __name__ == "__main__":
 
             ordered_variants = variants.order_by('library_name', 'chr', 'pos',
                                                  'ref', 'alt').limit(variants.count() + 1000)
+            ordered_variants = annotations.join_annotations(ordered_variants)
 
             for variant in ordered_variants:
                 if variant.amplicon_data['amplicon']:
@@ -9,8 +9,14 @@ from cassandra.cluster import Cluster
 from cassandra.cqlengine import connection
 from cassandra.auth import PlainTextAuthProvider
 from variantstore import Variant
+from variantstore import BucketedVariant
 from variantstore import SampleVariant
 from variantstore import TargetVariant
+from variantstore import VariantAnnotation
+from variantstore import AnnotationRelease
+from variantstore import RecurrentArtifact
+from variantstore import VariantVafDistribution
+from variantstore import RunVariant
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -34,5 +40,11 @@ if __name__ == "__main__":
     create_keyspace_simple("variantstore", args.replication_factor)
 
     sync_table(Variant)
+    sync_table(BucketedVariant)
     sync_table(SampleVariant)
     sync_table(TargetVariant)
+    sync_table(VariantAnnotation)
+    sync_table(AnnotationRelease)
+    sync_table(RecurrentArtifact)
+    sync_table(VariantVafDistribution)
+    sync_table(RunVariant)
@@ -3,11 +3,9 @@
 import sys
 import argparse
 import getpass
-import utils
+import deletion
 
 from ddb import configuration
-from coveragestore import AmpliconCoverage
-from coveragestore import SampleCoverage
 
 from cassandra.auth import PlainTextAuthProvider
 from cassandra.cqlengine import connection
@@ -38,18 +36,7 @@ if __name__ == "__main__":
     sys.stdout.write("Processing samples\n")
     for sample in samples:
         sys.stdout.write("Deleting coverage for sample {}\n".format(sample))
-        report_panel_path = "/mnt/shared-data/ddb-configs/disease_panels/{}/{}" \
-                            "".format(samples[sample]['panel'], samples[sample]['report'])
-        target_amplicons = utils.get_target_amplicons(report_panel_path)
-
-        for amplicon in target_amplicons:
-            coverage_data = SampleCoverage.objects.timeout(None).filter(
-                SampleCoverage.sample == samples[sample]['sample_name'],
-                SampleCoverage.amplicon == amplicon,
-                SampleCoverage.run_id == samples[sample]['run_id'],
-                SampleCoverage.library_name == samples[sample]['library_name'],
-                SampleCoverage.program_name == "sambamba"
-            ).allow_filtering()
-
-            for coverage in coverage_data:
-                coverage.delete()
+        num_deleted = deletion.delete_library_coverage(samples[sample]['sample_name'],
+                                                       samples[sample]['run_id'],
+                                                       samples[sample]['library_name'])
+        sys.stdout.write("Deleted coverage for {} amplicons for sample {}\n".format(num_deleted, sample))
@@ -3,9 +3,10 @@
 import sys
 import argparse
 import getpass
+import panels
+import deletion
 
 from ddb import configuration
-from variantstore import SampleVariant
 
 from cassandra.auth import PlainTextAuthProvider
 from cassandra.cqlengine import connection
@@ -36,13 +37,11 @@ if __name__ == "__main__":
     sys.stdout.write("Processing samples\n")
     for sample in samples:
         sys.stdout.write("Deleting variants for sample {}\n".format(sample))
-
-        variants = SampleVariant.objects.timeout(None).filter(
-            SampleVariant.reference_genome == config['genome_version'],
-            SampleVariant.sample == samples[sample]['sample_name'],
-            SampleVariant.run_id == samples[sample]['run_id'],
-            SampleVariant.library_name == samples[sample]['library_name'],
-        ).allow_filtering()
-
-        for variant in variants:
-            variant.delete()
+        target_panel = panels.load_panel(samples[sample]['panel'], samples[sample]['report'])
+
+        num_deleted = deletion.delete_library_variants(config['genome_version'],
+                                                       samples[sample]['sample_name'],
+                                                       samples[sample]['run_id'],
+                                                       samples[sample]['library_name'],
+                                                       targets=target_panel.names)
+        sys.stdout.write("Deleted {} variants for sample {}\n".format(num_deleted, sample))
@@ -0,0 +1,107 @@
+import routing
+import vaf_distributions
+
+from variantstore import Variant
+from variantstore import RunVariant
+from variantstore import SampleVariant
+from variantstore import TargetVariant
+from variantstore import BucketedVariant
+from coveragestore import SampleCoverage
+from coveragestore import AmpliconCoverage
+from cassandra.query import SimpleStatement
+from cassandra.cqlengine import connection
+from cassandra.concurrent import execute_concurrent_with_args
+
+# Deletes are issued against the widest key prefix each table allows for a
+# library. SampleVariant, TargetVariant and the coverage tables get one range
+# tombstone per partition (or amplicon) instead of one tombstone per row.
+# Variant, BucketedVariant and RunVariant partitions are shared by every
+# sample (of the run), so their rows are deleted by full primary key using keys
+# read from SampleVariant.
+
+
+def _execute(session, cql, parameters, concurrency):
+    statement = session.prepare(cql)
+    execute_concurrent_with_args(session, statement, parameters, concurrency=concurrency)
+
+
+def delete_library_variants(reference_genome, sample, run_id, library_name, targets=(), concurrency=100):
+    """Remove a library's variants from SampleVariant, Variant, BucketedVariant,
+    RunVariant and, for the given targets, TargetVariant, and refresh the
+    VAF distributions of the variants. Returns the number of variant keys
+    removed."""
+
+    session = connection.get_session()
+
+    select = SimpleStatement("SELECT chr, pos, ref, alt FROM {} WHERE sample = %s AND run_id = %s AND "
+                             "reference_genome = %s AND library_name = %s"
+                             "".format(SampleVariant.column_family_name()), fetch_size=5000)
+    keys = set()
+    for row in session.execute(select, (sample, run_id, reference_genome, library_name)):
+        keys.add((row['chr'], row['pos'], row['ref'], row['alt']))
+
+    _execute(session,
+             "DELETE FROM {} WHERE reference_genome = ? AND chr = ? AND pos = ? AND ref = ? AND alt = ? AND "
+             "sample = ? AND library_name = ? AND run_id = ?".format(Variant.column_family_name()),
+             [(reference_genome, chr, pos, ref, alt, sample, library_name, run_id)
+              for chr, pos, ref, alt in keys],
+             concurrency)
+
+    _execute(session,
+             "DELETE FROM {} WHERE reference_genome = ? AND chr = ? AND bin = ? AND pos = ? AND ref = ? AND "
+             "alt = ? AND sample = ? AND library_name = ? AND run_id = ?"
+             "".format(BucketedVariant.column_family_name()),
+             [(reference_genome, chr, routing.get_bin(pos), pos, ref, alt, sample, library_name, run_id)
+              for chr, pos, ref, alt in keys],
+             concurrency)
+
+    _execute(session,
+             "DELETE FROM {} WHERE run_id = ? AND reference_genome = ? AND chr = ? AND pos = ? AND ref = ? AND "
+             "alt = ? AND library_name = ?".format(RunVariant.column_family_name()),
+             [(run_id, reference_genome, chr, pos, ref, alt, library_name) for chr, pos, ref, alt in keys],
+             concurrency)
+
+    _execute(session,
+             "DELETE FROM {} WHERE target = ? AND reference_genome = ? AND sample = ? AND library_name = ? AND "
+             "run_id = ?".format(TargetVariant.column_family_name()),
+             [(target, reference_genome, sample, library_name, run_id) for target in targets],
+             concurrency)
+
+    _execute(session,
+             "DELETE FROM {} WHERE sample = ? AND run_id = ? AND reference_genome = ? AND library_name = ?"
+             "".format(SampleVariant.column_family_name()),
+             [(sample, run_id, reference_genome, library_name)],
+             concurrency)
+
+    # Recomputed from the remaining calls, so the deleted ones drop out
+    vaf_distributions.refresh_distributions(reference_genome, keys, concurrency)
+
+    return len(keys)
+
+
+def delete_library_coverage(sample, run_id, library_name, concurrency=100):
+    """Remove a library's SampleCoverage and AmpliconCoverage rows for every
+    program. Returns the number of amplicons removed."""
+
+    session = connection.get_session()
+
+    select = SimpleStatement("SELECT amplicon, run_id, library_name FROM {} WHERE sample = %s"
+                             "".format(SampleCoverage.column_family_name()), fetch_size=5000)
+    amplicons = set()
+    for row in session.execute(select, (sample,)):
+        if row['run_id'] == run_id and row['library_name'] == library_name:
+            amplicons.add(row['amplicon'])
+
+    _execute(session,
+             "DELETE FROM {} WHERE amplicon = ? AND sample = ? AND run_id = ? AND library_name = ?"
+             "".format(AmpliconCoverage.column_family_name()),
+             [(amplicon, sample, run_id, library_name) for amplicon in amplicons],
+             concurrency)
+
+    _execute(session,
+             "DELETE FROM {} WHERE sample = ? AND amplicon = ? AND run_id = ? AND library_name = ?"
+             "".format(SampleCoverage.column_family_name()),
+             [(sample, amplicon, run_id, library_name) for amplicon in amplicons],
+             concurrency)
+
+    return len(amplicons)
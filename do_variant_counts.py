@@ -2,84 +2,87 @@
 import sys
 import getpass
 import argparse
-from ddb import configuration
 
-from cassandra.cluster import Cluster
+import scanner
+from collections import defaultdict
+from variantstore import SampleVariant
 from cassandra.auth import PlainTextAuthProvider
 
 
-def get_sample_variant_data(sample, samples, thresholds, authenticator):
-    cluster = Cluster(['142.239.155.181', '142.239.155.182', '142.239.155.183',
-                       '142.239.155.184'], auth_provider=authenticator)
-    session = cluster.connect('variantstore')
-    for library in samples[sample]:
-        print samples[sample][library]['sample_name']
-        rows = session.execute("""SELECT sample, run_id, reference_genome,
-                               library_name, chr, pos, ref, alt, target_pool,
-                               panel_name, sequencer, end, callers, type,
-                               subtype, rs_id, rs_ids, cosmic_ids, gene,
-                               transcript, exon, codon_change, aa_change,
-                               biotype, severity, impact, impact_so, genes,
-                               transcripts_data, in_cosmic, in_clinvar,
-                               is_pathogenic, is_coding, is_lof, is_splicing,
-                               population_freqs, clinvar_data, cosmic_data,
-                               amplicon_data, max_maf_all, max_maf_no_fin,
-                               min_depth, max_depth, min_som_aaf, max_som_aaf,
-                               variant_filters, variant_categorization,
-                               freebayes, mutect, scalpel, vardict, pindel,
-                               platypus FROM sample_variant WHERE
-                               sample=%s AND run_id=%s AND
-                               reference_genome=%s AND library_name=%s""",
-                               ([samples[sample][library]['sample_name'],
-                                 samples[sample][library]['run_id'],
-                                 config['genome_version'],
-                                 samples[sample][library]['library_name']]))
-        no_amplicon = 0
-        num_rows = 0
-        for variant_row in rows:
-            num_rows += 1
-            if variant_row.amplicon_data['amplicon'] == 'None':
-                no_amplicon += 1
-            else:
-                print variant_row.sample,
-                variant_row.amplicon_data['amplicon'],
-                variant_row.chr,
-                variant_row.pos,
-                variant_row.ref,
-                variant_row.alt
-        print no_amplicon, num_rows
-        print "Finished Variant Sample"
-    print "Finished Variant Samples"
+def count_variants(rows, reference_genome):
+    """Scanner mapper counting variants per library, and the samples carrying
+    each variant, for one token range of sample_variant"""
+
+    library_counts = defaultdict(lambda: [0, 0])
+    variant_samples = defaultdict(set)
+    variant_genes = dict()
+    for row in rows:
+        if row['reference_genome'] != reference_genome:
+            continue
+        library = (row['sample'], row['library_name'], row['run_id'])
+        library_counts[library][0] += 1
+        if not row['amplicon_data'] or row['amplicon_data'].get('amplicon', 'None') == 'None':
+            library_counts[library][1] += 1
+
+        key = (row['chr'], row['pos'], row['ref'], row['alt'])
+        variant_samples[key].add(row['sample'])
+        variant_genes[key] = row['gene']
+
+    return dict(library_counts), dict(variant_samples), variant_genes
+
+
+def merge_counts(counts, result):
+    library_counts, variant_samples, variant_genes = counts
+    range_library_counts, range_variant_samples, range_variant_genes = result
+
+    for library in range_library_counts:
+        library_counts[library][0] += range_library_counts[library][0]
+        library_counts[library][1] += range_library_counts[library][1]
+    for key in range_variant_samples:
+        variant_samples[key].update(range_variant_samples[key])
+    variant_genes.update(range_variant_genes)
+
+    return counts
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument('-s', '--samples_file',
-                        help="Input configuration file for samples")
-    parser.add_argument('-r', '--report',
-                        help="Root name for reports (per sample)",
-                        default='report')
-    parser.add_argument('-a', '--address',
-                        help="IP Address for Cassandra connection",
-                        default='127.0.0.1')
-    parser.add_argument('-u', '--username',
-                        help='Cassandra username for login',
-                        default=None)
-
+    parser.add_argument('-g', '--genome', help="Reference genome version to count", default='GRCh37.75')
+    parser.add_argument('-r', '--report', help="Root name for reports", default='report')
+    parser.add_argument('-p', '--processes', help="Number of token ranges scanned concurrently", type=int,
+                        default=8)
+    parser.add_argument('-n', '--ranges', help="Number of token ranges to split the scan in to", type=int,
+                        default=256)
+    parser.add_argument('-k', '--checkpoint', help="Checkpoint file for resuming an interrupted scan", default=None)
+    parser.add_argument('-a', '--address', help="IP Address for Cassandra connection", default='127.0.0.1')
+    parser.add_argument('-u', '--username', help='Cassandra username for login', default=None)
     args = parser.parse_args()
 
     if args.username:
         password = getpass.getpass()
-        auth_provider = PlainTextAuthProvider(username=args.username,
-                                              password=password)
+        auth_provider = PlainTextAuthProvider(username=args.username, password=password)
     else:
         auth_provider = None
 
-    callers = ("mutect", "platypus", "vardict", "scalpel", "freebayes",
-               "pindel")
+    sys.stdout.write("Scanning sample variants\n")
+    library_counts, variant_samples, variant_genes = scanner.scan(
+        SampleVariant,
+        ['sample', 'run_id', 'reference_genome', 'library_name', 'chr', 'pos', 'ref', 'alt', 'gene', 'amplicon_data'],
+        count_variants, merge_counts, (defaultdict(lambda: [0, 0]), defaultdict(set), dict()),
+        [args.address], "variantstore", auth_provider=auth_provider, context=args.genome,
+        processes=args.processes, num_ranges=args.ranges, checkpoint_file=args.checkpoint)
+
+    sys.stdout.write("Writing counts for {} libraries and {} variants\n".format(len(library_counts),
+                                                                              len(variant_samples)))
+    with open("{}_library_variant_counts.txt".format(args.report), "w") as output:
+        output.write("Sample\tLibrary\tRun\tVariants\tNo Amplicon\n")
+        for sample, library_name, run_id in sorted(library_counts):
+            counts = library_counts[(sample, library_name, run_id)]
+            output.write("{}\t{}\t{}\t{}\t{}\n".format(sample, library_name, run_id, counts[0], counts[1]))
 
-    sys.stdout.write("Processing samples\n")
-    for sample in samples:
-        get_sample_coverage_data(sample, samples, thresholds, auth_provider)
-        get_sample_variant_data(sample, samples, thresholds, auth_provider)
-    print "Finished Samples"
+    with open("{}_variant_sample_counts.txt".format(args.report), "w") as output:
+        output.write("Chrom\tPos\tRef\tAlt\tGene\tNum Samples\n")
+        for chr, pos, ref, alt in sorted(variant_samples):
+            key = (chr, pos, ref, alt)
+            output.write("{}\t{}\t{}\t{}\t{}\t{}\n".format(chr, pos, ref, alt, variant_genes[key],
+                                                         len(variant_samples[key])))
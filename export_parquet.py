@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+
+# Exports the variant and coverage stores to partitioned Parquet datasets for
+# analysis in pandas, DuckDB or Spark away from the production cluster.
+# Export is incremental by run: runs listed in the state file are skipped
+# unless named explicitly, and re-exporting a run replaces its partitions.
+# AmpliconCoverage holds the same rows as SampleCoverage keyed by amplicon, so
+# only the sample_coverage dataset is written.
+
+import os
+import sys
+import glob
+import json
+import shutil
+import getpass
+import argparse
+
+from datetime import datetime
+from collections import Mapping
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import utils
+import catalog
+import annotations
+from variantstore import Variant
+from variantstore import SampleVariant
+from coveragestore import SampleCoverage
+from cassandra.query import SimpleStatement
+from cassandra.cqlengine import columns
+from cassandra.cqlengine import connection
+from cassandra.auth import PlainTextAuthProvider
+from cassandra.concurrent import execute_concurrent_with_args
+
+# Hive style partition columns of each dataset; run_id must come last
+PARTITION_COLUMNS = {'sample_variant': ['reference_genome', 'chr', 'run_id'],
+                     'variant': ['reference_genome', 'chr', 'run_id'],
+                     'sample_coverage': ['run_id']}
+
+
+# Maps with a fixed set of keys are written as one string column per key
+# (clinvar_data -> clinvar_data_significance, ...). Other maps, whose keys
+# depend on the caller, transcript or coverage thresholds, are written whole
+# as a JSON string column.
+MAP_KEYS = {'clinvar_data': annotations.CLINVAR_KEYS,
+            'cosmic_data': annotations.COSMIC_KEYS,
+            'amplicon_data': ('amplicon', 'panel_amplicon', 'intersect')}
+
+MODELS = {'sample_variant': SampleVariant,
+          'variant': Variant,
+          'sample_coverage': SampleCoverage}
+
+
+def get_column_type(column):
+    if isinstance(column, (columns.Integer, columns.BigInt)):
+        return pa.int64()
+    if isinstance(column, (columns.Float, columns.Double)):
+        return pa.float64()
+    if isinstance(column, columns.Boolean):
+        return pa.bool_()
+    if isinstance(column, columns.DateTime):
+        return pa.timestamp('ms')
+    if isinstance(column, columns.Blob):
+        return pa.binary()
+
+    return pa.string()
+
+
+def get_schema(model):
+    """Arrow schema of a model's flattened rows. Every partition of a dataset
+    is written with its model's schema, whatever columns its rows hold."""
+
+    fields = list()
+    for name, column in model._columns.items():
+        if name == 'population_freqs':
+            continue
+        elif name == 'population_freqs_packed':
+            fields.extend([pa.field("population_freqs_{}".format(key), pa.float64())
+                           for key in utils.POPULATION_FREQ_KEYS])
+        elif name in MAP_KEYS:
+            fields.extend([pa.field("{}_{}".format(name, key), pa.string()) for key in MAP_KEYS[name]])
+        elif isinstance(column, (columns.Map, columns.List, columns.Set)):
+            fields.append(pa.field(name, pa.string()))
+        else:
+            fields.append(pa.field(name, get_column_type(column)))
+
+    return pa.schema(fields)
+
+
+def flatten_row(row):
+    """Flatten a row for export. Maps with known keys become one column per
+    key and other maps a JSON string, population frequencies, packed or
+    from the legacy map of unmigrated rows, become
+    population_freqs_<population> columns and lists are joined with
+    commas."""
+
+    flat = dict()
+    for column, value in row.items():
+        if column == 'population_freqs':
+            continue
+        elif column == 'population_freqs_packed':
+            for key, freq in utils.read_population_freqs(row).items():
+                flat["population_freqs_{}".format(key)] = freq
+        elif column in MAP_KEYS:
+            value = value or dict()
+            for key in MAP_KEYS[column]:
+                flat["{}_{}".format(column, key)] = value.get(key)
+        elif isinstance(value, Mapping):
+            flat[column] = json.dumps(dict((unicode(key), value[key]) for key in value), sort_keys=True)
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            flat[column] = ",".join([unicode(item) for item in value])
+        else:
+            flat[column] = value
+
+    return flat
+
+
+def to_table(rows, schema):
+    """Arrow table of flattened rows cast to schema. Columns missing from the
+    rows are null and columns not in the schema are dropped."""
+
+    flat_rows = [flatten_row(row) for row in rows]
+
+    return pa.Table.from_arrays([pa.array([flat.get(field.name) for flat in flat_rows], type=field.type)
+                                 for field in schema], schema=schema)
+
+
+def join_row_annotations(rows):
+    """Fill annotation columns of raw variant rows from VariantAnnotation,
+    as annotations.join_annotations does for model instances"""
+
+    keys = [(row['reference_genome'], row['chr'], row['pos'], row['ref'], row['alt'])
+            for row in rows if not row.get('clinvar_data')]
+    found = annotations.get_annotations(keys)
+
+    for row in rows:
+        if row.get('clinvar_data'):
+            continue
+        annotation = found[(row['reference_genome'], row['chr'], row['pos'], row['ref'], row['alt'])]
+        if annotation is not None:
+            row.update(annotation)
+
+    return rows
+
+
+def read_library_rows(session, reference_genome, library, concurrency=100):
+    """SampleVariant, Variant and SampleCoverage rows of a catalog library as
+    dicts, read with raw paged queries rather than model instances"""
+
+    select = SimpleStatement("SELECT * FROM {} WHERE sample = %s AND run_id = %s AND reference_genome = %s AND "
+                             "library_name = %s".format(SampleVariant.column_family_name()), fetch_size=5000)
+    sample_variants = list(session.execute(select, (library.sample, library.run_id, reference_genome,
+                                                     library.library_name)))
+
+    statement = session.prepare("SELECT * FROM {} WHERE reference_genome = ? AND chr = ? AND pos = ? AND ref = ? AND "
+                                "alt = ? AND sample = ? AND library_name = ? AND run_id = ?"
+                                "".format(Variant.column_family_name()))
+    keys = sorted(set([(row['chr'], row['pos'], row['ref'], row['alt']) for row in sample_variants]))
+    results = execute_concurrent_with_args(session, statement,
+                                           [(reference_genome, chr, pos, ref, alt, library.sample,
+                                             library.library_name, library.run_id) for chr, pos, ref, alt in keys],
+                                           concurrency=concurrency, raise_on_first_error=True)
+    variants = list()
+    for success, rows in results:
+        variants.extend(rows)
+
+    select = SimpleStatement("SELECT * FROM {} WHERE sample = %s".format(SampleCoverage.column_family_name()),
+                             fetch_size=5000)
+    coverage = [row for row in session.execute(select, (library.sample,))
+                if row['run_id'] == library.run_id and row['library_name'] == library.library_name]
+
+    return {'sample_variant': join_row_annotations(sample_variants),
+            'variant': join_row_annotations(variants),
+            'sample_coverage': coverage}
+
+
+def write_run(output_dir, table, run_id, rows):
+    """Replace a run's partitions of a dataset with the given rows"""
+
+    partition_columns = PARTITION_COLUMNS[table]
+    pattern = [output_dir, table] + ["*"] * (len(partition_columns) - 1) + ["run_id={}".format(run_id)]
+    for partition in glob.glob(os.path.join(*pattern)):
+        shutil.rmtree(partition)
+
+    if not rows:
+        return 0
+
+    run_table = to_table(rows, get_schema(MODELS[table]))
+    pq.write_to_dataset(run_table,
+                        root_path=os.path.join(output_dir, table),
+                        partition_cols=partition_columns,
+                        partition_filename_cb=lambda keys: "part-0.parquet")
+
+    return run_table.num_rows
+
+
+def export_run(session, output_dir, reference_genome, run_id):
+    run_rows = {'sample_variant': list(), 'variant': list(), 'sample_coverage': list()}
+    for library in catalog.get_run_libraries(run_id):
+        library_rows = read_library_rows(session, reference_genome, library)
+        for table in run_rows:
+            run_rows[table].extend(library_rows[table])
+
+    counts = dict()
+    for table in run_rows:
+        counts[table] = write_run(output_dir, table, run_id, run_rows[table])
+
+    return counts
+
+
+def read_state(state_file):
+    if not os.path.exists(state_file):
+        return {'runs': dict()}
+
+    with open(state_file, 'r') as state:
+        return json.load(state)
+
+
+def write_state(state_file, export_state):
+    tmp_file = "{}.tmp".format(state_file)
+    with open(tmp_file, 'w') as state:
+        json.dump(export_state, state, indent=2, sort_keys=True)
+    os.rename(tmp_file, state_file)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', '--output', help="Root directory of the Parquet datasets")
+    parser.add_argument('-g', '--genome', help="Reference genome version to export", default='GRCh37.75')
+    parser.add_argument('-r', '--runs', help="Comma separated run ids to (re-)export, instead of all new runs",
+                        default=None)
+    parser.add_argument('-s', '--state', help="Export state file, defaults to export_state.json in the output "
+                                              "directory", default=None)
+    parser.add_argument('-a', '--address', help="IP Address for Cassandra connection", default='127.0.0.1')
+    parser.add_argument('-u', '--username', help='Cassandra username for login', default=None)
+    args = parser.parse_args()
+
+    if args.username:
+        password = getpass.getpass()
+        auth_provider = PlainTextAuthProvider(username=args.username, password=password)
+        connection.setup([args.address], "variantstore", auth_provider=auth_provider)
+    else:
+        connection.setup([args.address], "variantstore")
+
+    if not os.path.isdir(args.output):
+        os.makedirs(args.output)
+    state_file = args.state or os.path.join(args.output, "export_state.json")
+    export_state = read_state(state_file)
+
+    if args.runs:
+        run_ids = args.runs.split(',')
+    else:
+        run_ids = [run_id for run_id in catalog.get_run_ids() if run_id not in export_state['runs']]
+    sys.stdout.write("Exporting {} runs\n".format(len(run_ids)))
+
+    session = connection.get_session()
+    for run_id in run_ids:
+        counts = export_run(session, args.output, args.genome, run_id)
+        sys.stdout.write("{}: {} sample variants, {} variants, {} coverage rows\n".format(run_id,
+                                                                                       counts['sample_variant'],
+                                                                                       counts['variant'],
+                                                                                       counts['sample_coverage']))
+        export_state['runs'][run_id] = datetime.now().isoformat()
+        write_state(state_file, export_state)
@@ -0,0 +1,97 @@
+import os
+
+from datetime import datetime
+
+import blobs
+from logstore import Log
+from logstore import LogChunk
+
+# Uncompressed bytes per LogChunk row
+CHUNK_SIZE = 256 * 1024
+
+
+def _chunk_partition(sample, library_name, run_id, analysis_id, log_name):
+    chunks = LogChunk.objects.timeout(None).filter(
+        LogChunk.sample == sample,
+        LogChunk.library_name == library_name,
+        LogChunk.run_id == run_id,
+        LogChunk.analysis_id == analysis_id,
+        LogChunk.log_name == log_name
+    )
+
+    return chunks
+
+
+def store_log_chunks(sample, library_name, run_id, analysis_id, log_name, filename):
+    """Split a log file in to compressed fixed-size chunks, replacing any chunks
+    previously stored under the same name. Returns (num_chunks, size)."""
+
+    _chunk_partition(sample, library_name, run_id, analysis_id, log_name).delete()
+
+    num_chunks = 0
+    size = 0
+    with open(filename, 'rb') as log_file:
+        while True:
+            data = log_file.read(CHUNK_SIZE)
+            if not data:
+                break
+            LogChunk.create(sample=sample,
+                            library_name=library_name,
+                            run_id=run_id,
+                            analysis_id=analysis_id,
+                            log_name=log_name,
+                            chunk=num_chunks,
+                            data=blobs.compress(data))
+            num_chunks += 1
+            size += len(data)
+
+    return num_chunks, size
+
+
+def store_library_logs(library, analysis_id, filenames):
+    """Store a library's log files in LogChunk and add them to its Log row.
+    Logs stored earlier for the same analysis are kept, and a log stored
+    again under the same name replaces its earlier chunks."""
+
+    log_chunks = dict()
+    log_sizes = dict()
+    for filename in filenames:
+        log_name = os.path.basename(filename)
+        log_chunks[log_name], log_sizes[log_name] = store_log_chunks(library['sample_name'],
+                                                                     library['library_name'],
+                                                                     library['run_id'],
+                                                                     analysis_id,
+                                                                     log_name,
+                                                                     filename)
+
+    # An update appends to the maps, where create would replace them
+    Log.objects.timeout(None).filter(
+        Log.sample == library['sample_name'],
+        Log.library_name == library['library_name'],
+        Log.run_id == library['run_id'],
+        Log.analysis_id == analysis_id
+    ).update(sequencer=library['sequencer'],
+             target_pool=library['target_pool'],
+             panel_name=library['panel'],
+             initial_report_panel=library['report'],
+             extraction=library['extraction'],
+             date_annotated=datetime.now(),
+             log_chunks__update=log_chunks,
+             log_sizes__update=log_sizes)
+
+
+def read_log(sample, library_name, run_id, analysis_id, log_name):
+    """Yield the decompressed chunks of a log in order"""
+
+    chunks = _chunk_partition(sample, library_name, run_id, analysis_id, log_name).limit(None)
+    for chunk in chunks:
+        yield blobs.decompress(chunk.data)
+
+
+def tail_log(sample, library_name, run_id, analysis_id, log_name, num_chunks=1):
+    """Return the last num_chunks chunks of a log, decompressed and joined"""
+
+    chunks = _chunk_partition(sample, library_name, run_id, analysis_id, log_name).order_by(
+        '-chunk').limit(num_chunks)
+
+    return "".join([blobs.decompress(chunk.data) for chunk in reversed(list(chunks))])
@@ -16,4 +16,24 @@ class Log(Model):
     extraction = columns.Text(index=True)
     date_annotated = columns.DateTime()
 
+    # Legacy single cell storage, new logs are written to LogChunk
     log_data = columns.Map(columns.Text, columns.Blob)
+
+    # Number of chunks and uncompressed size of each log stored in LogChunk
+    log_chunks = columns.Map(columns.Text, columns.Integer)
+    log_sizes = columns.Map(columns.Text, columns.BigInt)
+
+
+class LogChunk(Model):
+    __keyspace__ = 'logstore'
+    sample = columns.Text(primary_key=True, partition_key=True)
+    library_name = columns.Text(primary_key=True, partition_key=True)
+    run_id = columns.Text(primary_key=True, partition_key=True)
+    analysis_id = columns.Text(primary_key=True, partition_key=True)
+    log_name = columns.Text(primary_key=True, partition_key=True)
+
+    # Cluster Keys
+    chunk = columns.Integer(primary_key=True)
+
+    # zlib compressed slice of the log
+    data = columns.Blob()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+# Rewrites the legacy population_freqs map of existing variant rows in to the
+# packed population_freqs_packed column and drops the map. Rows that already
+# have a packed value are skipped, so the migration can be re-run safely.
+
+import sys
+import getpass
+import argparse
+
+import utils
+from variantstore import Variant
+from variantstore import SampleVariant
+from variantstore import TargetVariant
+from variantstore import BucketedVariant
+from cassandra.query import SimpleStatement
+from cassandra.cqlengine import connection
+from cassandra.auth import PlainTextAuthProvider
+from cassandra.concurrent import execute_concurrent_with_args
+
+MODELS = {'variant': Variant,
+          'sample_variant': SampleVariant,
+          'target_variant': TargetVariant,
+          'bucketed_variant': BucketedVariant}
+
+
+def migrate_table(session, model, batch_size, concurrency):
+    keys = [column.db_field_name for column in model._primary_keys.values()]
+
+    select = SimpleStatement("SELECT {}, population_freqs, population_freqs_packed FROM {}"
+                             "".format(", ".join(keys), model.column_family_name()), fetch_size=batch_size)
+    update = session.prepare("UPDATE {} SET population_freqs_packed = ?, population_freqs = null WHERE {}"
+                             "".format(model.column_family_name(), " AND ".join(["{} = ?".format(key) for key in keys])))
+
+    migrated = 0
+    parameters = list()
+    for row in session.execute(select):
+        if row['population_freqs_packed'] or not row['population_freqs']:
+            continue
+        parameters.append([utils.pack_population_freqs(row['population_freqs'])] + [row[key] for key in keys])
+        if len(parameters) >= batch_size:
+            execute_concurrent_with_args(session, update, parameters, concurrency=concurrency)
+            migrated += len(parameters)
+            parameters = list()
+
+    if parameters:
+        execute_concurrent_with_args(session, update, parameters, concurrency=concurrency)
+        migrated += len(parameters)
+
+    return migrated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-t', '--tables', help="Comma separated list of tables to migrate",
+                        default=",".join(sorted(MODELS.keys())))
+    parser.add_argument('-b', '--batch_size', help="Rows read per page and updated per batch", type=int, default=5000)
+    parser.add_argument('-n', '--concurrency', help="Number of concurrent updates", type=int, default=100)
+    parser.add_argument('-a', '--address', help="IP Address for Cassandra connection", default='127.0.0.1')
+    parser.add_argument('-u', '--username', help='Cassandra username for login', default=None)
+    args = parser.parse_args()
+
+    if args.username:
+        password = getpass.getpass()
+        auth_provider = PlainTextAuthProvider(username=args.username, password=password)
+        connection.setup([args.address], "variantstore", auth_provider=auth_provider)
+    else:
+        connection.setup([args.address], "variantstore")
+
+    session = connection.get_session()
+    for table in args.tables.split(','):
+        sys.stdout.write("Migrating population frequencies in {}\n".format(table))
+        migrated = migrate_table(session, MODELS[table], args.batch_size, args.concurrency)
+        sys.stdout.write("Packed population frequencies for {} rows in {}\n".format(migrated, table))
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+# Copies existing rows from the Variant table into the position bucketed
+# BucketedVariant table. Ingest scripts dual-write both tables through
+# routing.create_variant, so this can be run while ingest is live; rows are
+# upserted and re-running the migration is safe. With --run_index the
+# RunVariant run index is filled in from the same rows.
+
+import sys
+import getpass
+import argparse
+
+from multiprocessing.pool import ThreadPool
+
+import routing
+from variantstore import Variant
+from variantstore import RunVariant
+from variantstore import BucketedVariant
+from cassandra.cqlengine import connection
+from cassandra.auth import PlainTextAuthProvider
+
+
+def migrate_chromosome(reference_genome, chr, run_index=False):
+    variants = Variant.objects.timeout(None).filter(
+        Variant.reference_genome == reference_genome,
+        Variant.chr == chr
+    ).limit(None)
+
+    migrated = 0
+    for variant in variants:
+        values = dict(variant.items())
+        BucketedVariant.create(bin=routing.get_bin(variant.pos), **values)
+        if run_index:
+            RunVariant.create(**routing.get_run_variant_values(values))
+        migrated += 1
+
+    sys.stdout.write("Migrated {} variants on chromosome {}\n".format(migrated, chr))
+
+    return migrated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-g', '--genome', help="Reference genome version to migrate", default='GRCh37.75')
+    parser.add_argument('-c', '--chromosomes', help="Comma separated list of chromosomes to migrate",
+                        default=",".join([str(i) for i in range(1, 23)] + ['X', 'Y', 'MT']))
+    parser.add_argument('-t', '--threads', help="Number of chromosomes to migrate concurrently", type=int, default=4)
+    parser.add_argument('-r', '--run_index', help="Also fill in the RunVariant run index", action='store_true')
+    parser.add_argument('-a', '--address', help="IP Address for Cassandra connection", default='127.0.0.1')
+    parser.add_argument('-u', '--username', help='Cassandra username for login', default=None)
+    args = parser.parse_args()
+
+    if args.username:
+        password = getpass.getpass()
+        auth_provider = PlainTextAuthProvider(username=args.username, password=password)
+        connection.setup([args.address], "variantstore", auth_provider=auth_provider)
+    else:
+        connection.setup([args.address], "variantstore")
+
+    chromosomes = args.chromosomes.split(',')
+
+    sys.stdout.write("Migrating variants for {} chromosomes\n".format(len(chromosomes)))
+    pool = ThreadPool(args.threads)
+    counts = pool.map(lambda chr: migrate_chromosome(args.genome, chr, args.run_index), chromosomes)
+    pool.close()
+    pool.join()
+
+    sys.stdout.write("Migrated {} variants in total\n".format(sum(counts)))
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+
+# Materialized library x variant occurrence matrix for cohort analytics.
+# Rows are libraries (sample, library_name, run_id), columns are distinct
+# variants (chr, pos, ref, alt) and values are the library's max somatic VAF.
+# The matrix is kept as CSR arrays in matrix.npz, together with a JSON index
+# of the row and column keys and the runs loaded, so a save replaces both with
+# one rename. Runs are added incrementally; a run loaded again has its rows
+# replaced and the variant columns left without carriers dropped.
+
+import os
+import sys
+import json
+import getpass
+import argparse
+
+import numpy as np
+import scipy.sparse as sparse
+
+import catalog
+from variantstore import SampleVariant
+from cassandra.cqlengine import connection
+from cassandra.auth import PlainTextAuthProvider
+
+MATRIX_FILE = "matrix.npz"
+# Index of matrices saved before it was kept in MATRIX_FILE
+INDEX_FILE = "index.json"
+
+# Stored for calls without a usable VAF, so they are not lost as sparse zeros
+MISSING_VAF = -1.0
+
+
+class OccurrenceMatrix(object):
+    def __init__(self, matrix, libraries, variants, runs):
+        self.matrix = matrix.tocsr()
+        self.libraries = libraries
+        self.variants = variants
+        self.runs = runs
+        self.library_index = dict((library, index) for index, library in enumerate(libraries))
+        self.variant_index = dict((variant, index) for index, variant in enumerate(variants))
+        self._columns = None
+
+    @classmethod
+    def empty(cls):
+        return cls(sparse.csr_matrix((0, 0), dtype=np.float32), list(), list(), list())
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(os.path.join(path, MATRIX_FILE)):
+            return cls.empty()
+
+        with np.load(os.path.join(path, MATRIX_FILE)) as archive:
+            if 'index' in archive.files:
+                matrix = sparse.csr_matrix((archive['data'], archive['indices'], archive['indptr']),
+                                           shape=tuple(archive['shape']))
+                index = json.loads(archive['index'].item())
+            else:
+                matrix = None
+
+        if matrix is None:
+            with open(os.path.join(path, INDEX_FILE), "r") as index_file:
+                index = json.load(index_file)
+            matrix = sparse.load_npz(os.path.join(path, MATRIX_FILE))
+
+        return cls(matrix,
+                   [tuple(library) for library in index['libraries']],
+                   [(chr, int(pos), ref, alt) for chr, pos, ref, alt in index['variants']],
+                   index['runs'])
+
+    def save(self, path):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        # Written in full to a temporary file and renamed over the old one, so
+        # a matrix is never read with another save's index
+        index = json.dumps({'libraries': self.libraries, 'variants': self.variants, 'runs': self.runs})
+        with open(os.path.join(path, "tmp_" + MATRIX_FILE), "wb") as matrix_file:
+            np.savez_compressed(matrix_file, data=self.matrix.data, indices=self.matrix.indices,
+                                indptr=self.matrix.indptr, shape=np.array(self.matrix.shape), index=np.array(index))
+            matrix_file.flush()
+            os.fsync(matrix_file.fileno())
+        os.rename(os.path.join(path, "tmp_" + MATRIX_FILE), os.path.join(path, MATRIX_FILE))
+
+        if os.path.exists(os.path.join(path, INDEX_FILE)):
+            os.remove(os.path.join(path, INDEX_FILE))
+
+    @property
+    def columns(self):
+        """CSC copy of the matrix for variant (column) slices"""
+
+        if self._columns is None:
+            self._columns = self.matrix.tocsc()
+
+        return self._columns
+
+    def add_run(self, run_id, library_variants):
+        """Add or replace the rows of a run. library_variants maps library
+        keys to {variant key: vaf} dicts."""
+
+        keep = [index for index, library in enumerate(self.libraries) if library[2] != run_id]
+        libraries = [self.libraries[index] for index in keep]
+        variants = list(self.variants)
+        variant_index = dict(self.variant_index)
+
+        run_libraries = sorted(library_variants)
+        rows = list()
+        cols = list()
+        values = list()
+        for row, library in enumerate(run_libraries):
+            for variant, vaf in library_variants[library].items():
+                if variant not in variant_index:
+                    variant_index[variant] = len(variants)
+                    variants.append(variant)
+                rows.append(row)
+                cols.append(variant_index[variant])
+                values.append(vaf if vaf > 0 else MISSING_VAF)
+
+        # Widen the kept rows to the new variant columns
+        kept = self.matrix[keep, :]
+        kept = sparse.csr_matrix((kept.data, kept.indices, kept.indptr), shape=(len(keep), len(variants)))
+        added = sparse.csr_matrix((np.array(values, dtype=np.float32), (rows, cols)),
+                                  shape=(len(run_libraries), len(variants)))
+
+        matrix = sparse.vstack([kept, added], format='csr')
+
+        # Drop the columns of variants only the replaced rows carried
+        if len(keep) < len(self.libraries):
+            carried = np.flatnonzero(matrix.getnnz(axis=0))
+            if len(carried) < len(variants):
+                matrix = matrix[:, carried]
+                variants = [variants[col] for col in carried]
+
+        runs = [run for run in self.runs if run != run_id] + [run_id]
+        self.__init__(matrix, libraries + run_libraries, variants, runs)
+
+    def row(self, library):
+        """{variant key: vaf} of a library"""
+
+        if library not in self.library_index:
+            return dict()
+        row = self.matrix.getrow(self.library_index[library])
+
+        return dict((self.variants[col], round(float(vaf), 6)) for col, vaf in zip(row.indices, row.data))
+
+    def column(self, variant):
+        """{library key: vaf} of the libraries carrying a variant"""
+
+        if variant not in self.variant_index:
+            return dict()
+        column = self.columns.getcol(self.variant_index[variant])
+
+        return dict((self.libraries[row], round(float(vaf), 6)) for row, vaf in zip(column.indices, column.data))
+
+    def submatrix(self, libraries=None, variants=None):
+        """Slice of the matrix for the given library and variant keys (all
+        when None), in the order given. Unknown keys are skipped."""
+
+        rows = range(len(self.libraries)) if libraries is None else \
+            [self.library_index[library] for library in libraries if library in self.library_index]
+        cols = range(len(self.variants)) if variants is None else \
+            [self.variant_index[variant] for variant in variants if variant in self.variant_index]
+
+        return self.matrix[rows, :][:, cols]
+
+    def carrier_counts(self):
+        """Number of libraries carrying each variant, in column order"""
+
+        return self.columns.getnnz(axis=0)
+
+    def sample_fraction(self, variant, samples=None):
+        """Fraction of samples (of all samples, or of those given) with a
+        library carrying the variant"""
+
+        if samples is None:
+            samples = set([library[0] for library in self.libraries])
+        else:
+            samples = set(samples)
+        if not samples:
+            return 0.0
+        carriers = set([library[0] for library in self.column(variant) if library[0] in samples])
+
+        return float(len(carriers)) / len(samples)
+
+
+def read_run_variants(reference_genome, run_id):
+    """{library key: {variant key: vaf}} for the libraries of a run"""
+
+    library_variants = dict()
+    for library in catalog.get_run_libraries(run_id):
+        variants = SampleVariant.objects.timeout(None).filter(
+            SampleVariant.reference_genome == reference_genome,
+            SampleVariant.sample == library.sample,
+            SampleVariant.run_id == run_id,
+            SampleVariant.library_name == library.library_name
+        ).only(['chr', 'pos', 'ref', 'alt', 'max_som_aaf']).limit(None)
+
+        library_variants[(library.sample, library.library_name, run_id)] = dict(
+            ((variant.chr, variant.pos, variant.ref, variant.alt), variant.max_som_aaf or 0.0)
+            for variant in variants)
+
+    return library_variants
+
+
+def update_matrix(path, reference_genome, run_ids=None):
+    """Load runs not yet in the matrix at path, or reload the given runs.
+    Returns the updated matrix."""
+
+    occurrences = OccurrenceMatrix.load(path)
+    if run_ids is None:
+        run_ids = [run_id for run_id in catalog.get_run_ids() if run_id not in occurrences.runs]
+
+    for run_id in run_ids:
+        occurrences.add_run(run_id, read_run_variants(reference_genome, run_id))
+        occurrences.save(path)
+        sys.stdout.write("{}: {} libraries and {} variants in matrix\n".format(run_id, len(occurrences.libraries),
+                                                                             len(occurrences.variants)))
+
+    return occurrences
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', '--output', help="Directory holding the occurrence matrix")
+    parser.add_argument('-g', '--genome', help="Reference genome version", default='GRCh37.75')
+    parser.add_argument('-r', '--runs', help="Comma separated run ids to (re-)load, instead of all new runs",
+                        default=None)
+    parser.add_argument('-a', '--address', help="IP Address for Cassandra connection", default='127.0.0.1')
+    parser.add_argument('-u', '--username', help='Cassandra username for login', default=None)
+    args = parser.parse_args()
+
+    if args.username:
+        password = getpass.getpass()
+        auth_provider = PlainTextAuthProvider(username=args.username, password=password)
+        connection.setup([args.address], "variantstore", auth_provider=auth_provider)
+    else:
+        connection.setup([args.address], "variantstore")
+
+    update_matrix(args.output, args.genome, args.runs.split(',') if args.runs else None)
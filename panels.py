@@ -0,0 +1,167 @@
+import os
+import csv
+import pickle
+import hashlib
+
+from bisect import bisect_left
+from collections import defaultdict
+
+PANEL_ROOT = "/mnt/shared-data/ddb-configs/disease_panels"
+
+# Parsed panels are cached per process and on local disk, keyed by the panel
+# file's path, mtime and size, so an edited panel is re-read automatically.
+# Bump PANEL_CACHE_VERSION when PanelIndex changes so old pickles are ignored.
+PANEL_CACHE_VERSION = 1
+PANEL_CACHE_DIR = os.environ.get('DDB_PANEL_CACHE',
+                                 os.path.join(os.path.expanduser('~'), '.cache', 'ddb-variantstore', 'panels'))
+
+_panel_cache = dict()
+
+
+def normalize_chr(chr):
+    chr = str(chr)
+    if chr.startswith('chr'):
+        return chr[3:]
+
+    return chr
+
+
+class IntervalTree(object):
+    """Static interval tree for a single chromosome. Intervals are kept sorted
+    by start alongside a running maximum of their ends, so overlap queries
+    only visit intervals that can still reach the query start."""
+
+    def __init__(self, intervals):
+        self.intervals = sorted(intervals)
+        self.starts = [interval[0] for interval in self.intervals]
+        self.max_ends = list()
+
+        max_end = None
+        for start, end, name in self.intervals:
+            if max_end is None or end > max_end:
+                max_end = end
+            self.max_ends.append(max_end)
+
+    def overlapping(self, start, end):
+        """Names of intervals overlapping the half open interval [start, end)"""
+
+        hits = list()
+        index = bisect_left(self.starts, end) - 1
+        while index >= 0 and self.max_ends[index] > start:
+            interval_start, interval_end, name = self.intervals[index]
+            if interval_end > start:
+                hits.append(name)
+            index -= 1
+        hits.reverse()
+
+        return hits
+
+
+class PanelIndex(object):
+    """Amplicons of a disease panel BED file with set based name lookups and
+    per-chromosome interval trees over their coordinates"""
+
+    def __init__(self, amplicons):
+        self.names = list()
+        self.name_set = set()
+
+        intervals = defaultdict(list)
+        for chr, start, end, name in amplicons:
+            if name not in self.name_set:
+                self.names.append(name)
+                self.name_set.add(name)
+            intervals[normalize_chr(chr)].append((start, end, name))
+
+        self.trees = dict()
+        for chr in intervals:
+            self.trees[chr] = IntervalTree(intervals[chr])
+
+    @classmethod
+    def from_bed(cls, filename):
+        amplicons = list()
+        with open(filename, "r") as bedfile:
+            reader = csv.reader(bedfile, dialect='excel-tab')
+            for row in reader:
+                # Skip blank, comment and UCSC track and browser header lines
+                if not row or row[0].startswith(('#', 'track', 'browser')):
+                    continue
+                amplicons.append((row[0], int(row[1]), int(row[2]), row[3]))
+
+        return cls(amplicons)
+
+    def __contains__(self, amplicon):
+        return amplicon in self.name_set
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def any_in(self, amplicons):
+        for amplicon in amplicons:
+            if amplicon in self.name_set:
+                return True
+
+        return False
+
+    def amplicons_at(self, chr, start, end=None):
+        """Names of amplicons overlapping a 0-based, half open position range"""
+
+        if end is None or end <= start:
+            end = start + 1
+
+        tree = self.trees.get(normalize_chr(chr))
+        if tree is None:
+            return list()
+
+        amplicons = list()
+        for name in tree.overlapping(start, end):
+            if name not in amplicons:
+                amplicons.append(name)
+
+        return amplicons
+
+    def assign_amplicons(self, chr, start, end=None):
+        """Assign amplicons to a variant by position, formatted like the
+        amplicon_target INFO field ('None' when off target)"""
+
+        return ",".join(self.amplicons_at(chr, start, end)) or "None"
+
+
+def get_panel_path(panel, report):
+    return os.path.join(PANEL_ROOT, panel, report)
+
+
+def load_panel(panel, report):
+    return load_panel_file(get_panel_path(panel, report))
+
+
+def load_panel_file(filename):
+    """Return the PanelIndex for a panel BED file, parsing it only when it is
+    in neither the process cache nor the on-disk cache"""
+
+    stat = os.stat(filename)
+    key = (PANEL_CACHE_VERSION, os.path.abspath(filename), stat.st_mtime, stat.st_size)
+    if key in _panel_cache:
+        return _panel_cache[key]
+
+    cache_file = os.path.join(PANEL_CACHE_DIR, "{}.pickle".format(hashlib.sha1(repr(key)).hexdigest()))
+    try:
+        with open(cache_file, 'rb') as cached:
+            panel_index = pickle.load(cached)
+    except (IOError, OSError, EOFError, pickle.UnpicklingError):
+        panel_index = PanelIndex.from_bed(filename)
+        try:
+            if not os.path.isdir(PANEL_CACHE_DIR):
+                os.makedirs(PANEL_CACHE_DIR)
+            tmp_file = "{}.{}.tmp".format(cache_file, os.getpid())
+            with open(tmp_file, 'wb') as cached:
+                pickle.dump(panel_index, cached, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_file, cache_file)
+        except (IOError, OSError):
+            pass
+
+    _panel_cache[key] = panel_index
+
+    return panel_index
@@ -0,0 +1,126 @@
+import json
+import hashlib
+
+from pipelinestore import Pipeline
+from pipelinestore import PipelineConfig
+
+# Pipeline columns holding file paths rather than tool settings
+PIPELINE_FILES = ('regions', 'snv_regions', 'indel_regions', 'reference', 'dict', 'indel1', 'indel2', 'dbsnp',
+                  'cosmic')
+
+# Tools with a legacy <tool>_config map column on Pipeline
+LEGACY_CONFIG_TOOLS = ('general', 'sambamba', 'vcfanno', 'bwa', 'ensemble', 'gatk', 'scanindel', 'pindel', 'picard',
+                       'freebayes', 'mutect', 'vardict', 'scalpel', 'indelminer', 'platypus', 'gemini', 'snpeff',
+                       'bcftools', 'vcftools', 'samtools', 'fastqc', 'vt')
+
+# PipelineConfig rows are immutable, so anything read or written once in this
+# process can be served from here afterwards
+_config_cache = dict()
+
+
+def normalize_config(config):
+    return dict((unicode(key), unicode(config[key])) for key in config)
+
+
+def config_hash(config):
+    """Content hash of a tool config map, independent of key order"""
+
+    encoded = json.dumps(sorted(normalize_config(config).items()), ensure_ascii=True)
+
+    return hashlib.sha1(encoded).hexdigest()
+
+
+def store_config(config):
+    """Store a tool config map under its content hash, if not already stored,
+    and return the hash"""
+
+    config = normalize_config(config)
+    digest = config_hash(config)
+    if digest not in _config_cache:
+        PipelineConfig.create(config_hash=digest, config=config)
+        _config_cache[digest] = config
+
+    return digest
+
+
+def get_config(digest):
+    if digest not in _config_cache:
+        _config_cache[digest] = PipelineConfig.objects.timeout(None).get(config_hash=digest).config
+
+    return _config_cache[digest]
+
+
+def split_runtime_config(config):
+    """Split a runtime configuration in to Pipeline file columns and per-tool
+    config maps. Scalar settings outside any tool section go under 'general'."""
+
+    files = dict()
+    tool_configs = dict()
+    general = dict()
+    for key in config:
+        if isinstance(config[key], dict):
+            tool_configs[key] = config[key]
+        elif key in PIPELINE_FILES:
+            files[key] = config[key]
+        else:
+            general[key] = config[key]
+
+    if general:
+        tool_configs['general'] = general
+
+    return files, tool_configs
+
+
+def register_pipeline(run_type, status, date, tool_configs, **files):
+    """Create a Pipeline row referencing its tool configs by hash"""
+
+    # Cassandra keeps timestamps to the millisecond, so the returned row has
+    # the same date, and get_pipeline_id the same id, as the stored one
+    date = date.replace(microsecond=date.microsecond // 1000 * 1000)
+    config_hashes = dict()
+    for tool in tool_configs:
+        config_hashes[tool] = store_config(tool_configs[tool])
+
+    pipeline = Pipeline.create(run_type=run_type,
+                               status=status,
+                               date=date,
+                               config_hashes=config_hashes,
+                               **files)
+
+    return pipeline
+
+
+def get_pipeline_configs(pipeline):
+    """Tool name -> config map for a Pipeline row. Rows written before configs
+    were deduplicated are read from their per-tool map columns."""
+
+    configs = dict()
+    for tool in pipeline.config_hashes or dict():
+        configs[tool] = get_config(pipeline.config_hashes[tool])
+
+    for tool in LEGACY_CONFIG_TOOLS:
+        legacy_config = getattr(pipeline, "{}_config".format(tool))
+        if tool not in configs and legacy_config:
+            configs[tool] = legacy_config
+
+    return configs
+
+
+def get_pipeline(run_type, status, date=None):
+    """The Pipeline row for a run type and status at the given date, or the
+    most recent one when no date is given"""
+
+    pipelines = Pipeline.objects.timeout(None).filter(Pipeline.run_type == run_type, Pipeline.status == status)
+    if date is not None:
+        return pipelines.filter(Pipeline.date == date).get()
+
+    return pipelines.order_by('-date').limit(1).get()
+
+
+def get_pipeline_id(pipeline):
+    """Id of a Pipeline row as recorded in Sample.pipeline_id: its primary key,
+    run_type:status:date, with the date to the millisecond as stored"""
+
+    date = "{}.{:03d}".format(pipeline.date.strftime("%Y-%m-%dT%H:%M:%S"), pipeline.date.microsecond // 1000)
+
+    return u"{}:{}:{}".format(pipeline.run_type, pipeline.status, date)
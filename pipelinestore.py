@@ -40,3 +40,13 @@ class Pipeline(Model):
     samtools_config = columns.Map(columns.Text, columns.Text)
     fastqc_config = columns.Map(columns.Text, columns.Text)
     vt_config = columns.Map(columns.Text, columns.Text)
+
+    # Tool name -> PipelineConfig hash, replaces the per-tool config maps above
+    config_hashes = columns.Map(columns.Text, columns.Text)
+
+
+class PipelineConfig(Model):
+    __keyspace__ = 'pipelinestore'
+    config_hash = columns.Text(primary_key=True, partition_key=True)
+
+    config = columns.Map(columns.Text, columns.Text)
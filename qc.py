@@ -0,0 +1,148 @@
+import os
+import zipfile
+
+from datetime import datetime
+
+import blobs
+from qcstore import QC
+
+STATUS_RANK = {'pass': 0, 'warn': 1, 'fail': 2}
+
+# Picard metric name -> QC summary column
+PICARD_SUMMARY_METRICS = {'PERCENT_DUPLICATION': 'percent_duplication',
+                          'PCT_PF_READS_ALIGNED': 'pct_pf_reads_aligned',
+                          'MEAN_TARGET_COVERAGE': 'mean_target_coverage',
+                          'PCT_SELECTED_BASES': 'pct_selected_bases'}
+
+
+def read_qc_file(filename):
+    """Return the name and contents to store for a QC output file. FastQC zip
+    archives are reduced to their fastqc_data.txt report."""
+
+    if filename.endswith(".zip"):
+        with zipfile.ZipFile(filename) as archive:
+            for member in archive.namelist():
+                if member.endswith("fastqc_data.txt"):
+                    return member, archive.read(member)
+
+    with open(filename, 'rb') as qc_file:
+        return os.path.normpath(filename), qc_file.read()
+
+
+def parse_fastqc_data(data):
+    metrics = dict()
+    status = dict()
+    for line in data.splitlines():
+        if line.startswith(">>") and not line.startswith(">>END_MODULE"):
+            module, module_status = line[2:].split("\t")[:2]
+            status[module] = module_status
+        elif line.startswith("Total Sequences\t"):
+            metrics['total_sequences'] = int(line.split("\t")[1])
+        elif line.startswith("%GC\t"):
+            metrics['percent_gc'] = float(line.split("\t")[1])
+
+    return metrics, status
+
+
+def parse_picard_metrics(data):
+    """Parse the metrics table of a Picard metrics file, returning the last row
+    (the PAIR category for alignment summaries) as a dict"""
+
+    lines = data.splitlines()
+    for index, line in enumerate(lines):
+        if line.startswith("## METRICS CLASS"):
+            header = lines[index + 1].split("\t")
+            row = None
+            for metrics_line in lines[index + 2:]:
+                if not metrics_line.strip():
+                    break
+                row = metrics_line.split("\t")
+            if row is None:
+                return dict()
+            return dict(zip(header, row))
+
+    return dict()
+
+
+def parse_picard_value(value):
+    """A Picard metric as a float, or None when it is empty or not numeric
+    (Picard writes '?' for metrics it could not compute)"""
+
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def summarize_qc_files(qc_files):
+    """Build the typed summary columns from a dict of QC file name -> contents"""
+
+    summary = dict()
+    fastqc_status = dict()
+    for name, data in qc_files.items():
+        if name.endswith("fastqc_data.txt"):
+            metrics, status = parse_fastqc_data(data)
+            if 'total_sequences' in metrics:
+                summary['total_sequences'] = summary.get('total_sequences', 0) + metrics['total_sequences']
+            if 'percent_gc' in metrics:
+                summary['percent_gc'] = metrics['percent_gc']
+            for module in status:
+                if STATUS_RANK.get(status[module], 0) >= STATUS_RANK.get(fastqc_status.get(module), 0):
+                    fastqc_status[module] = status[module]
+        else:
+            metrics = parse_picard_metrics(data)
+            for metric in PICARD_SUMMARY_METRICS:
+                value = parse_picard_value(metrics.get(metric))
+                if value is not None:
+                    summary[PICARD_SUMMARY_METRICS[metric]] = value
+
+    summary['fastqc_status'] = fastqc_status
+
+    return summary
+
+
+def store_library_qc(library, analysis_id, filenames):
+    qc_files = dict()
+    for filename in filenames:
+        name, data = read_qc_file(filename)
+        qc_files[name] = data
+
+    summary = summarize_qc_files(qc_files)
+
+    qc = QC.create(sample=library['sample_name'],
+                   library_name=library['library_name'],
+                   run_id=library['run_id'],
+                   analysis_id=analysis_id,
+                   sequencer=library['sequencer'],
+                   target_pool=library['target_pool'],
+                   panel_name=library['panel'],
+                   initial_report_panel=library['report'],
+                   extraction=library['extraction'],
+                   date_annotated=datetime.now(),
+                   qcdata=dict((name, blobs.compress(qc_files[name])) for name in qc_files),
+                   **summary)
+
+    return qc
+
+
+def get_qc_summaries(sample, library_name=None, run_id=None):
+    """QC rows for a sample without the qcdata blobs"""
+
+    qc_rows = QC.objects.timeout(None).filter(QC.sample == sample)
+    if library_name is not None:
+        qc_rows = qc_rows.filter(QC.library_name == library_name)
+        if run_id is not None:
+            qc_rows = qc_rows.filter(QC.run_id == run_id)
+
+    return qc_rows.defer(['qcdata']).limit(None)
+
+
+def get_qc_file(sample, library_name, run_id, analysis_id, name):
+    qc = QC.objects.timeout(None).filter(
+        QC.sample == sample,
+        QC.library_name == library_name,
+        QC.run_id == run_id,
+        QC.analysis_id == analysis_id
+    ).only(['qcdata']).get()
+
+    return blobs.decompress(qc.qcdata[name])
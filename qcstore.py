@@ -16,4 +16,14 @@ class QC(Model):
     extraction = columns.Text(index=True)
     date_annotated = columns.DateTime()
 
+    # Summary metrics, small enough to read without the blobs
+    total_sequences = columns.BigInt()
+    percent_gc = columns.Float()
+    percent_duplication = columns.Float()
+    pct_pf_reads_aligned = columns.Float()
+    mean_target_coverage = columns.Float()
+    pct_selected_bases = columns.Float()
+    fastqc_status = columns.Map(columns.Text, columns.Text)
+
+    # zlib compressed QC output files keyed by file name
     qcdata = columns.Map(columns.Text, columns.Blob)
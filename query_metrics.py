@@ -0,0 +1,209 @@
+import json
+import time
+import heapq
+import threading
+
+from collections import OrderedDict
+
+from cassandra.query import BoundStatement
+from cassandra.cqlengine import connection
+
+# Every query sent through a session, cqlengine's included, is seen by a
+# request init listener on the session. Queries are grouped by shape, the
+# statement text with its parameter placeholders, and each shape keeps a
+# latency histogram and its row, page, retry and error counts. The slowest
+# individual executions are kept with their parameters. A query's latency runs
+# from sending it to receiving its last page, so for paged reads it includes
+# the time the caller spends between pages. Queries whose caller stopped paging
+# early, or that were still in flight, are recorded as unfinished when the
+# metrics are uninstalled or summarized, up to the last page they received.
+
+# Upper bounds of the latency histogram buckets, the last bucket is unbounded
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+MAX_PARAMETERS_LENGTH = 500
+
+
+def get_query_shape(future):
+    statement = future.query
+    if isinstance(statement, BoundStatement):
+        return statement.prepared_statement.query_string
+
+    return getattr(statement, 'query_string', unicode(statement))
+
+
+def get_query_parameters(future):
+    """The parameters of an execution, as the bound query text for simple
+    statements and the serialized values for prepared ones"""
+
+    statement = future.query
+    if isinstance(statement, BoundStatement):
+        parameters = repr(statement.values)
+    else:
+        parameters = getattr(future.message, 'query', "")
+
+    return parameters[:MAX_PARAMETERS_LENGTH]
+
+
+class QueryShapeStats(object):
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.unfinished = 0
+        self.rows = 0
+        self.pages = 0
+        self.retries = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, seconds, rows, pages, retries, error, finished=True):
+        self.count += 1
+        self.errors += int(error)
+        self.unfinished += int(not finished)
+        self.rows += rows
+        self.pages += pages
+        self.retries += retries
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+        milliseconds = seconds * 1000
+        bucket = 0
+        while bucket < len(LATENCY_BUCKETS_MS) and milliseconds > LATENCY_BUCKETS_MS[bucket]:
+            bucket += 1
+        self.buckets[bucket] += 1
+
+    def percentile_ms(self, percentile):
+        """Upper bound of the histogram bucket holding the percentile, capped
+        at the largest latency seen"""
+
+        threshold = self.count * percentile / 100.0
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= threshold:
+                if bucket < len(LATENCY_BUCKETS_MS):
+                    return min(LATENCY_BUCKETS_MS[bucket], round(self.max_seconds * 1000, 3))
+                break
+
+        return round(self.max_seconds * 1000, 3)
+
+    def summary(self):
+        labels = ["<={}ms".format(bound) for bound in LATENCY_BUCKETS_MS] + [">{}ms".format(LATENCY_BUCKETS_MS[-1])]
+
+        return OrderedDict([('count', self.count),
+                            ('errors', self.errors),
+                            ('unfinished', self.unfinished),
+                            ('rows', self.rows),
+                            ('pages', self.pages),
+                            ('retries', self.retries),
+                            ('total_ms', round(self.total_seconds * 1000, 3)),
+                            ('mean_ms', round(self.total_seconds * 1000 / max(self.count, 1), 3)),
+                            ('p50_ms', self.percentile_ms(50)),
+                            ('p99_ms', self.percentile_ms(99)),
+                            ('max_ms', round(self.max_seconds * 1000, 3)),
+                            ('histogram', OrderedDict((label, count) for label, count in zip(labels, self.buckets)
+                                                      if count))])
+
+
+class QueryMetrics(object):
+    """Collects query metrics from a session between install() and
+    uninstall()"""
+
+    def __init__(self, top_n=20):
+        self.top_n = top_n
+        self.shapes = dict()
+        self.slowest = list()
+        self.session = None
+        # Future -> state of every query not yet recorded
+        self.pending = dict()
+        self._lock = threading.Lock()
+
+    def install(self, session=None):
+        self.session = session or connection.get_session()
+        self.session.add_request_init_listener(self._on_request)
+
+    def uninstall(self):
+        if self.session is not None:
+            self.session.remove_request_init_listener(self._on_request)
+            self.session = None
+        self._record_pending()
+
+    def _on_request(self, future):
+        # Started time, rows and pages seen so far and the time of the last page
+        state = [time.time(), 0, 0, None]
+        with self._lock:
+            self.pending[future] = state
+        future.add_callbacks(self._on_page, self._on_error, callback_args=(future, state),
+                             errback_args=(future, state))
+
+    def _on_page(self, rows, future, state):
+        # Callbacks run once for every page of a paged query
+        state[1] += len(rows or ())
+        state[2] += 1
+        state[3] = time.time()
+        if not future.has_more_pages:
+            self._record(future, state, False)
+
+    def _on_error(self, error, future, state):
+        self._record(future, state, True)
+
+    def _record_pending(self):
+        """Record the queries not yet finished, paged queries up to their last
+        page. Any later pages of them are ignored."""
+
+        with self._lock:
+            pending = self.pending.items()
+        for future, state in pending:
+            self._record(future, state, False, (state[3] or time.time()) - state[0], False)
+
+    def _record(self, future, state, error, seconds=None, finished=True):
+        if seconds is None:
+            seconds = time.time() - state[0]
+        retries = max(len(future.attempted_hosts) - 1, 0)
+        shape = get_query_shape(future)
+
+        with self._lock:
+            if self.pending.pop(future, None) is None:
+                return
+            if shape not in self.shapes:
+                self.shapes[shape] = QueryShapeStats()
+            self.shapes[shape].add(seconds, state[1], state[2], retries, error, finished)
+
+            if len(self.slowest) < self.top_n or seconds > self.slowest[0][0]:
+                entry = (seconds, shape, get_query_parameters(future), state[1], state[2])
+                if len(self.slowest) < self.top_n:
+                    heapq.heappush(self.slowest, entry)
+                else:
+                    heapq.heapreplace(self.slowest, entry)
+
+    def summary(self):
+        self._record_pending()
+        with self._lock:
+            shapes = sorted(self.shapes.items(), key=lambda item: item[1].total_seconds, reverse=True)
+            slowest = sorted(self.slowest, reverse=True)
+
+            return OrderedDict([('queries', sum([stats.count for shape, stats in shapes])),
+                                ('shapes', [OrderedDict([('query', shape)] + stats.summary().items())
+                                            for shape, stats in shapes]),
+                                ('slowest', [OrderedDict([('ms', round(seconds * 1000, 3)),
+                                                          ('query', shape),
+                                                          ('parameters', parameters),
+                                                          ('rows', rows),
+                                                          ('pages', pages)])
+                                             for seconds, shape, parameters, rows, pages in slowest])])
+
+    def write(self, filename):
+        with open(filename, "w") as summary:
+            json.dump(self.summary(), summary, indent=2)
+            summary.write("\n")
+
+    def format_slowest(self, limit=5):
+        """Lines describing the slowest queries, for job logs"""
+
+        lines = list()
+        for entry in self.summary()['slowest'][:limit]:
+            lines.append("{:.1f}ms {} rows {} pages: {}\n".format(entry['ms'], entry['rows'], entry['pages'],
+                                                                  entry['parameters'] or entry['query']))
+
+        return lines
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+
+# Refreshes ClinVar and COSMIC derived columns of stored variants from a new
+# annotation source without re-running ingest. Each table is scanned in
+# parallel token ranges by scanner.scan and only rows whose annotation changed
+# are updated, touching just the changed columns. With --dry_run the changes
+# are written out as a diff instead. Stored variants with no record in the
+# source are counted, and with --clear_missing their annotation is cleared.
+# Only the newest release row of each variant in VariantAnnotation is
+# refreshed; rows of older releases keep the annotation they were stored with.
+
+import sys
+import csv
+import getpass
+import argparse
+
+from itertools import groupby
+
+import utils
+import scanner
+import annotations
+from cyvcf2 import VCF
+from ddb import vcf_parsing
+from variantstore import Variant
+from variantstore import SampleVariant
+from variantstore import TargetVariant
+from variantstore import BucketedVariant
+from variantstore import VariantAnnotation
+from cassandra.auth import PlainTextAuthProvider
+
+MODELS = {'variant_annotation': VariantAnnotation,
+          'variant': Variant,
+          'sample_variant': SampleVariant,
+          'target_variant': TargetVariant,
+          'bucketed_variant': BucketedVariant}
+
+# Columns derived from the annotation source. The data maps live on
+# VariantAnnotation, and on older sample rows written before annotations were
+# normalized; the flags and ids are always on the sample rows.
+DATA_COLUMNS = ('clinvar_data', 'cosmic_data')
+FLAG_COLUMNS = ('in_clinvar', 'in_cosmic', 'is_pathogenic', 'cosmic_ids')
+
+
+class AnnotationRecord(object):
+    """Minimal stand-in for a cyvcf2 record, for annotation sources read
+    from TSV files"""
+
+    def __init__(self, chrom, start, ref, alt, info):
+        self.CHROM = chrom
+        self.start = start
+        self.REF = ref
+        self.ALT = [alt]
+        self.INFO = info
+
+
+def read_annotation_vcf(filename):
+    records = dict()
+    for variant in VCF(filename):
+        records[(unicode(variant.CHROM), int(variant.start), unicode(variant.REF), unicode(variant.ALT[0]))] = variant
+
+    return records
+
+
+def read_annotation_tsv(filename):
+    """Read a tab delimited annotation source with CHROM, POS (1-based, as in
+    VCF), REF and ALT columns followed by columns named like the INFO fields
+    they replace (clinvar_significance, cosmic_ids, ...)"""
+
+    records = dict()
+    with open(filename, "r") as annotation_file:
+        reader = csv.DictReader(annotation_file, dialect='excel-tab')
+        for row in reader:
+            info = dict((field, row[field]) for field in row
+                        if field not in ('CHROM', 'POS', 'REF', 'ALT') and row[field] not in (None, '', '.'))
+            record = AnnotationRecord(row['CHROM'], int(row['POS']) - 1, row['REF'], row['ALT'], info)
+            records[(unicode(record.CHROM), record.start, unicode(record.REF), unicode(record.ALT[0]))] = record
+
+    return records
+
+
+def _text_map(data):
+    return dict((unicode(key), unicode(data[key])) for key in data)
+
+
+def get_annotation_values(record):
+    return {'clinvar_data': _text_map(utils.get_clinvar_info(record)),
+            'cosmic_data': _text_map(utils.get_cosmic_info(record)),
+            'in_clinvar': vcf_parsing.var_is_in_clinvar(record),
+            'in_cosmic': vcf_parsing.var_is_in_cosmic(record),
+            'is_pathogenic': vcf_parsing.var_is_pathogenic(record),
+            'cosmic_ids': [unicode(cosmic_id) for cosmic_id in vcf_parsing.parse_cosmic_ids(record)]}
+
+
+def get_empty_annotation_values():
+    """Values of a variant with no record in the annotation source, as ingest
+    stores them for a variant without annotations"""
+
+    return get_annotation_values(AnnotationRecord(None, None, None, None, dict()))
+
+
+def get_changes(row, values, columns):
+    changed = dict()
+    for column in columns:
+        current = row[column]
+        if column in DATA_COLUMNS:
+            current = _text_map(current or dict())
+        elif column == 'cosmic_ids':
+            current = list(current or list())
+        if current != values[column]:
+            changed[column] = values[column]
+
+    return changed
+
+
+def _get_columns(model):
+    if model is VariantAnnotation:
+        return DATA_COLUMNS
+
+    return DATA_COLUMNS + FLAG_COLUMNS
+
+
+def _newest_release_rows(rows):
+    """The newest release row of each variant among VariantAnnotation rows
+    in token order, where the rows of a variant are adjacent"""
+
+    release_dates = annotations.get_release_dates()
+    for key, variant_rows in groupby(rows, lambda row: (row['reference_genome'], row['chr'], row['pos'], row['ref'],
+                                                        row['alt'])):
+        yield annotations.newest_annotation(variant_rows, release_dates)
+
+
+def _reannotate_rows(rows, context):
+    """Scanner mapper re-annotating the rows of one token range. Returns the
+    number of rows changed and, for dry runs, the diff lines describing the
+    changes."""
+
+    model, reference_genome, source_annotations, dry_run, clear_missing = context
+    primary_keys = [column.db_field_name for column in model._primary_keys.values()]
+    columns = _get_columns(model)
+
+    empty_values = get_empty_annotation_values() if clear_missing else None
+    updated = 0
+    missing = 0
+    diff = list()
+    if model is VariantAnnotation:
+        rows = _newest_release_rows(rows)
+    for row in rows:
+        if row['reference_genome'] != reference_genome:
+            continue
+        key = (row['chr'], row['pos'], row['ref'], row['alt'])
+        if key in source_annotations:
+            values = source_annotations[key]
+        else:
+            # The variant has no record in the new source, so its stored
+            # annotation is stale
+            missing += 1
+            if not clear_missing:
+                continue
+            values = empty_values
+
+        # Sample rows relying on VariantAnnotation have no inline data to refresh
+        row_columns = columns
+        if model is not VariantAnnotation and not row['clinvar_data']:
+            row_columns = FLAG_COLUMNS
+
+        changed = get_changes(row, values, row_columns)
+        if not changed:
+            continue
+
+        updated += 1
+        primary_key = [(column, row[column]) for column in primary_keys]
+        if dry_run:
+            row_id = ":".join([unicode(value) for column, value in primary_key])
+            for column in sorted(changed):
+                diff.append(u"{}\t{}\t{}\t{}\t{}\n".format(model.column_family_name(), row_id, column, row[column],
+                                                           changed[column]))
+        else:
+            model.objects.filter(**dict(primary_key)).update(**changed)
+
+    return updated, missing, diff
+
+
+def reannotate_table(model, reference_genome, source_annotations, addresses, auth_provider=None, processes=8,
+                     num_ranges=256, dry_run=False, output=sys.stdout, clear_missing=False):
+    """Scan a table in token ranges, updating or, for dry runs, writing a
+    diff of every row whose annotation changed. source_annotations maps
+    (chr, pos, ref, alt) keys to the values from get_annotation_values. Rows
+    of variants missing from it are counted and, with clear_missing,
+    have their annotation cleared. Returns the numbers of rows updated and
+    missing."""
+
+    def write_diff(counts, result):
+        range_updated, range_missing, diff = result
+        for line in diff:
+            output.write(line.encode('utf-8'))
+
+        return counts[0] + range_updated, counts[1] + range_missing
+
+    columns = [column.db_field_name for column in model._primary_keys.values()] + list(_get_columns(model))
+
+    return scanner.scan(model, columns, _reannotate_rows, write_diff, (0, 0), addresses, "variantstore",
+                        auth_provider=auth_provider,
+                        context=(model, reference_genome, source_annotations, dry_run, clear_missing),
+                        processes=processes, num_ranges=num_ranges)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-i', '--input', help="Annotation source, a VCF or a tab delimited file")
+    parser.add_argument('-g', '--genome', help="Reference genome version to re-annotate", default='GRCh37.75')
+    parser.add_argument('-t', '--tables', help="Comma separated list of tables to re-annotate",
+                        default="variant_annotation,variant,bucketed_variant,sample_variant,target_variant")
+    parser.add_argument('-r', '--ranges', help="Number of token ranges to split each table scan in to",
+                        type=int, default=256)
+    parser.add_argument('-p', '--processes', help="Number of token ranges scanned concurrently", type=int,
+                        default=8)
+    parser.add_argument('-d', '--dry_run', help="Write the changes that would be made instead of applying them",
+                        action='store_true')
+    parser.add_argument('-c', '--clear_missing', help="Clear the annotation of stored variants missing from the "
+                                                      "annotation source, instead of only counting them",
+                        action='store_true')
+    parser.add_argument('-a', '--address', help="IP Address for Cassandra connection", default='127.0.0.1')
+    parser.add_argument('-u', '--username', help='Cassandra username for login', default=None)
+    args = parser.parse_args()
+
+    sys.stderr.write("Reading annotation source\n")
+    if args.input.endswith(".vcf") or args.input.endswith(".vcf.gz"):
+        records = read_annotation_vcf(args.input)
+    else:
+        records = read_annotation_tsv(args.input)
+    source_annotations = dict((key, get_annotation_values(records[key])) for key in records)
+    sys.stderr.write("Read annotations for {} variants\n".format(len(source_annotations)))
+
+    if args.username:
+        password = getpass.getpass()
+        auth_provider = PlainTextAuthProvider(username=args.username, password=password)
+    else:
+        auth_provider = None
+
+    for table in args.tables.split(','):
+        sys.stderr.write("Re-annotating {}\n".format(table))
+        updated, missing = reannotate_table(MODELS[table], args.genome, source_annotations, [args.address],
+                                            auth_provider, args.processes, args.ranges, args.dry_run,
+                                            clear_missing=args.clear_missing)
+        if args.dry_run:
+            sys.stderr.write("{} rows in {} would be updated\n".format(updated, table))
+        else:
+            sys.stderr.write("Updated {} rows in {}\n".format(updated, table))
+        sys.stderr.write("{} rows in {} are of variants missing from the annotation source\n".format(missing,
+                                                                                                   table))
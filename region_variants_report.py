@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+import sys
+import getpass
+import argparse
+import regions
+
+from ddb import configuration
+from cassandra.cqlengine import connection
+from cassandra.auth import PlainTextAuthProvider
+
+
+def write_variant(output, var):
+    output.write("{chr}\t{pos}\t{ref}\t{alt}\t{gene}\t{codon}\t{aa}\t{amp}\t{sample}\t{lib}\t{run}\t{vaf}\t{call}"
+                 "\n".format(chr=var.chr, pos=var.pos, ref=var.ref, alt=var.alt, gene=var.gene,
+                             codon=var.codon_change, aa=var.aa_change, amp=var.amplicon_data['amplicon'],
+                             sample=var.sample, lib=var.library_name, run=var.run_id, vaf=var.max_som_aaf,
+                             call=",".join(var.callers) or None))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-r', '--region', help="Region to query (chr:start-end), may be given multiple times",
+                        action='append', default=[])
+    parser.add_argument('-b', '--bed', help="BED file of regions to query", default=None)
+    parser.add_argument('-s', '--samples_file', help="Restrict query to libraries in this samples file",
+                        default=None)
+    parser.add_argument('-c', '--configuration', help="Configuration file for various settings")
+    parser.add_argument('-g', '--genome', help="Reference genome version", default='GRCh37.75')
+    parser.add_argument('-o', '--output', help="Root name for report", default='report')
+    parser.add_argument('-a', '--address', help="IP Address for Cassandra connection", default='127.0.0.1')
+    parser.add_argument('-u', '--username', help='Cassandra username for login', default=None)
+    args = parser.parse_args()
+
+    if args.username:
+        password = getpass.getpass()
+        auth_provider = PlainTextAuthProvider(username=args.username, password=password)
+        connection.setup([args.address], "variantstore", auth_provider=auth_provider)
+    else:
+        connection.setup([args.address], "variantstore")
+
+    intervals = [regions.parse_region(region) for region in args.region]
+    if args.bed:
+        intervals.extend(regions.read_bed(args.bed))
+    intervals = regions.merge_intervals(intervals)
+    sys.stdout.write("Querying {} merged regions\n".format(len(intervals)))
+
+    with open("region_variants_{}.txt".format(args.output), "w") as output:
+        output.write("Chr\tPos\tRef\tAlt\tGene\tCodon\tAA\tAmplicon\tSample\tLibrary\tRun\tVAF\tCallers\n")
+        if args.samples_file:
+            config = configuration.configure_runtime(args.configuration)
+            samples = configuration.configure_samples(args.samples_file, config)
+            for sample in samples:
+                for var in regions.get_sample_variants_in_regions(config['genome_version'],
+                                                                  samples[sample]['sample_name'],
+                                                                  samples[sample]['run_id'],
+                                                                  samples[sample]['library_name'],
+                                                                  intervals):
+                    write_variant(output, var)
+        else:
+            for var in regions.get_variants_in_regions(args.genome, intervals):
+                write_variant(output, var)
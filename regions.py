@@ -0,0 +1,77 @@
+import csv
+
+import routing
+from variantstore import SampleVariant
+
+# Intervals are (chr, start, end) tuples using BED conventions: 0-based, half
+# open. Variant positions are stored 0-based (cyvcf2 variant.start), so a
+# variant falls in an interval when start <= pos < end.
+
+
+def parse_region(region):
+    """Parse a samtools style region string (chr7:55,241,000-55,260,000),
+    which is 1-based and inclusive, in to a BED interval"""
+
+    chr, coords = region.replace(',', '').split(':')
+    start, end = coords.split('-')
+
+    return chr, int(start) - 1, int(end)
+
+
+def read_bed(filename):
+    intervals = list()
+    with open(filename, "r") as bedfile:
+        reader = csv.reader(bedfile, dialect='excel-tab')
+        for row in reader:
+            if not row or row[0].startswith(('#', 'track', 'browser')):
+                continue
+            intervals.append((row[0], int(row[1]), int(row[2])))
+
+    return intervals
+
+
+def merge_intervals(intervals):
+    """Sort intervals and merge any that overlap or abut so each base is only
+    queried once"""
+
+    merged = list()
+    for chr, start, end in sorted(intervals):
+        if merged and merged[-1][0] == chr and start <= merged[-1][2]:
+            if end > merged[-1][2]:
+                merged[-1] = (chr, merged[-1][1], end)
+        else:
+            merged.append((chr, start, end))
+
+    return merged
+
+
+def get_sample_variants_in_regions(reference_genome, sample, run_id, library_name, intervals):
+    """Yield a library's variants overlapping the intervals using server-side
+    slices on the chr and pos clustering columns of SampleVariant"""
+
+    for chr, start, end in merge_intervals(intervals):
+        variants = SampleVariant.objects.timeout(None).filter(
+            SampleVariant.sample == sample,
+            SampleVariant.run_id == run_id,
+            SampleVariant.reference_genome == reference_genome,
+            SampleVariant.library_name == library_name,
+            SampleVariant.chr == chr,
+            SampleVariant.pos >= start,
+            SampleVariant.pos < end
+        ).limit(None)
+
+        for variant in variants:
+            yield variant
+
+
+def get_variants_in_regions(reference_genome, intervals, samples=None):
+    """Yield variants from all samples overlapping the intervals, optionally
+    restricted to a collection of sample names"""
+
+    if samples is not None:
+        samples = set(samples)
+
+    for chr, start, end in merge_intervals(intervals):
+        for variant in routing.get_variants_in_range(reference_genome, chr, start, end - 1):
+            if samples is None or variant.sample in samples:
+                yield variant
@@ -1,63 +1,56 @@
 #!/usr/bin/env python
 
-import re
 import sys
-import utils
+import panels
+import timing
+import storage
+import variant_keys
+import query_metrics
+import vaf_distributions
 import getpass
 import argparse
 import xlsxwriter
 
 import numpy as np
 
-from scipy import stats
 from toil.job import Job
 from ddb import configuration
 from ddb_ngsflow import pipeline
-from variantstore import Variant
 from collections import defaultdict
-from variantstore import SampleVariant
-from coveragestore import SampleCoverage
-from coveragestore import AmpliconCoverage
-from cassandra.cqlengine import connection
 from cassandra.auth import PlainTextAuthProvider
 
 
-def get_all_amplicons(job, samples):
-    job.fileStore.logToMaster(
-        "Building list of all amplicons from samples set\n")
+def list_amplicons(samples):
     amplicons_list = list()
+    seen_amplicons = set()
     for sample in samples:
         for library in samples[sample]:
-            report_panel_path = (
-                "/mnt/shared-data/ddb-configs/disease_panels/{}/{}".format(
-                    samples[sample][library]['panel'],
-                    samples[sample][library]['report']))
-            target_amplicons = utils.get_target_amplicons(report_panel_path)
-            for amplicon in target_amplicons:
-                if amplicon not in amplicons_list:
+            report_panel_path = panels.get_panel_path(
+                samples[sample][library]['panel'],
+                samples[sample][library]['report'])
+            target_panel = panels.load_panel_file(report_panel_path)
+            for amplicon in target_panel:
+                if amplicon not in seen_amplicons:
+                    seen_amplicons.add(amplicon)
                     amplicons_list.append(amplicon)
 
     return amplicons_list
 
 
-def get_coverage_data_all_amplicons(job, amplicons_list, addresses,
-                                    authenticator):
+def get_all_amplicons(job, samples):
     job.fileStore.logToMaster(
-        "Retrieving coverage data for all libraries in database for all \
-        amplicons\n")
-    connection.setup(addresses, "coveragestore", auth_provider=authenticator)
+        "Building list of all amplicons from samples set\n")
+
+    return list_amplicons(samples)
+
 
+def get_amplicon_coverage_stats(store, amplicons_list):
     amplicon_coverage_stats = defaultdict(dict)
 
     for amplicon in amplicons_list:
         coverage_values = list()
 
-        coverage_data = AmpliconCoverage.objects.timeout(None).filter(
-            AmpliconCoverage.amplicon == amplicon
-        )
-        ordered_samples = coverage_data.order_by(
-            'sample', 'run_id').limit(coverage_data.count() + 1000)
-        for result in ordered_samples:
+        for result in store.get_amplicon_coverage(amplicon):
             coverage_values.append(result.mean_coverage)
 
         amplicon_coverage_stats[amplicon]['median'] = (
@@ -69,11 +62,29 @@ def get_coverage_data_all_amplicons(job, amplicons_list, addresses,
     return amplicon_coverage_stats
 
 
-def process_sample(job, config, sample, samples, addresses, authenticator,
-                   thresholds, callers, amplicon_stats):
-    job.fileStore.logToMaster("Retrieving data for sample {}\n".format(sample))
-    job.fileStore.logToMaster("Retrieving coverage data from database\n")
-    connection.setup(addresses, "coveragestore", auth_provider=authenticator)
+def get_coverage_data_all_amplicons(job, amplicons_list, addresses,
+                                    authenticator):
+    job.fileStore.logToMaster(
+        "Retrieving coverage data for all libraries in database for all \
+        amplicons\n")
+    store = storage.CassandraStorage(addresses, "coveragestore", authenticator)
+
+    return get_amplicon_coverage_stats(store, amplicons_list)
+
+
+def classify_sample_variants(store, config, sample, samples, thresholds, log,
+                             timer=None, suppress_artifacts=False):
+    """Retrieve a sample's coverage and variants from a storage backend and
+    sort the variants in to reporting tiers, timing each stage in timer.
+    With suppress_artifacts, variants in the panel's recurrent artifact list
+    are left out. Returns the report data and the reportable amplicon
+    coverage rows."""
+
+    if timer is None:
+        timer = timing.StageTimer("report")
+
+    log("Retrieving data for sample {}\n".format(sample))
+    log("Retrieving coverage data from database\n")
 
     report_data = dict()
     filtered_variant_data = defaultdict(list)
@@ -87,57 +98,49 @@ def process_sample(job, config, sample, samples, addresses, authenticator,
     filtered_low_freq = 0
     filtered_low_depth = 0
     filtered_off_target = 0
+    filtered_artifacts = 0
 
     tier1_clinvar_terms = ("pathogenic", "likely-pathogenic", "drug-response")
 
     for library in samples[sample]:
-        report_panel_path = (
-            "/mnt/shared-data/ddb-configs/disease_panels/{}/{}".format(
-                samples[sample][library]['panel'],
-                samples[sample][library]['report']))
-
-        job.fileStore.logToMaster(
-            "{}: processing amplicons from file {}".format(
-                library, report_panel_path))
-        target_amplicons = utils.get_target_amplicons(report_panel_path)
-
-        for amplicon in target_amplicons:
-            coverage_data = SampleCoverage.objects.timeout(None).filter(
-                SampleCoverage.sample == (
-                    samples[sample][library]['sample_name']),
-                SampleCoverage.amplicon == amplicon,
-                SampleCoverage.run_id == samples[sample][library]['run_id'],
-                SampleCoverage.library_name == (
-                    samples[sample][library]['library_name']),
-                SampleCoverage.program_name == "sambamba"
-            )
-            ordered_amplicons = (
-                coverage_data.order_by('amplicon', 'run_id').limit(
-                    coverage_data.count() + 1000))
+        report_panel_path = panels.get_panel_path(
+            samples[sample][library]['panel'],
+            samples[sample][library]['report'])
+
+        log("{}: processing amplicons from file {}".format(
+            library, report_panel_path))
+        target_panel = panels.load_panel_file(report_panel_path)
+
+        artifact_keys = frozenset()
+        if suppress_artifacts:
+            artifact_keys = store.get_artifacts(
+                config['genome_version'], samples[sample][library]['panel'])
+
+        for amplicon in target_panel:
+            with timer.stage("coverage_lookup"):
+                ordered_amplicons = store.get_sample_coverage(
+                    samples[sample][library]['sample_name'], amplicon,
+                    samples[sample][library]['run_id'],
+                    samples[sample][library]['library_name'], "sambamba")
             for result in ordered_amplicons:
                 reportable_amplicons.append(result)
                 target_amplicon_coverage[amplicon] = result
                 ordered_amplicon_coverage.append(result)
 
-        job.fileStore.logToMaster("{}: retrieving variants".format(library))
-        variants = SampleVariant.objects.timeout(None).filter(
-            SampleVariant.reference_genome == config['genome_version'],
-            SampleVariant.sample == samples[sample][library]['sample_name'],
-            SampleVariant.run_id == samples[sample][library]['run_id'],
-            SampleVariant.library_name == (
-                samples[sample][library]['library_name']),
-            SampleVariant.max_maf_all <= thresholds['max_maf']
-        ).allow_filtering()
-
-        num_var = variants.count()
-        ordered = variants.order_by('library_name', 'chr', 'pos', 'ref',
-                                    'alt', 'date_annotated').limit(variants.count() + 1000)
-        job.fileStore.logToMaster(
-            "{}: retrieved {} variants from database\n".format(
-                library, num_var))
-        job.fileStore.logToMaster(
-            "{}: classifying and filtering variants\n".format(library))
-
+        log("{}: retrieving variants".format(library))
+        with timer.stage("variant_lookup"):
+            ordered = store.get_sample_variants(
+                config['genome_version'],
+                samples[sample][library]['sample_name'],
+                samples[sample][library]['run_id'],
+                samples[sample][library]['library_name'],
+                thresholds['max_maf'])
+        num_var = len(ordered)
+        log("{}: retrieved {} variants from database\n".format(
+            library, num_var))
+        log("{}: classifying and filtering variants\n".format(library))
+
+        timer.start("classification")
         for variant in ordered:
             iterated += 1
             if variant.amplicon_data['amplicon'] is 'None':
@@ -146,53 +149,57 @@ def process_sample(job, config, sample, samples, addresses, authenticator,
                     variant.amplicon_data['amplicon']] += 1
             else:
                 amplicons = variant.amplicon_data['amplicon'].split(',')
-                assignable = 0
-                for amplicon in amplicons:
-                    if amplicon in target_amplicons:
-                        assignable += 1
-                        break
-                if assignable:
-                    match_variants = Variant.objects.timeout(None).filter(
-                        Variant.reference_genome == config['genome_version'],
-                        Variant.chr == variant.chr,
-                        Variant.pos == variant.pos,
-                        Variant.ref == variant.ref,
-                        Variant.alt == variant.alt
-                    ).allow_filtering()
-
-                    num_matches = match_variants.count()
-                    ordered_var = match_variants.order_by(
-                        'pos', 'ref', 'alt', 'sample', 'library_name',
-                        'run_id').limit(num_matches + 1000)
-                    vafs = list()
-                    run_vafs = list()
-                    run_match_samples = list()
-                    num_times_callers = defaultdict(int)
-                    num_times_in_run = 0
-
-                    for var in ordered_var:
-                        vaf = var.max_som_aaf
-                        vafs.append(vaf)
-                        if var.run_id == variant.run_id:
-                            num_times_in_run += 1
-                            run_vafs.append(vaf)
-                            run_match_samples.append(var.library_name)
-                        for caller in var.callers:
-                            num_times_callers[caller] += 1
-
-                    variant.vaf_median = np.median(vafs)
-                    variant.vaf_std_dev = np.std(vafs)
+                if target_panel.any_in(amplicons):
+                    # Artifact keys are only hashed when suppressing
+                    if artifact_keys and variant_keys.variant_key(
+                            variant.chr, variant.pos, variant.ref,
+                            variant.alt) in artifact_keys:
+                        filtered_artifacts += 1
+                        continue
+                    with timer.stage("cohort_lookup"):
+                        distribution = store.get_vaf_distribution(
+                            config['genome_version'], variant.chr,
+                            variant.pos, variant.ref, variant.alt)
+                        run_var = store.get_run_matches(
+                            config['genome_version'], variant.run_id,
+                            variant.chr, variant.pos, variant.ref,
+                            variant.alt)
+
+                        # Runs ingested before the run index, or variants
+                        # without a distribution, need every match
+                        if not run_var or distribution is None:
+                            ordered_var = store.get_variant_matches(
+                                config['genome_version'], variant.chr,
+                                variant.pos, variant.ref, variant.alt)
+                            if not run_var:
+                                run_var = [var for var in ordered_var
+                                           if var.run_id == variant.run_id]
+
+                    run_vafs = [var.max_som_aaf for var in run_var]
+                    run_match_samples = [var.library_name for var in run_var]
+                    num_times_in_run = len(run_var)
+
+                    if distribution is None:
+                        distribution = vaf_distributions.summarize_calls(
+                            [(var.max_som_aaf, var.callers)
+                             for var in ordered_var])
+                        distribution['vafs'] = vaf_distributions.unpack_vafs(
+                            distribution['vafs_packed'])
+
+                    variant.vaf_median = distribution['median']
+                    variant.vaf_std_dev = distribution['std_dev']
                     variant.run_median = np.median(run_vafs)
-                    variant.vaf_perc_rank = stats.percentileofscore(
-                        vafs, variant.max_som_aaf, kind="mean")
-                    variant.num_times_called = num_matches
+                    variant.vaf_perc_rank = vaf_distributions.percentile_rank(
+                        distribution['vafs'], variant.max_som_aaf)
+                    variant.num_times_called = distribution['num_calls']
                     variant.num_times_run = num_times_in_run
                     variant.matching_samples = run_match_samples
 
+                    caller_counts = distribution['caller_counts'] or dict()
                     caller_counts_elements = list()
-                    for caller in num_times_callers:
+                    for caller in caller_counts:
                         caller_counts_elements.append("{}: {}".format(
-                            caller, num_times_callers[caller]))
+                            caller, caller_counts[caller]))
                     variant.num_times_callers = ",".join(
                         caller_counts_elements)
 
@@ -262,22 +269,26 @@ def process_sample(job, config, sample, samples, addresses, authenticator,
                     filtered_off_target += 1
                     off_target_amplicon_counts[variant.amplicon_data[
                         'amplicon']] += 1
-
-        job.fileStore.logToMaster(
-            "{}: iterated through {} variants\n".format(library, iterated))
-        job.fileStore.logToMaster(
-            "{}: passing {} tier 1 and 2 variants\n".format(
-                library, len(filtered_variant_data['tier1_pass_variants'])))
-        job.fileStore.logToMaster(
-            "{}: passing {} tier3 variants\n".format(
-                library, len(filtered_variant_data['tier3_pass_variants'])))
-        job.fileStore.logToMaster(
-            "{}: passing {} tier 4 variants\n".format(
-                library, len(filtered_variant_data['tier4_pass_variants'])))
+        timer.stop()
+
+        log("{}: iterated through {} variants\n".format(library, iterated))
+        log("{}: suppressed {} recurrent artifacts\n".format(
+            library, filtered_artifacts))
+        log("{}: passing {} tier 1 and 2 variants\n".format(
+            library, len(filtered_variant_data['tier1_pass_variants'])))
+        log("{}: passing {} tier3 variants\n".format(
+            library, len(filtered_variant_data['tier3_pass_variants'])))
+        log("{}: passing {} tier 4 variants\n".format(
+            library, len(filtered_variant_data['tier4_pass_variants'])))
 
     report_data['variants'] = filtered_variant_data
     report_data['coverage'] = target_amplicon_coverage
 
+    return report_data, reportable_amplicons
+
+
+def write_sample_report(sample, samples, report_data, reportable_amplicons,
+                        thresholds, callers, amplicon_stats):
     report_name = "{}.xlsx".format(sample)
 
     wb = xlsxwriter.Workbook(report_name)
@@ -437,8 +448,6 @@ def process_sample(job, config, sample, samples, addresses, authenticator,
 
         row = 1
 
-        cosmic_nums = re.findall(r'\b\d+\b', variant.cosmic_data['num_samples'])
-
         for variant in report_data['variants'][tier_key[sheet_num]]:
             if "pathogenic" in variant.clinvar_data['significance']:
                 style = pass_style
@@ -565,6 +574,29 @@ def process_sample(job, config, sample, samples, addresses, authenticator,
     wb.close()
 
 
+def process_sample(job, config, sample, samples, addresses, authenticator,
+                   thresholds, callers, amplicon_stats, suppress_artifacts):
+    timer = timing.StageTimer("report", sample=sample)
+    store = storage.CassandraStorage(addresses, "coveragestore", authenticator)
+    metrics = query_metrics.QueryMetrics()
+    metrics.install()
+    try:
+        report_data, reportable_amplicons = classify_sample_variants(
+            store, config, sample, samples, thresholds,
+            job.fileStore.logToMaster, timer, suppress_artifacts)
+        with timer.stage("workbook_write"):
+            write_sample_report(sample, samples, report_data,
+                                reportable_amplicons, thresholds, callers,
+                                amplicon_stats)
+    finally:
+        metrics.uninstall()
+    timer.write("{}.report_timings.json".format(sample))
+    job.fileStore.logToMaster("Report timings: {}\n".format(timer.to_json()))
+    metrics.write("{}.report_queries.json".format(sample))
+    job.fileStore.logToMaster("Slowest queries for sample {}:\n{}".format(
+        sample, "".join(metrics.format_slowest())))
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('-s', '--samples_file',
@@ -592,6 +624,14 @@ if __name__ == "__main__":
     parser.add_argument('-p', '--max_pop_freq',
                         help='Maximum allowed population allele frequency',
                         default=0.005)
+    parser.add_argument('-l', '--local_db',
+                        help="Report from a local SQLite store instead of "
+                             "Cassandra, without Toil",
+                        default=None)
+    parser.add_argument('-x', '--suppress_artifacts',
+                        help="Leave out variants on the panel's recurrent "
+                             "artifact list",
+                        action='store_true')
     Job.Runner.addToilOptions(parser)
     args = parser.parse_args()
     args.logLevel = "INFO"
@@ -618,6 +658,23 @@ if __name__ == "__main__":
     callers = ("mutect", "platypus", "vardict", "scalpel", "freebayes",
                "pindel")
 
+    if args.local_db:
+        store = storage.SQLiteStorage(args.local_db)
+        amplicon_stats = get_amplicon_coverage_stats(
+            store, list_amplicons(samples))
+        for sample in samples:
+            sys.stdout.write("Processing sample {}\n".format(sample))
+            timer = timing.StageTimer("report", sample=sample)
+            report_data, reportable_amplicons = classify_sample_variants(
+                store, config, sample, samples, thresholds, sys.stdout.write,
+                timer, args.suppress_artifacts)
+            with timer.stage("workbook_write"):
+                write_sample_report(sample, samples, report_data,
+                                    reportable_amplicons, thresholds, callers,
+                                    amplicon_stats)
+            timer.write("{}.report_timings.json".format(sample))
+        sys.exit()
+
     sys.stdout.write("Processing samples\n")
     root_job = Job.wrapJobFn(pipeline.spawn_batch_jobs, cores=1)
     amplicons_list_job = Job.wrapJobFn(get_all_amplicons, samples)
@@ -636,7 +693,7 @@ if __name__ == "__main__":
         sample_job = Job.wrapJobFn(process_sample, config, sample, samples,
                                    [args.address], auth_provider,
                                    thresholds, callers, amplicon_stats,
-                                   cores=1)
+                                   args.suppress_artifacts, cores=1)
 
         spawn_samples_job.addChild(sample_job)
 
@@ -9,6 +9,7 @@ import sys
 import csv
 import xlwt
 import utils
+import panels
 import cyvcf2
 import argparse
 
@@ -23,18 +24,17 @@ def process_sample_coverage(sample, samples, config):
     for library in samples[sample]:
         print sample
         print library
-        report_panel_path = (
-            "/mnt/shared-data/ddb-configs/disease_panels/{}/{}".format(
-                samples[sample][library]['panel'],
-                samples[sample][library]['report']))
-        target_amplicons = utils.get_target_amplicons(report_panel_path)
+        report_panel_path = panels.get_panel_path(
+            samples[sample][library]['panel'],
+            samples[sample][library]['report'])
+        target_panel = panels.load_panel_file(report_panel_path)
         covf = "{}.sambamba_coverage.bed".format(samples[sample][library]['library_name'])
         with open(covf, 'rb') as coverage:
             reader = csv.reader(coverage, delimiter='\t')
             reader.next()
 
             for row in reader:
-                if row[3] in target_amplicons:
+                if row[3] in target_panel:
                     sample_coverage[row[3]] = {
                         "num_reads": int(row[4]),
                         "mean_coverage": float(row[5])
@@ -48,11 +48,10 @@ def process_sample_variants(coverage, sample, samples, config, thresholds):
     filtered_variant_data = defaultdict(list)
 
     for library in samples[sample]:
-        report_panel_path = (
-            "/mnt/shared-data/ddb-configs/disease_panels/{}/{}".format(
-                samples[sample][library]['panel'],
-                samples[sample][library]['report']))
-        target_amplicons = utils.get_target_amplicons(report_panel_path)
+        report_panel_path = panels.get_panel_path(
+            samples[sample][library]['panel'],
+            samples[sample][library]['report'])
+        target_panel = panels.load_panel_file(report_panel_path)
         sys.stdout.write("Parsing Caller VCF Files\n")
         vcf_parsing.parse_vcf("{}.mutect.low_support_filtered.vcf".format(samples[sample][library]['library_name']),
                               "mutect", caller_records)
@@ -89,15 +88,10 @@ def process_sample_variants(coverage, sample, samples, config, thresholds):
                 effects = utils.get_effects(variant, annotation_keys)
                 top_impact = utils.get_top_impact(effects)
                 severity = top_impact.effect_severity
-                amplicon_data = utils.get_amplicon_data(variant)
+                amplicon_data = utils.get_amplicon_data(variant, target_panel)
                 amplicons = amplicon_data['amplicon'].split(',')
 
-                assignable = 0
-                for amplicon in amplicons:
-                    if amplicon in target_amplicons:
-                        assignable += 1
-                        break
-                if assignable:
+                if target_panel.any_in(amplicons):
                     key = (unicode("chr{}".format(variant.CHROM)),
                            int(variant.start), int(variant.end),
                            unicode(variant.REF), unicode(variant.ALT[0]))
@@ -235,7 +229,7 @@ def process_sample_variants(coverage, sample, samples, config, thresholds):
     coverage_sheet.write(7, 2, "Coverage")
 
     row_num = 8
-    for amplicon in target_amplicons:
+    for amplicon in target_panel:
         if coverage[amplicon]['mean_coverage'] < 200:
             style = error_style
         elif coverage[amplicon]['mean_coverage'] < 500:
@@ -318,7 +312,7 @@ def process_sample_variants(coverage, sample, samples, config, thresholds):
             effects = utils.get_effects(variant, annotation_keys)
             top_impact = utils.get_top_impact(effects)
             severity = top_impact.effect_severity
-            amplicon_data = utils.get_amplicon_data(variant)
+            amplicon_data = utils.get_amplicon_data(variant, target_panel)
             amplicons = amplicon_data['amplicon'].split(',')
             clinvar_data = utils.get_clinvar_info(variant, samples[sample],
                                                   library)
@@ -2,7 +2,8 @@
 
 import re
 import sys
-import utils
+import panels
+import annotations
 import getpass
 import argparse
 import xlsxwriter
@@ -26,15 +27,16 @@ def get_all_amplicons(job, samples):
     job.fileStore.logToMaster(
         "Building list of all amplicons from samples set\n")
     amplicons_list = list()
+    seen_amplicons = set()
     for sample in samples:
         for library in samples[sample]:
-            report_panel_path = (
-                "/mnt/shared-data/ddb-configs/disease_panels/{}/{}".format(
-                    samples[sample][library]['panel'],
-                    samples[sample][library]['report']))
-            target_amplicons = utils.get_target_amplicons(report_panel_path)
-            for amplicon in target_amplicons:
-                if amplicon not in amplicons_list:
+            report_panel_path = panels.get_panel_path(
+                samples[sample][library]['panel'],
+                samples[sample][library]['report'])
+            target_panel = panels.load_panel_file(report_panel_path)
+            for amplicon in target_panel:
+                if amplicon not in seen_amplicons:
+                    seen_amplicons.add(amplicon)
                     amplicons_list.append(amplicon)
 
     return amplicons_list
@@ -91,17 +93,16 @@ def process_sample(job, config, sample, samples, addresses, authenticator,
     tier1_clinvar_terms = ("pathogenic", "likely-pathogenic", "drug-response")
 
     for library in samples[sample]:
-        report_panel_path = (
-            "/mnt/shared-data/ddb-configs/disease_panels/{}/{}".format(
-                samples[sample][library]['panel'],
-                samples[sample][library]['report']))
+        report_panel_path = panels.get_panel_path(
+            samples[sample][library]['panel'],
+            samples[sample][library]['report'])
 
         job.fileStore.logToMaster(
             "{}: processing amplicons from file {}".format(
                 library, report_panel_path))
-        target_amplicons = utils.get_target_amplicons(report_panel_path)
+        target_panel = panels.load_panel_file(report_panel_path)
 
-        for amplicon in target_amplicons:
+        for amplicon in target_panel:
             coverage_data = SampleCoverage.objects.timeout(None).filter(
                 SampleCoverage.sample == (
                     samples[sample][library]['sample_name']),
@@ -130,8 +131,9 @@ def process_sample(job, config, sample, samples, addresses, authenticator,
         ).allow_filtering()
 
         num_var = variants.count()
-        ordered = variants.order_by('library_name', 'chr', 'pos', 'ref',
-                                    'alt', 'date_annotated').limit(variants.count() + 1000)
+        ordered = annotations.join_annotations(
+            variants.order_by('library_name', 'chr', 'pos', 'ref',
+                              'alt', 'date_annotated').limit(variants.count() + 1000))
         job.fileStore.logToMaster(
             "{}: retrieved {} variants from database\n".format(
                 library, num_var))
@@ -146,12 +148,7 @@ def process_sample(job, config, sample, samples, addresses, authenticator,
                     variant.amplicon_data['amplicon']] += 1
             else:
                 amplicons = variant.amplicon_data['amplicon'].split(',')
-                assignable = 0
-                for amplicon in amplicons:
-                    if amplicon in target_amplicons:
-                        assignable += 1
-                        break
-                if assignable:
+                if target_panel.any_in(amplicons):
                     match_variants = Variant.objects.timeout(None).filter(
                         Variant.reference_genome == config['genome_version'],
                         Variant.chr == variant.chr,
@@ -0,0 +1,77 @@
+from variantstore import Variant
+from variantstore import RunVariant
+from variantstore import BucketedVariant
+
+# Width, in bases, of the position bins that make up the BucketedVariant
+# partition key. Changing this requires re-running migrate_variant_buckets.py
+BIN_SIZE = 100000
+
+RUN_VARIANT_COLUMNS = ('run_id', 'reference_genome', 'chr', 'pos', 'ref', 'alt', 'library_name', 'sample', 'callers',
+                       'max_som_aaf')
+
+
+def get_bin(pos):
+    return int(pos) // BIN_SIZE
+
+
+def get_bins(start, end):
+    return range(get_bin(start), get_bin(end) + 1)
+
+
+def get_run_variant_values(values):
+    return dict((name, values.get(name)) for name in RUN_VARIANT_COLUMNS)
+
+
+def create_variant(**kwargs):
+    """Write a variant to both the legacy Variant table and the position
+    bucketed table so the two layouts stay in sync during migration, and to
+    the run index"""
+
+    cassandra_variant = Variant.create(**kwargs)
+    BucketedVariant.create(bin=get_bin(kwargs['pos']), **kwargs)
+    RunVariant.create(**get_run_variant_values(kwargs))
+
+    return cassandra_variant
+
+
+def get_variant_matches(reference_genome, chr, pos, ref, alt):
+    match_variants = BucketedVariant.objects.timeout(None).filter(
+        BucketedVariant.reference_genome == reference_genome,
+        BucketedVariant.chr == chr,
+        BucketedVariant.bin == get_bin(pos),
+        BucketedVariant.pos == pos,
+        BucketedVariant.ref == ref,
+        BucketedVariant.alt == alt
+    ).limit(None)
+
+    return match_variants
+
+
+def get_run_matches(reference_genome, run_id, chr, pos, ref, alt):
+    """Calls of a variant in a single run, read from the run index"""
+
+    return RunVariant.objects.timeout(None).filter(
+        RunVariant.run_id == run_id,
+        RunVariant.reference_genome == reference_genome,
+        RunVariant.chr == chr,
+        RunVariant.pos == pos,
+        RunVariant.ref == ref,
+        RunVariant.alt == alt
+    ).limit(None)
+
+
+def get_variants_in_range(reference_genome, chr, start, end):
+    """Yield all variants with start <= pos <= end, walking the position bins
+    overlapping the range in order"""
+
+    for bin in get_bins(start, end):
+        variants = BucketedVariant.objects.timeout(None).filter(
+            BucketedVariant.reference_genome == reference_genome,
+            BucketedVariant.chr == chr,
+            BucketedVariant.bin == bin,
+            BucketedVariant.pos >= start,
+            BucketedVariant.pos <= end
+        ).limit(None)
+
+        for variant in variants:
+            yield variant
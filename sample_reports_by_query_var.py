@@ -41,7 +41,8 @@ def get_sample_variant_data(sample, samples, thresholds, authenticator):
                                biotype, severity, impact, impact_so, genes,
                                transcripts_data, in_cosmic, in_clinvar,
                                is_pathogenic, is_coding, is_lof, is_splicing,
-                               population_freqs, clinvar_data, cosmic_data,
+                               population_freqs, population_freqs_packed,
+                               clinvar_data, cosmic_data,
                                amplicon_data, max_maf_all, max_maf_no_fin,
                                min_depth, max_depth, min_som_aaf, max_som_aaf,
                                variant_filters, variant_categorization,
@@ -6,12 +6,29 @@ class Sample(Model):
     __keyspace__ = 'samplestore'
     sample = columns.Text(primary_key=True, partition_key=True)
     library_name = columns.Text(primary_key=True)
-    run_id = columns.Text(primary_key=True)
+    run_id = columns.Text(index=True, primary_key=True)
 
     extraction = columns.Text()
-    panel_name = columns.Text()
+    panel_name = columns.Text(index=True)
+    report = columns.Text()
     target_pool = columns.Text()
     sequencer = columns.Text()
+    date_added = columns.DateTime()
 
     pipeline_id = columns.Text()
     config = columns.Map(columns.Text, columns.Text)
+
+
+class SampleReport(Model):
+    __keyspace__ = 'samplestore'
+    report_group = columns.Text(primary_key=True, partition_key=True)
+
+    # Cluster Keys
+    report = columns.Text(primary_key=True)
+    sample = columns.Text(primary_key=True)
+    library_name = columns.Text(primary_key=True)
+    run_id = columns.Text(primary_key=True)
+
+    panel_name = columns.Text()
+    target_pool = columns.Text()
+    sequencer = columns.Text()
@@ -0,0 +1,141 @@
+import os
+import sys
+import time
+import pickle
+
+from multiprocessing import Pool
+
+from cassandra import ReadTimeout
+from cassandra import ReadFailure
+from cassandra import Unavailable
+from cassandra import OperationTimedOut
+from cassandra.query import SimpleStatement
+from cassandra.cluster import NoHostAvailable
+from cassandra.cqlengine import connection
+
+# Full table scans are split in to contiguous ranges of the Murmur3 token ring
+# and each range is read by a worker process with its own Cassandra session.
+# A worker passes the paged rows of its range to a mapper, and the mapper's
+# result for the range is handed back to the parent and folded in with a
+# reducer. Mappers must be module level functions and their results must be
+# picklable. A range that fails is retried from its start, so mappers with
+# side effects (such as updates) must be idempotent.
+
+MIN_TOKEN = -2 ** 63
+MAX_TOKEN = 2 ** 63 - 1
+
+RETRYABLE_ERRORS = (ReadTimeout, ReadFailure, Unavailable, OperationTimedOut, NoHostAvailable)
+
+_worker_context = None
+
+
+def get_token_ranges(num_ranges):
+    """Split the token ring in to num_ranges (start, end] ranges"""
+
+    step = (MAX_TOKEN - MIN_TOKEN) // num_ranges
+    bounds = [MIN_TOKEN + step * i for i in range(num_ranges)] + [MAX_TOKEN]
+
+    return zip(bounds[:-1], bounds[1:])
+
+
+def _init_worker(addresses, keyspace, auth_provider, context):
+    global _worker_context
+
+    connection.setup(addresses, keyspace, auth_provider=auth_provider)
+    _worker_context = context
+
+
+def _scan_range(task):
+    index, token_range, cql, mapper, retries, fetch_size = task
+
+    session = connection.get_session()
+    statement = SimpleStatement(cql, fetch_size=fetch_size)
+    attempt = 0
+    while True:
+        try:
+            return index, mapper(session.execute(statement, token_range), _worker_context)
+        except RETRYABLE_ERRORS:
+            if attempt >= retries:
+                raise
+            time.sleep(2 ** attempt)
+            attempt += 1
+
+
+def _load_checkpoint(checkpoint_file, table, num_ranges):
+    """Return a dict of range index -> mapper result for the ranges already
+    completed in a checkpoint file"""
+
+    completed = dict()
+    if not checkpoint_file or not os.path.exists(checkpoint_file):
+        return completed
+
+    with open(checkpoint_file, 'rb') as checkpoint:
+        header = pickle.load(checkpoint)
+        if header != (table, num_ranges):
+            raise ValueError("Checkpoint {} is for {} in {} ranges, not {} in {} ranges"
+                             "".format(checkpoint_file, header[0], header[1], table, num_ranges))
+        valid_size = checkpoint.tell()
+        while True:
+            try:
+                index, result = pickle.load(checkpoint)
+            except (EOFError, pickle.UnpicklingError, ValueError):
+                break
+            completed[index] = result
+            valid_size = checkpoint.tell()
+
+    # Drop a partially written record left by an interrupted scan
+    if valid_size < os.path.getsize(checkpoint_file):
+        with open(checkpoint_file, 'r+b') as checkpoint:
+            checkpoint.truncate(valid_size)
+
+    return completed
+
+
+def scan(model, columns, mapper, reducer, initial, addresses, keyspace, auth_provider=None, context=None,
+         processes=4, num_ranges=256, retries=3, fetch_size=5000, checkpoint_file=None):
+    """Scan every row of a table in parallel token ranges.
+
+    mapper(rows, context) is called in a worker process once per range with
+    the range's rows (dicts of the requested columns) and returns a partial
+    result. reducer(accumulated, partial) runs in the calling process, in
+    range completion order, starting from initial. The reduced value is
+    returned. With a checkpoint_file, each range's partial result is saved as
+    it completes and an interrupted scan resumes from the ranges left over."""
+
+    table = model.column_family_name()
+    partition_keys = ", ".join([column.db_field_name for column in model._partition_keys.values()])
+    cql = "SELECT {} FROM {} WHERE token({}) > %s AND token({}) <= %s".format(", ".join(columns), table,
+                                                                             partition_keys, partition_keys)
+
+    accumulated = initial
+    completed = _load_checkpoint(checkpoint_file, table, num_ranges)
+    for index in sorted(completed):
+        accumulated = reducer(accumulated, completed[index])
+    if completed:
+        sys.stderr.write("Resuming scan of {} with {} of {} ranges completed\n".format(table, len(completed),
+                                                                                      num_ranges))
+
+    tasks = [(index, token_range, cql, mapper, retries, fetch_size)
+             for index, token_range in enumerate(get_token_ranges(num_ranges)) if index not in completed]
+
+    checkpoint = None
+    if checkpoint_file:
+        new_checkpoint = not os.path.exists(checkpoint_file)
+        checkpoint = open(checkpoint_file, 'ab')
+        if new_checkpoint:
+            pickle.dump((table, num_ranges), checkpoint, pickle.HIGHEST_PROTOCOL)
+
+    pool = Pool(processes, _init_worker, (addresses, keyspace, auth_provider, context))
+    try:
+        for index, result in pool.imap_unordered(_scan_range, tasks):
+            if checkpoint:
+                pickle.dump((index, result), checkpoint, pickle.HIGHEST_PROTOCOL)
+                checkpoint.flush()
+            accumulated = reducer(accumulated, result)
+    finally:
+        pool.terminate()
+        pool.join()
+        if checkpoint:
+            checkpoint.close()
+
+    return accumulated
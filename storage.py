@@ -0,0 +1,409 @@
+import json
+import sqlite3
+
+from datetime import datetime
+from collections import defaultdict
+
+import routing
+import catalog
+import artifacts
+import annotations
+import variant_keys
+import vaf_distributions
+import occurrence_matrix
+from samplestore import Sample
+from variantstore import Variant
+from variantstore import SampleVariant
+from variantstore import TargetVariant
+from variantstore import VariantAnnotation
+from variantstore import AnnotationRelease
+from variantstore import RecurrentArtifact
+from variantstore import VariantVafDistribution
+from variantstore import RunVariant
+from coveragestore import SampleCoverage
+from coveragestore import AmpliconCoverage
+from cassandra.cqlengine import columns
+from cassandra.cqlengine import connection
+
+# Ingest and report code reads and writes the stores through one of these
+# backends. CassandraStorage goes through the cqlengine models as before;
+# SQLiteStorage keeps the same tables in a local file so the pipeline can be
+# run, tested and benchmarked without a cluster. Both return rows that
+# support attribute and item access, like model instances.
+
+
+class CassandraStorage(object):
+    def __init__(self, addresses=None, keyspace="variantstore", auth_provider=None):
+        if addresses:
+            connection.setup(addresses, keyspace, auth_provider=auth_provider)
+
+    def register_library(self, library, pipeline_id=None):
+        catalog.register_library(library, pipeline_id)
+
+    def create_variant(self, **kwargs):
+        return routing.create_variant(**kwargs)
+
+    def create_sample_variant(self, **kwargs):
+        return SampleVariant.create(**kwargs)
+
+    def create_target_variant(self, **kwargs):
+        return TargetVariant.create(**kwargs)
+
+    def store_annotation(self, reference_genome, chr, pos, ref, alt, annotation_version, **annotation):
+        annotations.store_annotation(reference_genome, chr, pos, ref, alt, annotation_version, **annotation)
+
+    def create_sample_coverage(self, **kwargs):
+        return SampleCoverage.create(**kwargs)
+
+    def create_amplicon_coverage(self, **kwargs):
+        return AmpliconCoverage.create(**kwargs)
+
+    def get_sample_variants(self, reference_genome, sample, run_id, library_name, max_maf=None):
+        """A library's variants with annotations joined, in clustering order"""
+
+        variants = SampleVariant.objects.timeout(None).filter(
+            SampleVariant.reference_genome == reference_genome,
+            SampleVariant.sample == sample,
+            SampleVariant.run_id == run_id,
+            SampleVariant.library_name == library_name
+        )
+        if max_maf is not None:
+            variants = variants.filter(SampleVariant.max_maf_all <= max_maf).allow_filtering()
+
+        return annotations.join_annotations(
+            variants.order_by('library_name', 'chr', 'pos', 'ref', 'alt', 'date_annotated').limit(None))
+
+    def get_variant_matches(self, reference_genome, chr, pos, ref, alt):
+        return list(routing.get_variant_matches(reference_genome, chr, pos, ref, alt))
+
+    def get_run_matches(self, reference_genome, run_id, chr, pos, ref, alt):
+        return list(routing.get_run_matches(reference_genome, run_id, chr, pos, ref, alt))
+
+    def get_sample_coverage(self, sample, amplicon, run_id, library_name, program_name):
+        coverage = SampleCoverage.objects.timeout(None).filter(
+            SampleCoverage.sample == sample,
+            SampleCoverage.amplicon == amplicon,
+            SampleCoverage.run_id == run_id,
+            SampleCoverage.library_name == library_name,
+            SampleCoverage.program_name == program_name
+        )
+
+        return list(coverage.limit(None))
+
+    def get_amplicon_coverage(self, amplicon):
+        coverage = AmpliconCoverage.objects.timeout(None).filter(AmpliconCoverage.amplicon == amplicon)
+
+        return list(coverage.order_by('sample', 'run_id').limit(None))
+
+    def get_artifacts(self, reference_genome, panel_name):
+        return artifacts.get_artifacts(reference_genome, panel_name)
+
+    def get_vaf_distribution(self, reference_genome, chr, pos, ref, alt):
+        return vaf_distributions.get_distribution(reference_genome, chr, pos, ref, alt)
+
+    def refresh_vaf_distributions(self, reference_genome, libraries):
+        return vaf_distributions.refresh_library_distributions(reference_genome, libraries)
+
+    def flush(self):
+        pass
+
+
+class StoredRow(dict):
+    """A row read from SQLiteStorage, readable (and, like a model instance,
+    annotatable) by attribute"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+def _sqlite_type(column):
+    if isinstance(column, (columns.Integer, columns.BigInt, columns.Boolean)):
+        return "INTEGER"
+    if isinstance(column, (columns.Float, columns.Double)):
+        return "REAL"
+    if isinstance(column, columns.Blob):
+        return "BLOB"
+
+    return "TEXT"
+
+
+def _scalar(column, value):
+    if value is None:
+        return None
+    if isinstance(column, columns.Boolean):
+        return bool(value)
+    if isinstance(column, (columns.Integer, columns.BigInt)):
+        return int(value)
+    if isinstance(column, (columns.Float, columns.Double)):
+        return float(value)
+    if isinstance(value, str):
+        return value.decode('utf-8')
+
+    return unicode(value)
+
+
+def _encode(column, value):
+    """Convert a value to its SQLite form, coercing it to the column's type
+    as Cassandra would. Collections are stored as JSON."""
+
+    if value is None:
+        return None
+    if isinstance(column, columns.Map):
+        return json.dumps(dict((unicode(key), _scalar(column.value_col, value[key])) for key in value))
+    if isinstance(column, (columns.List, columns.Set)):
+        return json.dumps([_scalar(column.value_col, item) for item in value])
+    if isinstance(column, columns.Blob):
+        return buffer(value)
+    if isinstance(column, columns.DateTime):
+        return value.isoformat()
+    if isinstance(column, columns.Boolean):
+        return int(bool(value))
+
+    return _scalar(column, value)
+
+
+def _decode(column, value):
+    if isinstance(column, columns.Map):
+        if value is None:
+            return dict()
+        data = json.loads(value)
+        if isinstance(column.key_col, (columns.Integer, columns.BigInt)):
+            return dict((int(key), data[key]) for key in data)
+        return data
+    if isinstance(column, (columns.List, columns.Set)):
+        if value is None:
+            return list()
+        return json.loads(value)
+    if value is None:
+        return None
+    if isinstance(column, columns.Blob):
+        return str(value)
+    if isinstance(column, columns.DateTime):
+        if "." in value:
+            return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f")
+        return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S")
+    if isinstance(column, columns.Boolean):
+        return bool(value)
+
+    return value
+
+
+def _quote(names):
+    return ", ".join(['"{}"'.format(name) for name in names])
+
+
+class SQLiteStorage(object):
+    """File-backed store with one SQLite table per model, using the model's
+    columns and primary key. Writes are upserts, as in Cassandra, and are
+    committed by flush()."""
+
+    MODELS = (Sample, Variant, SampleVariant, TargetVariant, VariantAnnotation, SampleCoverage, AmpliconCoverage,
+              RecurrentArtifact, VariantVafDistribution, RunVariant, AnnotationRelease)
+
+    def __init__(self, filename):
+        self.db = sqlite3.connect(filename)
+        self.release_dates = None
+        for model in self.MODELS:
+            column_defs = ['"{}" {}'.format(name, _sqlite_type(column)) for name, column in model._columns.items()]
+            self.db.execute("CREATE TABLE IF NOT EXISTS {} ({}, PRIMARY KEY ({}))".format(
+                self._table(model), ", ".join(column_defs), _quote(model._primary_keys.keys())))
+
+    def _table(self, model):
+        return model.column_family_name(include_keyspace=False)
+
+    def _insert(self, model, values):
+        names = [name for name in values if name in model._columns]
+        self.db.execute("INSERT OR REPLACE INTO {} ({}) VALUES ({})".format(
+            self._table(model), _quote(names), ", ".join(["?"] * len(names))),
+            [_encode(model._columns[name], values[name]) for name in names])
+
+        return StoredRow(values)
+
+    def _select(self, model, where, parameters, order_by=None):
+        names = model._columns.keys()
+        sql = "SELECT {} FROM {} WHERE {}".format(_quote(names), self._table(model), where)
+        if order_by:
+            sql += " ORDER BY {}".format(_quote(order_by))
+
+        rows = list()
+        for values in self.db.execute(sql, parameters):
+            rows.append(StoredRow((name, _decode(model._columns[name], value)) for name, value in zip(names, values)))
+
+        return rows
+
+    def register_library(self, library, pipeline_id=None):
+        self._insert(Sample, {'sample': library['sample_name'],
+                              'library_name': library['library_name'],
+                              'run_id': library['run_id'],
+                              'extraction': library['extraction'],
+                              'panel_name': library['panel'],
+                              'report': library['report'],
+                              'target_pool': library['target_pool'],
+                              'sequencer': library['sequencer'],
+                              'date_added': datetime.now(),
+                              'pipeline_id': pipeline_id,
+                              'config': dict((key, unicode(value)) for key, value in library.items())})
+
+    def create_variant(self, **kwargs):
+        self._insert(RunVariant, routing.get_run_variant_values(kwargs))
+
+        return self._insert(Variant, kwargs)
+
+    def create_sample_variant(self, **kwargs):
+        return self._insert(SampleVariant, kwargs)
+
+    def create_target_variant(self, **kwargs):
+        return self._insert(TargetVariant, kwargs)
+
+    def store_annotation(self, reference_genome, chr, pos, ref, alt, annotation_version, **annotation):
+        if annotation_version != annotations.DEFAULT_ANNOTATION_VERSION and \
+                annotation_version not in self._get_release_dates():
+            self._insert(AnnotationRelease, {'annotation_version': annotation_version,
+                                             'date_registered': datetime.now()})
+            self.release_dates = None
+
+        annotation.update({'reference_genome': reference_genome, 'chr': chr, 'pos': pos, 'ref': ref, 'alt': alt,
+                           'annotation_version': annotation_version, 'date_annotated': datetime.now()})
+        self._insert(VariantAnnotation, annotation)
+
+    def create_sample_coverage(self, **kwargs):
+        return self._insert(SampleCoverage, kwargs)
+
+    def create_amplicon_coverage(self, **kwargs):
+        return self._insert(AmpliconCoverage, kwargs)
+
+    def _get_release_dates(self):
+        if self.release_dates is None:
+            self.release_dates = dict((release.annotation_version, release.date_registered)
+                                      for release in self._select(AnnotationRelease, "1 = 1", ()))
+
+        return self.release_dates
+
+    def _join_annotations(self, variants):
+        release_dates = self._get_release_dates()
+        for variant in variants:
+            if variant.clinvar_data:
+                continue
+            found = self._select(VariantAnnotation, "reference_genome = ? AND chr = ? AND pos = ? AND ref = ? AND "
+                                                    "alt = ?",
+                                 (variant.reference_genome, variant.chr, variant.pos, variant.ref, variant.alt))
+            annotation = annotations.newest_annotation(found, release_dates)
+            if annotation is None:
+                annotation = annotations.get_empty_annotation()
+            for column in annotations.ANNOTATION_COLUMNS:
+                variant[column] = annotation[column]
+
+        return variants
+
+    def get_sample_variants(self, reference_genome, sample, run_id, library_name, max_maf=None):
+        where = "reference_genome = ? AND sample = ? AND run_id = ? AND library_name = ?"
+        parameters = [reference_genome, sample, run_id, library_name]
+        if max_maf is not None:
+            where += " AND max_maf_all <= ?"
+            parameters.append(max_maf)
+
+        return self._join_annotations(self._select(SampleVariant, where, parameters,
+                                                   ('library_name', 'chr', 'pos', 'ref', 'alt', 'date_annotated')))
+
+    def get_variant_matches(self, reference_genome, chr, pos, ref, alt):
+        return self._select(Variant, "reference_genome = ? AND chr = ? AND pos = ? AND ref = ? AND alt = ?",
+                            (reference_genome, chr, int(pos), ref, alt), ('sample', 'library_name', 'run_id'))
+
+    def get_run_matches(self, reference_genome, run_id, chr, pos, ref, alt):
+        return self._select(RunVariant, "run_id = ? AND reference_genome = ? AND chr = ? AND pos = ? AND ref = ? AND "
+                                        "alt = ?", (run_id, reference_genome, chr, int(pos), ref, alt),
+                            ('library_name',))
+
+    def get_sample_coverage(self, sample, amplicon, run_id, library_name, program_name):
+        return self._select(SampleCoverage, "sample = ? AND amplicon = ? AND run_id = ? AND library_name = ? AND "
+                                            "program_name = ?", (sample, amplicon, run_id, library_name, program_name))
+
+    def get_amplicon_coverage(self, amplicon):
+        return self._select(AmpliconCoverage, "amplicon = ?", (amplicon,), ('sample', 'run_id'))
+
+    def get_artifacts(self, reference_genome, panel_name):
+        rows = self._select(RecurrentArtifact, "reference_genome = ? AND panel_name = ?",
+                            (reference_genome, panel_name))
+
+        return frozenset([variant_keys.variant_key(row.chr, row.pos, row.ref, row.alt) for row in rows])
+
+    def update_artifacts(self, reference_genome, settings=None):
+        """Recompute the artifacts of every panel from the libraries in the
+        database, as artifacts.update_artifacts does from an occurrence
+        matrix. Returns the number of artifacts stored."""
+
+        run_variants = defaultdict(dict)
+        for chr, pos, ref, alt, sample, library_name, run_id, vaf in self.db.execute(
+                'SELECT chr, pos, ref, alt, sample, library_name, run_id, max_som_aaf FROM {} WHERE '
+                'reference_genome = ?'.format(self._table(SampleVariant)), (reference_genome,)):
+            run_variants[run_id].setdefault((sample, library_name, run_id), dict())[(chr, pos, ref, alt)] = vaf or 0.0
+
+        occurrences = occurrence_matrix.OccurrenceMatrix.empty()
+        for run_id in sorted(run_variants):
+            occurrences.add_run(run_id, run_variants[run_id])
+
+        panel_libraries = defaultdict(list)
+        for library in self._select(Sample, "1 = 1", ()):
+            key = (library.sample, library.library_name, library.run_id)
+            if key in occurrences.library_index:
+                panel_libraries[library.panel_name].append(key)
+
+        self.db.execute("DELETE FROM {} WHERE reference_genome = ?".format(self._table(RecurrentArtifact)),
+                        (reference_genome,))
+        stored = 0
+        for panel_name in sorted(panel_libraries):
+            panel_artifacts = artifacts.find_panel_artifacts(occurrences, panel_libraries[panel_name], panel_name,
+                                                             settings or dict())
+            for (chr, pos, ref, alt), artifact in panel_artifacts.items():
+                artifact.update({'reference_genome': reference_genome, 'panel_name': panel_name, 'chr': chr,
+                                 'pos': pos, 'ref': ref, 'alt': alt, 'date_updated': datetime.now()})
+                self._insert(RecurrentArtifact, artifact)
+            stored += len(panel_artifacts)
+        self.flush()
+
+        return stored
+
+    def get_vaf_distribution(self, reference_genome, chr, pos, ref, alt):
+        for row in self._select(VariantVafDistribution, "reference_genome = ? AND chr = ? AND pos = ? AND ref = ? AND "
+                                                        "alt = ?", (reference_genome, chr, int(pos), ref, alt)):
+            row['vafs'] = vaf_distributions.unpack_vafs(row.vafs_packed)
+            return row
+
+        return None
+
+    def refresh_vaf_distributions(self, reference_genome, libraries):
+        keys = set()
+        for sample, run_id, library_name in libraries:
+            keys.update(self.db.execute('SELECT DISTINCT chr, pos, ref, alt FROM {} WHERE reference_genome = ? AND '
+                                        'sample = ? AND run_id = ? AND library_name = ?'
+                                        ''.format(self._table(SampleVariant)),
+                                        (reference_genome, sample, run_id, library_name)))
+
+        for chr, pos, ref, alt in keys:
+            calls = [(match.max_som_aaf, match.callers)
+                     for match in self.get_variant_matches(reference_genome, chr, pos, ref, alt)]
+            values = vaf_distributions.summarize_calls(calls)
+            values.update({'reference_genome': reference_genome, 'chr': chr, 'pos': pos, 'ref': ref, 'alt': alt,
+                           'date_updated': datetime.now()})
+            self._insert(VariantVafDistribution, values)
+        self.flush()
+
+        return len(keys)
+
+    def flush(self):
+        self.db.commit()
+
+
+def get_storage(local_db=None, addresses=None, keyspace="variantstore", auth_provider=None):
+    """SQLiteStorage on local_db when given, otherwise CassandraStorage"""
+
+    if local_db:
+        return SQLiteStorage(local_db)
+
+    return CassandraStorage(addresses, keyspace, auth_provider)
@@ -0,0 +1,249 @@
+import os
+import random
+
+import utils
+
+# Synthetic inputs shaped like the pipeline's output for a run: per library
+# caller VCFs, a vcfanno/snpEff annotated VCF and a sambamba coverage BED,
+# plus the report panel BED they target. Variants are drawn partly from a
+# shared pool, so a fraction recur across samples as in real cohorts.
+
+CALLERS = ("mutect", "vardict", "freebayes", "scalpel", "platypus", "pindel")
+
+ANN_FIELDS = ("Allele", "Annotation", "Annotation_Impact", "Gene_Name", "Gene_ID", "Feature_Type", "Feature_ID",
+              "Transcript_BioType", "Rank", "HGVS.c", "HGVS.p", "cDNA.pos / cDNA.length", "CDS.pos / CDS.length",
+              "AA.pos / AA.length", "Distance", "ERRORS / WARNINGS / INFO")
+
+IMPACTS = (("missense_variant", "MODERATE"), ("synonymous_variant", "LOW"), ("stop_gained", "HIGH"),
+           ("frameshift_variant", "HIGH"), ("intron_variant", "MODIFIER"))
+
+CLINVAR_SIGNIFICANCE = ("pathogenic", "likely-pathogenic", "uncertain", "benign")
+
+AMPLICON_LENGTH = 150
+THRESHOLDS = (50, 100, 200, 500)
+
+
+class SyntheticVariant(object):
+    def __init__(self, chr, pos, ref, alt, amplicon, gene, annotation):
+        self.chr = chr
+        self.pos = pos
+        self.ref = ref
+        self.alt = alt
+        self.amplicon = amplicon
+        self.gene = gene
+        self.annotation = annotation
+
+
+def generate_amplicons(num_amplicons, rng):
+    """(chr, start, end, name) amplicons spread over the autosomes, 0-based
+    and half open as in the panel BED files"""
+
+    amplicons = list()
+    for index in range(num_amplicons):
+        chr = str(index % 22 + 1)
+        start = 1000000 + (index // 22) * 10000 + rng.randint(0, 5000)
+        amplicons.append((chr, start, start + AMPLICON_LENGTH, "AMP{:05d}_GENE{}".format(index, index // 10)))
+
+    return amplicons
+
+
+def generate_variant(amplicons, rng, off_target_fraction=0.05):
+    chr, start, end, name = rng.choice(amplicons)
+    pos = rng.randint(start, end - 1) + 1
+    ref = rng.choice("ACGT")
+    if rng.random() < 0.9:
+        alt = rng.choice([base for base in "ACGT" if base != ref])
+    elif rng.random() < 0.5:
+        alt = ref + "".join(rng.choice("ACGT") for i in range(rng.randint(1, 6)))
+    else:
+        ref, alt = ref + "".join(rng.choice("ACGT") for i in range(rng.randint(1, 6))), ref
+
+    annotation = {'max_aaf_all': rng.choice((0.0, 0.0001, 0.001, 0.003, 0.05, 0.2))}
+    if rng.random() < 0.1:
+        annotation['clinvar_significance'] = rng.choice(CLINVAR_SIGNIFICANCE)
+        annotation['clinvar_accession'] = "RCV{:09d}".format(rng.randint(1, 10 ** 6))
+    if rng.random() < 0.15:
+        annotation['cosmic_ids'] = "COSM{}".format(rng.randint(1, 10 ** 7))
+        annotation['cosmic_numsamples'] = rng.randint(1, 500)
+    for key in utils.POPULATION_FREQ_KEYS:
+        if rng.random() < 0.3:
+            annotation["aaf_{}".format(key)] = round(rng.random() * annotation['max_aaf_all'], 6)
+    annotation['effect'] = rng.choice(IMPACTS)
+
+    amplicon = name if rng.random() >= off_target_fraction else None
+
+    return SyntheticVariant(chr, pos, ref, alt, amplicon, name.split("_")[1], annotation)
+
+
+def generate_libraries(num_samples, run_size=16, panel="synthetic_panel", report="synthetic_report.bed"):
+    """Library configurations, as configure_samples returns them, grouped in
+    to runs of run_size libraries"""
+
+    libraries = dict()
+    for index in range(num_samples):
+        run_id = "SYNTH_RUN{:04d}".format(index // run_size)
+        library_name = "SYNTH{:05d}_L1".format(index)
+        libraries[library_name] = {'sample_name': "SYNTH{:05d}".format(index),
+                                   'library_name': library_name,
+                                   'run_id': run_id,
+                                   'extraction': "DNA",
+                                   'panel': panel,
+                                   'report': report,
+                                   'target_pool': "pool1",
+                                   'sequencer': "MiSeq",
+                                   'num_libraries_in_run': min(run_size, num_samples - (index // run_size) * run_size)}
+
+    return libraries
+
+
+def merge_libraries(libraries):
+    """Group library configurations by sample, as
+    merge_library_configs_samples does for the report scripts"""
+
+    samples = dict()
+    for library in libraries.values():
+        samples.setdefault(library['sample_name'], dict())[library['library_name']] = library
+
+    return samples
+
+
+def _vcf_header(info_lines):
+    lines = ["##fileformat=VCFv4.1"]
+    lines += ["##contig=<ID={},length=250000000>".format(chr) for chr in range(1, 23)]
+    lines += info_lines
+
+    return lines
+
+
+def write_caller_vcf(filename, sample_name, called, rng):
+    """Single sample caller VCF with the depth and allele frequency fields
+    the callers' record parsers read"""
+
+    lines = _vcf_header(['##INFO=<ID=DP,Number=1,Type=Integer,Description="Total depth">',
+                         '##INFO=<ID=TC,Number=1,Type=Integer,Description="Total coverage">',
+                         '##INFO=<ID=TR,Number=1,Type=Integer,Description="Total reads containing this variant">',
+                         '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">',
+                         '##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allelic depths">',
+                         '##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Read depth">',
+                         '##FORMAT=<ID=AF,Number=A,Type=Float,Description="Allele fraction">',
+                         '##FORMAT=<ID=FA,Number=A,Type=Float,Description="Allele fraction">',
+                         '##FORMAT=<ID=NR,Number=A,Type=Integer,Description="Number of reads covering">',
+                         '##FORMAT=<ID=NV,Number=A,Type=Integer,Description="Number of reads with variant">'])
+    lines.append("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t{}".format(sample_name))
+
+    for variant, vaf, depth in called:
+        alt_depth = max(1, int(round(depth * vaf * rng.uniform(0.9, 1.1))))
+        af = round(float(alt_depth) / depth, 4)
+        lines.append("{}\t{}\t.\t{}\t{}\t60\tPASS\tDP={};TC={};TR={}\tGT:AD:DP:AF:FA:NR:NV\t0/1:{},{}:{}:{}:{}:{}:{}"
+                     "".format(variant.chr, variant.pos, variant.ref, variant.alt, depth, depth, alt_depth,
+                               depth - alt_depth, alt_depth, depth, af, af, depth, alt_depth))
+
+    with open(filename, "w") as vcf:
+        vcf.write("\n".join(lines) + "\n")
+
+
+def write_annotated_vcf(filename, sample_name, called_by):
+    info_ids = [("CALLERS", "String"), ("ANN", "String"), ("max_aaf_all", "Float"), ("max_aaf_no_fin", "Float"),
+                ("amplicon_target", "String"), ("panel_target", "String"), ("type", "String"),
+                ("sub_type", "String"), ("clinvar_significance", "String"), ("clinvar_accession", "String"),
+                ("cosmic_ids", "String"), ("cosmic_numsamples", "Integer")]
+    info_ids += [("aaf_{}".format(key), "Float") for key in utils.POPULATION_FREQ_KEYS]
+
+    info_lines = list()
+    for info_id, info_type in info_ids:
+        description = "Description"
+        if info_id == "ANN":
+            description = "Functional annotations: '{}'".format(" | ".join(ANN_FIELDS))
+        info_lines.append('##INFO=<ID={},Number=1,Type={},Description="{}">'.format(info_id, info_type, description))
+
+    lines = _vcf_header(info_lines)
+    lines.append("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t{}".format(sample_name))
+
+    for variant, callers in called_by:
+        consequence, impact = variant.annotation['effect']
+        ann = "|".join([variant.alt, consequence, impact, variant.gene, variant.gene, "transcript", "NM_000001.1",
+                        "protein_coding", "1/10", "c.1A>T", "p.Met1Leu", "1/1000", "1/900", "1/300", "", ""])
+        info = ["CALLERS={}".format(",".join(callers)), "ANN={}".format(ann),
+                "max_aaf_no_fin={}".format(variant.annotation['max_aaf_all']),
+                "type={}".format("snp" if len(variant.ref) == len(variant.alt) else "indel"),
+                "sub_type={}".format("ts" if len(variant.ref) == len(variant.alt) else "del")]
+        if variant.amplicon:
+            info += ["amplicon_target={}".format(variant.amplicon), "panel_target={}".format(variant.amplicon)]
+        for key in sorted(variant.annotation):
+            if key != 'effect':
+                info.append("{}={}".format(key, variant.annotation[key]))
+
+        lines.append("{}\t{}\t.\t{}\t{}\t60\tPASS\t{}\tGT\t0/1".format(variant.chr, variant.pos, variant.ref,
+                                                                       variant.alt, ";".join(info)))
+
+    with open(filename, "w") as vcf:
+        vcf.write("\n".join(lines) + "\n")
+
+
+def write_coverage_bed(filename, sample_name, amplicons, rng):
+    """sambamba region coverage output for a library's amplicons"""
+
+    header = ["# chrom", "chromStart", "chromEnd", "F4", "readCount", "meanCoverage"]
+    header += ["percentage{}".format(threshold) for threshold in THRESHOLDS] + ["sampleName"]
+
+    with open(filename, "w") as bed:
+        bed.write("\t".join(header) + "\n")
+        for chr, start, end, name in amplicons:
+            mean_coverage = rng.lognormvariate(7, 0.5)
+            percentages = [round(100.0 * min(1.0, mean_coverage / (threshold * 2)), 2) for threshold in THRESHOLDS]
+            fields = [chr, start, end, name, int(mean_coverage * AMPLICON_LENGTH / 100), round(mean_coverage, 2)]
+            bed.write("\t".join([str(field) for field in fields + percentages + [sample_name]]) + "\n")
+
+
+def write_panel(filename, amplicons):
+    if not os.path.isdir(os.path.dirname(filename)):
+        os.makedirs(os.path.dirname(filename))
+
+    with open(filename, "w") as bed:
+        for chr, start, end, name in amplicons:
+            bed.write("{}\t{}\t{}\t{}\n".format(chr, start, end, name))
+
+
+def generate_run_files(output_dir, panel_root, libraries, num_variants, num_amplicons, recurrence=0.3, seed=1):
+    """Write every library's input files to output_dir and the report panel
+    under panel_root. num_variants variants are generated per library, a
+    recurrence fraction of them from a pool shared by all libraries."""
+
+    rng = random.Random(seed)
+    amplicons = generate_amplicons(num_amplicons, rng)
+
+    library = libraries.values()[0]
+    write_panel(os.path.join(panel_root, library['panel'], library['report']), amplicons)
+
+    shared_pool = [generate_variant(amplicons, rng) for i in range(max(1, num_variants))]
+
+    for library_name in sorted(libraries):
+        sample_name = libraries[library_name]['sample_name']
+        variants = dict()
+        while len(variants) < num_variants:
+            if rng.random() < recurrence:
+                variant = rng.choice(shared_pool)
+            else:
+                variant = generate_variant(amplicons, rng)
+            variants[(variant.chr, variant.pos, variant.ref, variant.alt)] = variant
+
+        calls = dict((caller, list()) for caller in CALLERS)
+        called_by = list()
+        for key in sorted(variants, key=lambda key: (int(key[0]), key[1], key[2], key[3])):
+            variant = variants[key]
+            vaf = rng.betavariate(2, 8)
+            depth = rng.randint(100, 3000)
+            callers = rng.sample(CALLERS, rng.randint(1, len(CALLERS)))
+            for caller in callers:
+                calls[caller].append((variant, vaf, depth))
+            called_by.append((variant, callers))
+
+        for caller in CALLERS:
+            write_caller_vcf(os.path.join(output_dir, "{}.{}.normalized.vcf".format(library_name, caller)),
+                             sample_name, calls[caller], rng)
+        write_annotated_vcf(os.path.join(output_dir, "{}.vcfanno.snpEff.GRCh37.75.vcf".format(library_name)),
+                            sample_name, called_by)
+        write_coverage_bed(os.path.join(output_dir, "{}.sambamba_coverage.bed".format(library_name)), sample_name,
+                           amplicons, rng)
+
+    return amplicons
@@ -0,0 +1,62 @@
+import json
+import time
+
+from contextlib import contextmanager
+from collections import OrderedDict
+
+
+class StageTimer(object):
+    """Wall clock time spent in the named stages of a job. Stages may be
+    entered many times (once per variant, say) and may nest; a stage's time
+    excludes the time of stages nested inside it, so the stage times add up
+    to the time spent in stages overall."""
+
+    def __init__(self, job_name, **labels):
+        self.job_name = job_name
+        self.labels = labels
+        self.started = time.time()
+        self.stages = OrderedDict()
+        self._nested = list()
+
+    def start(self, name):
+        self._nested.append((name, time.time(), [0.0]))
+
+    def stop(self):
+        name, start, nested = self._nested.pop()
+        elapsed = time.time() - start
+        self.add(name, elapsed - nested[0])
+        if self._nested:
+            self._nested[-1][2][0] += elapsed
+
+    @contextmanager
+    def stage(self, name):
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop()
+
+    def add(self, name, seconds, calls=1):
+        if name not in self.stages:
+            self.stages[name] = [0.0, 0]
+        self.stages[name][0] += seconds
+        self.stages[name][1] += calls
+
+    def summary(self):
+        total = time.time() - self.started
+        staged = sum([seconds for seconds, calls in self.stages.values()])
+
+        return {'job': self.job_name,
+                'labels': self.labels,
+                'total_seconds': round(total, 4),
+                'unstaged_seconds': round(total - staged, 4),
+                'stages': OrderedDict((name, {'seconds': round(seconds, 4), 'calls': calls})
+                                      for name, (seconds, calls) in self.stages.items())}
+
+    def to_json(self):
+        return json.dumps(self.summary())
+
+    def write(self, filename):
+        with open(filename, "w") as summary:
+            json.dump(self.summary(), summary, indent=2)
+            summary.write("\n")
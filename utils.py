@@ -1,13 +1,18 @@
 import sys
 import csv
+import struct
 import numpy as np
 import geneimpacts
 
 from collections import defaultdict
 
-from variantstore import Variant
+import cohort
+import scanner
+import annotations
+import variant_keys
 from variantstore import SampleVariant
 from coveragestore import SampleCoverage
+from coveragestore import AmpliconCoverage
 from cassandra.cqlengine import connection
 
 
@@ -76,7 +81,7 @@ def get_transcript_effects(effects):
     return transcript_effects
 
 
-def get_clinvar_info(variant, samples, sample):
+def get_clinvar_info(variant, samples=None, sample=None):
     clinvar_data = dict()
 
     clinvar_data['significance'] = variant.INFO.get('clinvar_significance') or 'None'
@@ -91,6 +96,8 @@ def get_clinvar_info(variant, samples, sample):
         clinvar_data['origin'] = variant.INFO.get('clinvar_origin') or 'None'
     except IndexError:
         clinvar_data['origin'] = 'None'
+        if samples is None:
+            return clinvar_data
         with open("{}.sample_variant_add.log".format(samples[sample]['library_name']), "a") as err:
             err.write("Problem with ClinVar origin data for variant, setting to None:\n")
             err.write("Sample: {}\t Library: {}\n".format(samples[sample]['sample_name'],
@@ -112,31 +119,54 @@ def get_cosmic_info(variant):
     return cosmic_data
 
 
+# Fixed field order of the packed population frequency column
+POPULATION_FREQ_KEYS = ('esp_ea', 'esp_aa', 'esp_all', '1kg_amr', '1kg_eas', '1kg_sas', '1kg_afr', '1kg_eur', '1kg_all',
+                        'exac_all', 'adj_exac_all', 'adj_exac_afr', 'adj_exac_amr', 'adj_exac_eas', 'adj_exac_fin',
+                        'adj_exac_nfe', 'adj_exac_oth', 'adj_exac_sas')
+
+# Little-endian float32, the same precision as the Cassandra float map values
+POPULATION_FREQ_STRUCT = struct.Struct("<{}f".format(len(POPULATION_FREQ_KEYS)))
+
+
 def get_population_freqs(variant):
-    freqs = {'esp_ea': variant.INFO.get('aaf_esp_ea') or -1,
-             'esp_aa': variant.INFO.get('aaf_esp_aa') or -1,
-             'esp_all': variant.INFO.get('aaf_esp_all') or -1,
-             '1kg_amr': variant.INFO.get('aaf_1kg_amr') or -1,
-             '1kg_eas': variant.INFO.get('aaf_1kg_eas') or -1,
-             '1kg_sas': variant.INFO.get('aaf_1kg_sas') or -1,
-             '1kg_afr': variant.INFO.get('aaf_1kg_afr') or -1,
-             '1kg_eur': variant.INFO.get('aaf_1kg_eur') or -1,
-             '1kg_all': variant.INFO.get('aaf_1kg_all') or -1,
-             'exac_all': variant.INFO.get('aaf_exac_all') or -1,
-             'adj_exac_all': variant.INFO.get('aaf_adj_exac_all') or -1,
-             'adj_exac_afr': variant.INFO.get('aaf_adj_exac_afr') or -1,
-             'adj_exac_amr': variant.INFO.get('aaf_adj_exac_amr') or -1,
-             'adj_exac_eas': variant.INFO.get('aaf_adj_exac_eas') or -1,
-             'adj_exac_fin': variant.INFO.get('aaf_adj_exac_fin') or -1,
-             'adj_exac_nfe': variant.INFO.get('aaf_adj_exac_nfe') or -1,
-             'adj_exac_oth': variant.INFO.get('aaf_adj_exac_oth') or -1,
-             'adj_exac_sas': variant.INFO.get('aaf_adj_exac_sas') or -1}
+    freqs = dict()
+    for key in POPULATION_FREQ_KEYS:
+        freqs[key] = variant.INFO.get("aaf_{}".format(key)) or -1
 
     return freqs
 
 
-def get_amplicon_data(variant):
-    data = {'amplicon': variant.INFO.get('amplicon_target') or "None",
+def pack_population_freqs(freqs):
+    """Pack a population frequency dict in to the fixed order binary form,
+    with -1 for any missing population"""
+
+    return POPULATION_FREQ_STRUCT.pack(*[float(freqs.get(key, -1)) for key in POPULATION_FREQ_KEYS])
+
+
+def unpack_population_freqs(data):
+    return dict(zip(POPULATION_FREQ_KEYS, POPULATION_FREQ_STRUCT.unpack(data)))
+
+
+def read_population_freqs(variant):
+    """Population frequencies of a stored variant, from the packed column or,
+    for rows not yet migrated, the legacy map"""
+
+    if variant['population_freqs_packed']:
+        return unpack_population_freqs(variant['population_freqs_packed'])
+
+    return dict(variant['population_freqs'] or dict())
+
+
+def get_amplicon_data(variant, panel_index=None):
+    """Amplicon annotations of a VCF record. Records without an
+    amplicon_target annotation are assigned amplicons by position when a
+    panels.PanelIndex is given."""
+
+    amplicon = variant.INFO.get('amplicon_target')
+    if not amplicon and panel_index is not None:
+        amplicon = panel_index.assign_amplicons(variant.CHROM, variant.start, variant.end)
+
+    data = {'amplicon': amplicon or "None",
             'panel_amplicon': variant.INFO.get('panel_target') or "None",
             'intersect': variant.INFO.get('amplicon_intersect') or "None"}
 
@@ -157,7 +187,8 @@ def get_variants(config, samples, sample, library, thresholds, report_names):
     with open(report_names['log'], 'a') as logfile:
         logfile.write("Retrieved {} total variants\n".format(num_var))
 
-    ordered = variants.order_by('library_name', 'chr', 'pos', 'ref', 'alt').limit(variants.count() + 1000)
+    ordered = annotations.join_annotations(
+        variants.order_by('library_name', 'chr', 'pos', 'ref', 'alt').limit(variants.count() + 1000))
 
     return ordered, num_var
 
@@ -181,6 +212,42 @@ def get_coverage_data(target_amplicons, samples, sample, library, target_amplico
     return reportable_amplicons, target_amplicon_coverage
 
 
+def collect_amplicon_coverage(rows, amplicons):
+    """Scanner mapper collecting the amplicon_coverage rows of one token range
+    for the given set of amplicons"""
+
+    coverage = defaultdict(list)
+    for row in rows:
+        if row['amplicon'] in amplicons:
+            coverage[row['amplicon']].append(dict(row))
+
+    return dict(coverage)
+
+
+def scan_amplicon_coverage(amplicons, addresses, auth_provider=None, processes=8, num_ranges=256):
+    """Coverage rows for a set of amplicons, read with a parallel scan of the
+    whole amplicon_coverage table instead of one query per amplicon. Returns
+    a dict of amplicon -> rows ordered by sample and run."""
+
+    def merge(coverage, result):
+        for amplicon in result:
+            coverage[amplicon].extend(result[amplicon])
+
+        return coverage
+
+    coverage = scanner.scan(AmpliconCoverage,
+                            ['amplicon', 'sample', 'run_id', 'library_name', 'program_name', 'mean_coverage',
+                             'num_reads'],
+                            collect_amplicon_coverage, merge, defaultdict(list), addresses, "coveragestore",
+                            auth_provider=auth_provider, context=set(amplicons), processes=processes,
+                            num_ranges=num_ranges)
+
+    for amplicon in coverage:
+        coverage[amplicon].sort(key=lambda row: (row['sample'], row['run_id']))
+
+    return coverage
+
+
 def setup_report_header(filename, callers):
     with open(filename, 'w') as report:
         report.write("Sample\tLibrary\tGene\tAmplicon\tRef\tAlt\tCodon\tAA\t"
@@ -209,9 +276,20 @@ def setup_report_header(filename, callers):
         report.write("\n")
 
 
+def format_variant_id(variant):
+    """Readable variant label for project summaries and logs"""
+
+    return "{}:{}-{}_{}_{}_{}_{}".format(variant.chr, variant.pos, variant.end, variant.ref, variant.alt,
+                                         variant.codon_change, variant.aa_change)
+
+
 def classify_and_filter_variants_proj(samples, sample, library, report_names, target_amplicons, callers,
                                       ordered_variants, config, thresholds, project_variant_data, variant_count_data,
-                                      gene_count_data, variants_list, address, auth_provider):
+                                      gene_count_data, variants_list, address, auth_provider, project_cohort=None):
+    """Classify a library's variants for a project report. Variants carried
+    by half or more of the project's samples are dropped; the carrier
+    fractions come from project_cohort, a cohort.Cohort that should be built
+    once per project with load_project() and shared by every library."""
 
     iterated = 0
     passing_variants = 0
@@ -224,10 +302,12 @@ def classify_and_filter_variants_proj(samples, sample, library, report_names, ta
     off_target_amplicon_counts = defaultdict(int)
 
     category = samples[sample][library]['category']
-    counted = list()
+    counted = set()
+    target_amplicons = set(target_amplicons)
 
     connection.setup([address], "variantstore", auth_provider=auth_provider)
-    sample_keys = samples.keys()
+    if project_cohort is None:
+        project_cohort = cohort.Cohort(samples, config['genome_version'])
 
     for variant in ordered_variants:
         if len(variant.callers) < 2:
@@ -236,8 +316,7 @@ def classify_and_filter_variants_proj(samples, sample, library, report_names, ta
             continue
 
         iterated += 1
-        variant_id = "{}:{}-{}_{}_{}_{}_{}".format(variant.chr, variant.pos, variant.end, variant.ref, variant.alt,
-                                                   variant.codon_change, variant.aa_change)
+        variant_id = variant_keys.variant_key(variant.chr, variant.pos, variant.ref, variant.alt)
         project_variant_data[variant_id]['variant'] = variant
 
         elements = variant.amplicon_data['amplicon'].split('_')
@@ -257,27 +336,10 @@ def classify_and_filter_variants_proj(samples, sample, library, report_names, ta
                 if variant.max_som_aaf > thresholds['min_saf']:
                     if variant.min_depth > thresholds['depth']:
                         if variant_id not in counted:
-                            match_variants = Variant.objects.timeout(None).filter(
-                                Variant.reference_genome == config['genome_version'],
-                                Variant.chr == variant.chr,
-                                Variant.pos == variant.pos,
-                                Variant.ref == variant.ref,
-                                Variant.alt == variant.alt
-                            ).allow_filtering()
-
-                            num_matches = match_variants.count()
-                            ordered_var = match_variants.order_by('ref', 'alt', 'sample', 'library_name',
-                                                                  'run_id').limit(num_matches + 1000)
-                            cohort_count = 0.0
-                            counted_samples = list()
-                            for var in ordered_var:
-                                if var.sample in sample_keys:
-                                    if var.sample not in counted_samples:
-                                        cohort_count += 1
-                                        counted_samples.append(var.sample)
-                            fraction = cohort_count / len(sample_keys)
+                            fraction = project_cohort.fraction(variant.chr, variant.pos, variant.ref, variant.alt,
+                                                               variant_id)
                             if fraction < 0.5:
-                                counted.append(variant_id)
+                                counted.add(variant_id)
                                 project_variant_data[variant_id][category] += 1
                                 variant_count_data[sample]['pass_count'] += 1
                                 gene_count_data[sample][gene] += 1
@@ -295,7 +357,8 @@ def classify_and_filter_variants_proj(samples, sample, library, report_names, ta
                                 elif variant.severity == 'LOW':
                                     variant_count_data[sample]['low'] += 1
                                 else:
-                                    sys.stderr.write("ERROR: Cannot classify variant {}\n".format(variant_id))
+                                    sys.stderr.write("ERROR: Cannot classify variant {}\n"
+                                                     "".format(format_variant_id(variant)))
 
                                 # Putting in to Tier1 based on COSMIC
                                 if variant.cosmic_ids:
@@ -326,7 +389,7 @@ def classify_and_filter_variants_proj(samples, sample, library, report_names, ta
                         else:
                             # sys.stderr.write("WARNING: Duplicate variant, skipping: {}\n".format(variant_id))
                             with open("{}_Duplicates.log".format(sample), 'a') as duplicates:
-                                duplicates.write("{}\n".format(variant_id))
+                                duplicates.write("{}\n".format(format_variant_id(variant)))
             else:
                 filtered_off_target.append(variant)
                 off_target_amplicon_counts[variant.amplicon_data['amplicon']] += 1
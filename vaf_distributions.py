@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+# Per-variant VAF distributions for the report's database columns. For every
+# variant the max_som_aaf of all of its calls is stored sorted, with its
+# median, standard deviation and per-caller call counts, so a report reads
+# one row instead of every call of the variant. Distributions are refreshed
+# for the variants of a run once the run's ingest has finished.
+
+import sys
+import struct
+import getpass
+import argparse
+
+import numpy as np
+
+from bisect import bisect_left
+from bisect import bisect_right
+from datetime import datetime
+from collections import defaultdict
+
+import catalog
+import routing
+from variantstore import SampleVariant
+from variantstore import BucketedVariant
+from variantstore import VariantVafDistribution
+from cassandra.cqlengine import connection
+from cassandra.auth import PlainTextAuthProvider
+from cassandra.concurrent import execute_concurrent_with_args
+
+
+def pack_vafs(vafs):
+    vafs = sorted(vafs)
+
+    return struct.pack("<{}f".format(len(vafs)), *vafs)
+
+
+def unpack_vafs(data):
+    if not data:
+        return list()
+
+    return list(struct.unpack("<{}f".format(len(data) // 4), data))
+
+
+def summarize_calls(calls):
+    """Distribution columns for a variant's calls, given as (max_som_aaf,
+    callers) pairs. The median and standard deviation are computed as the
+    report computed them from the raw calls."""
+
+    vafs = [vaf for vaf, callers in calls]
+    caller_counts = defaultdict(int)
+    for vaf, callers in calls:
+        for caller in callers or list():
+            caller_counts[caller] += 1
+
+    return {'vafs_packed': pack_vafs(vafs),
+            'num_calls': len(vafs),
+            'median': float(np.median(vafs)) if vafs else None,
+            'std_dev': float(np.std(vafs)) if vafs else None,
+            'caller_counts': dict(caller_counts)}
+
+
+def percentile_rank(sorted_vafs, score):
+    """Percentile rank of score in a sorted list, by binary search. The same
+    as scipy.stats.percentileofscore(vafs, score, kind="mean")."""
+
+    if not sorted_vafs:
+        return float('nan')
+
+    # Compare at the float32 precision the VAFs are stored at
+    score = struct.unpack("<f", struct.pack("<f", score))[0]
+    below = bisect_left(sorted_vafs, score)
+    at_or_below = bisect_right(sorted_vafs, score)
+
+    return (below + at_or_below) * 50.0 / len(sorted_vafs)
+
+
+def read_variant_calls(reference_genome, keys, concurrency=100):
+    """{(chr, pos, ref, alt): [(max_som_aaf, callers), ...]} for every call of
+    the given variants"""
+
+    session = connection.get_session()
+    statement = session.prepare("SELECT max_som_aaf, callers FROM {} WHERE reference_genome = ? AND chr = ? AND "
+                                "bin = ? AND pos = ? AND ref = ? AND alt = ?"
+                                "".format(BucketedVariant.column_family_name()))
+    keys = sorted(set(keys))
+    results = execute_concurrent_with_args(session, statement,
+                                           [(reference_genome, chr, routing.get_bin(pos), pos, ref, alt)
+                                            for chr, pos, ref, alt in keys],
+                                           concurrency=concurrency, raise_on_first_error=True)
+
+    calls = dict()
+    for key, (success, rows) in zip(keys, results):
+        calls[key] = [(row['max_som_aaf'], row['callers']) for row in rows]
+
+    return calls
+
+
+def refresh_distributions(reference_genome, keys, concurrency=100):
+    """Recompute and store the distributions of the given (chr, pos, ref,
+    alt) variants from their calls, removing those of variants with no calls
+    left. Returns the number refreshed."""
+
+    calls = read_variant_calls(reference_genome, keys, concurrency)
+    for (chr, pos, ref, alt), variant_calls in calls.items():
+        if not variant_calls:
+            VariantVafDistribution.objects.filter(reference_genome=reference_genome, chr=chr, pos=pos, ref=ref,
+                                                  alt=alt).delete()
+            continue
+        VariantVafDistribution.create(reference_genome=reference_genome, chr=chr, pos=pos, ref=ref, alt=alt,
+                                      date_updated=datetime.now(), **summarize_calls(variant_calls))
+
+    return len(calls)
+
+
+def get_library_variant_keys(reference_genome, libraries):
+    """Distinct (chr, pos, ref, alt) keys of the given (sample, run_id,
+    library_name) libraries"""
+
+    keys = set()
+    for sample, run_id, library_name in libraries:
+        variants = SampleVariant.objects.timeout(None).filter(
+            SampleVariant.reference_genome == reference_genome,
+            SampleVariant.sample == sample,
+            SampleVariant.run_id == run_id,
+            SampleVariant.library_name == library_name
+        ).only(['chr', 'pos', 'ref', 'alt']).limit(None)
+        keys.update([(variant.chr, variant.pos, variant.ref, variant.alt) for variant in variants])
+
+    return keys
+
+
+def refresh_library_distributions(reference_genome, libraries):
+    return refresh_distributions(reference_genome, get_library_variant_keys(reference_genome, libraries))
+
+
+def refresh_run_distributions(reference_genome, run_ids):
+    refreshed = 0
+    for run_id in run_ids:
+        libraries = [(library.sample, library.run_id, library.library_name)
+                     for library in catalog.get_run_libraries(run_id)]
+        refreshed += refresh_library_distributions(reference_genome, libraries)
+
+    return refreshed
+
+
+def get_distribution(reference_genome, chr, pos, ref, alt):
+    """A variant's distribution as a dict with the sorted VAFs under 'vafs',
+    or None when it has not been computed"""
+
+    rows = VariantVafDistribution.objects.timeout(None).filter(
+        VariantVafDistribution.reference_genome == reference_genome,
+        VariantVafDistribution.chr == chr,
+        VariantVafDistribution.pos == pos,
+        VariantVafDistribution.ref == ref,
+        VariantVafDistribution.alt == alt
+    )
+    for row in rows:
+        distribution = dict(row)
+        distribution['vafs'] = unpack_vafs(row.vafs_packed)
+        return distribution
+
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-r', '--runs', help="Comma separated run ids whose variants to refresh, defaults to all "
+                                             "runs in the catalog")
+    parser.add_argument('-g', '--genome', help="Reference genome version", default='GRCh37.75')
+    parser.add_argument('-a', '--address', help="IP Address for Cassandra connection", default='127.0.0.1')
+    parser.add_argument('-u', '--username', help='Cassandra username for login', default=None)
+    args = parser.parse_args()
+
+    if args.username:
+        password = getpass.getpass()
+        auth_provider = PlainTextAuthProvider(username=args.username, password=password)
+        connection.setup([args.address], "variantstore", auth_provider=auth_provider)
+    else:
+        connection.setup([args.address], "variantstore")
+
+    run_ids = args.runs.split(',') if args.runs else catalog.get_run_ids()
+    for run_id in run_ids:
+        refreshed = refresh_run_distributions(args.genome, [run_id])
+        sys.stdout.write("{}: refreshed {} VAF distributions\n".format(run_id, refreshed))
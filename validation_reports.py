@@ -9,6 +9,7 @@ from cassandra.cqlengine import connection
 from ddb import configuration
 
 import utils
+import annotations
 from variantstore import SampleVariant
 
 if __name__ == "__main__":
@@ -54,6 +55,7 @@ if __name__ == "__main__":
 
         ordered_variants = variants.order_by('library_name', 'chr', 'pos',
                                              'ref', 'alt').limit(variants.count() + 1000)
+        ordered_variants = annotations.join_annotations(ordered_variants)
 
         # variant_coords = samples[sample]['variant_coords'].split(',')
 
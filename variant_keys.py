@@ -0,0 +1,64 @@
+import struct
+import hashlib
+
+# Canonical variant identity. The long form of a variant is "chr:pos:ref:alt",
+# with any "chr" prefix dropped from the chromosome, and its key is the first
+# eight bytes of the long form's MD5 read as a signed 64-bit integer, so it
+# also fits a Cassandra bigint. Unlike hash(), keys are the same in every
+# process and on every platform. A VariantKeys registry remembers the long form
+# of each key it hands out and raises on a collision.
+
+KEY_STRUCT = struct.Struct("<q")
+
+
+def long_form(chr, pos, ref, alt):
+    chr = unicode(chr)
+    if chr.startswith(u"chr"):
+        chr = chr[3:]
+
+    return u"{}:{}:{}:{}".format(chr, int(pos), ref, alt)
+
+
+def hash_long_form(form):
+    return KEY_STRUCT.unpack_from(hashlib.md5(form.encode('utf-8')).digest())[0]
+
+
+def variant_key(chr, pos, ref, alt):
+    return hash_long_form(long_form(chr, pos, ref, alt))
+
+
+def parse_long_form(form):
+    chr, pos, ref, alt = form.split(u":", 3)
+
+    return chr, int(pos), ref, alt
+
+
+class VariantKeys(object):
+    """Registry of the variant keys handed out by key(), with their long
+    forms"""
+
+    def __init__(self):
+        self.long_forms = dict()
+
+    def __len__(self):
+        return len(self.long_forms)
+
+    def __contains__(self, key):
+        return key in self.long_forms
+
+    def key(self, chr, pos, ref, alt):
+        form = long_form(chr, pos, ref, alt)
+        key = hash_long_form(form)
+        registered = self.long_forms.setdefault(key, form)
+        if registered != form:
+            raise ValueError("Variant key {} of {} is already used by {}".format(key, form, registered))
+
+        return key
+
+    def long_form(self, key):
+        return self.long_forms[key]
+
+    def variant(self, key):
+        """(chr, pos, ref, alt) of a registered key, chr without a prefix"""
+
+        return parse_long_form(self.long_forms[key])
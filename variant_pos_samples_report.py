@@ -3,16 +3,23 @@
 import sys
 import csv
 import utils
+import routing
 import getpass
 import argparse
+import batch_lookup
 
-import numpy as np
-from collections import defaultdict
-from variantstore import Variant
 from cassandra.cqlengine import connection
 from cassandra.auth import PlainTextAuthProvider
 
 
+def write_variant(output, var):
+    output.write("{chr}\t{pos}\t{ref}\t{alt}\t{codon}\t{aa}\t{amplicon}\t{sample}\t{lib}\t{run}\t{vaf}\t{call}"
+                 "\n".format(chr=var.chr, pos=var.pos, ref=var.ref, alt=var.alt, codon=var.codon_change,
+                             aa=var.aa_change, amplicon=var.amplicon_data['amplicon'], sample=var.sample,
+                             lib=var.library_name, run=var.run_id, vaf=var.max_som_aaf,
+                             call=",".join(var.callers) or None))
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('-l', '--list', help="File containing list of variants\
@@ -23,6 +30,10 @@ if __name__ == "__main__":
                         connection", default='127.0.0.1')
     parser.add_argument('-u', '--username', help='Cassandra username for\
                         login', default=None)
+    parser.add_argument('-b', '--batch', help="Look up the whole list with\
+                        concurrent per-partition queries", action='store_true')
+    parser.add_argument('-t', '--threads', help="Number of concurrent queries\
+                        in batch mode", type=int, default=8)
     args = parser.parse_args()
     args.logLevel = "INFO"
 
@@ -36,29 +47,15 @@ if __name__ == "__main__":
         connection.setup([args.address], "variantstore")
 
     sys.stdout.write("Proccessng through selected variants")
-    with open(args.list, "r") as variants_list:
-        with open("variant_pos_samples_{}.txt".format(args.report), "w") as output:
-            output.write("Chr\tPos\tRef\tAlt\tCodon\tAA\tAmplicon\tSample\tLibrary\tRun\tVAF\tCallers\n")
-            reader = csv.reader(variants_list, dialect='excel-tab')
-            for row in reader:
-                match_variants = Variant.objects.timeout(None).filter(
-                    Variant.reference_genome == "GRCh37.75",
-                    Variant.chr == row[0],
-                    Variant.pos == row[1],
-                    Variant.ref == row[3],
-                    Variant.alt == row[4]
-                ).allow_filtering()
-
-                num_matches = match_variants.count()
-                ordered_var = match_variants.order_by('ref', 'alt', 'sample', 'library_name',
-                                                      'run_id').limit(num_matches + 1000)
-                vafs = list()
-                run_vafs = list()
-                num_times_callers = defaultdict(int)
-                seen_libraries = list()
-
-                for var in ordered_var:
-                    output.write("{chr}\t{pos}\t{ref}\t{alt}\t{codon}\t{aa}\t{amplicon}\t{sample}\t{lib}\t{run}\t{vaf}\t{call}"
-                                 "\n".format(chr=var.chr, pos=var.pos, ref=var.ref, alt=var.alt, codon=var.codon_change,
-                                             aa=var.aa_change, amplicon=var.amplicon, sample=var.sample, lib=var.library_name,
-                                             run=var.run_id, vaf=var.max_som_aaf, call=",".join(var.callers) or None))
+    with open("variant_pos_samples_{}.txt".format(args.report), "w") as output:
+        output.write("Chr\tPos\tRef\tAlt\tCodon\tAA\tAmplicon\tSample\tLibrary\tRun\tVAF\tCallers\n")
+        if args.batch:
+            keys = batch_lookup.read_variant_list(args.list, (0, 1, 3, 4))
+            for var in batch_lookup.lookup_variants("GRCh37.75", keys, args.threads):
+                write_variant(output, var)
+        else:
+            with open(args.list, "r") as variants_list:
+                reader = csv.reader(variants_list, dialect='excel-tab')
+                for row in reader:
+                    for var in routing.get_variant_matches("GRCh37.75", row[0], row[1], row[3], row[4]):
+                        write_variant(output, var)
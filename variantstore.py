@@ -58,6 +58,93 @@ class Variant(Model):
 
     # Complex Annotation Data
     population_freqs = columns.Map(columns.Text, columns.Float)
+    population_freqs_packed = columns.Blob()
+    clinvar_data = columns.Map(columns.Text, columns.Text)
+    cosmic_data = columns.Map(columns.Text, columns.Text)
+    max_maf_all = columns.Float()
+    max_maf_no_fin = columns.Float()
+    min_depth = columns.Float()
+    max_depth = columns.Float()
+    min_som_aaf = columns.Float()
+    max_som_aaf = columns.Float()
+    variant_filters = columns.List(columns.Text)
+    variant_reportable = columns.Text()
+    panel_coverage = columns.List(columns.Text)
+    amplicon_data = columns.Map(columns.Text, columns.Text)
+
+    # Variant Caller Data
+    freebayes = columns.Map(columns.Text, columns.Text)
+    mutect = columns.Map(columns.Text, columns.Text)
+    scalpel = columns.Map(columns.Text, columns.Text)
+    vardict = columns.Map(columns.Text, columns.Text)
+    scanindel = columns.Map(columns.Text, columns.Text)
+    pindel = columns.Map(columns.Text, columns.Text)
+    platypus = columns.Map(columns.Text, columns.Text)
+    mutect2 = columns.Map(columns.Text, columns.Text)
+    haplotypecaller = columns.Map(columns.Text, columns.Text)
+    unifiedgenotype = columns.Map(columns.Text, columns.Text)
+    itdseek = columns.Map(columns.Text, columns.Text)
+    manta = columns.Map(columns.Text, columns.Text)
+
+
+class BucketedVariant(Model):
+    __keyspace__ = 'variantstore'
+    reference_genome = columns.Text(primary_key=True, partition_key=True)
+    chr = columns.Text(primary_key=True, partition_key=True)
+    bin = columns.Integer(primary_key=True, partition_key=True)
+
+    # Cluster Keys
+    pos = columns.Integer(primary_key=True)
+    ref = columns.Text(primary_key=True)
+    alt = columns.Text(primary_key=True)
+    sample = columns.Text(index=True, primary_key=True)
+    library_name = columns.Text(index=True, primary_key=True)
+    run_id = columns.Text(index=True, primary_key=True)
+
+    sequencer = columns.Text(index=True)
+    target_pool = columns.Text(index=True)
+    panel_name = columns.Text(index=True)
+    initial_report_panel = columns.Text(index=True)
+    extraction = columns.Text(index=True)
+    date_annotated = columns.DateTime()
+
+    # Simple Annotation Data
+    end = columns.Integer()
+    callers = columns.List(columns.Text)
+    type = columns.Text()
+    subtype = columns.Text()
+
+    somatic = columns.Boolean()
+    germline = columns.Boolean()
+
+    # Variant IDs
+    rs_id = columns.Text()
+    rs_ids = columns.List(columns.Text)
+    cosmic_ids = columns.List(columns.Text)
+
+    gene = columns.Text(index=True)
+    transcript = columns.Text()
+    exon = columns.Text()
+    codon_change = columns.Text()
+    aa_change = columns.Text()
+    biotype = columns.Text(index=True)
+    severity = columns.Text()
+    impact = columns.Text()
+    impact_so = columns.Text()
+
+    genes = columns.List(columns.Text)
+    transcripts_data = columns.Map(columns.Text, columns.Text)
+
+    in_cosmic = columns.Boolean()
+    in_clinvar = columns.Boolean()
+    is_pathogenic = columns.Boolean()
+    is_coding = columns.Boolean()
+    is_lof = columns.Boolean()
+    is_splicing = columns.Boolean()
+
+    # Complex Annotation Data
+    population_freqs = columns.Map(columns.Text, columns.Float)
+    population_freqs_packed = columns.Blob()
     clinvar_data = columns.Map(columns.Text, columns.Text)
     cosmic_data = columns.Map(columns.Text, columns.Text)
     max_maf_all = columns.Float()
@@ -144,6 +231,7 @@ class SampleVariant(Model):
 
     # Complex Annotation Data
     population_freqs = columns.Map(columns.Text, columns.Float)
+    population_freqs_packed = columns.Blob()
     clinvar_data = columns.Map(columns.Text, columns.Text)
     cosmic_data = columns.Map(columns.Text, columns.Text)
     amplicon_data = columns.Map(columns.Text, columns.Text)
@@ -229,6 +317,7 @@ class TargetVariant(Model):
 
     # Complex Annotation Data
     population_freqs = columns.Map(columns.Text, columns.Float)
+    population_freqs_packed = columns.Blob()
     clinvar_data = columns.Map(columns.Text, columns.Text)
     cosmic_data = columns.Map(columns.Text, columns.Text)
     amplicon_data = columns.Map(columns.Text, columns.Text)
@@ -254,3 +343,83 @@ class TargetVariant(Model):
     unifiedgenotype = columns.Map(columns.Text, columns.Text)
     itdseek = columns.Map(columns.Text, columns.Text)
     manta = columns.Map(columns.Text, columns.Text)
+
+
+class AnnotationRelease(Model):
+    __keyspace__ = 'variantstore'
+    annotation_version = columns.Text(primary_key=True)
+    date_registered = columns.DateTime()
+
+
+class VariantAnnotation(Model):
+    __keyspace__ = 'variantstore'
+    reference_genome = columns.Text(primary_key=True, partition_key=True)
+    chr = columns.Text(primary_key=True, partition_key=True)
+    pos = columns.Integer(primary_key=True, partition_key=True)
+    ref = columns.Text(primary_key=True, partition_key=True)
+    alt = columns.Text(primary_key=True, partition_key=True)
+
+    # Clustered by version string only; which release is newest comes from
+    # AnnotationRelease
+    annotation_version = columns.Text(primary_key=True, clustering_order="DESC")
+    date_annotated = columns.DateTime()
+
+    transcripts_data = columns.Map(columns.Text, columns.Text)
+    population_freqs_packed = columns.Blob()
+    clinvar_data = columns.Map(columns.Text, columns.Text)
+    cosmic_data = columns.Map(columns.Text, columns.Text)
+
+
+class RecurrentArtifact(Model):
+    __keyspace__ = 'variantstore'
+    reference_genome = columns.Text(primary_key=True, partition_key=True)
+    panel_name = columns.Text(primary_key=True, partition_key=True)
+
+    # Cluster Keys
+    chr = columns.Text(primary_key=True)
+    pos = columns.Integer(primary_key=True)
+    ref = columns.Text(primary_key=True)
+    alt = columns.Text(primary_key=True)
+
+    # 'panel' for variants recurrent across the panel's samples, 'run' for
+    # variants recurrent within a single run
+    reason = columns.Text()
+    num_samples = columns.Integer()
+    fraction = columns.Float()
+    runs = columns.List(columns.Text)
+    date_updated = columns.DateTime()
+
+
+class VariantVafDistribution(Model):
+    __keyspace__ = 'variantstore'
+    reference_genome = columns.Text(primary_key=True, partition_key=True)
+    chr = columns.Text(primary_key=True, partition_key=True)
+    pos = columns.Integer(primary_key=True, partition_key=True)
+    ref = columns.Text(primary_key=True, partition_key=True)
+    alt = columns.Text(primary_key=True, partition_key=True)
+
+    # max_som_aaf of every call of the variant, ascending, as little-endian
+    # float32
+    vafs_packed = columns.Blob()
+    num_calls = columns.Integer()
+    median = columns.Double()
+    std_dev = columns.Double()
+    caller_counts = columns.Map(columns.Text, columns.Integer)
+    date_updated = columns.DateTime()
+
+
+class RunVariant(Model):
+    __keyspace__ = 'variantstore'
+    run_id = columns.Text(primary_key=True, partition_key=True)
+    reference_genome = columns.Text(primary_key=True, partition_key=True)
+    chr = columns.Text(primary_key=True, partition_key=True)
+
+    # Cluster Keys
+    pos = columns.Integer(primary_key=True)
+    ref = columns.Text(primary_key=True)
+    alt = columns.Text(primary_key=True)
+    library_name = columns.Text(primary_key=True)
+
+    sample = columns.Text()
+    callers = columns.List(columns.Text)
+    max_som_aaf = columns.Float()